@@ -40,11 +40,13 @@ async def main():
     )
     
     args = parser.parse_args()
+    automation_manager = None
     
     try:
         # Cargar configuración
         config_manager = ConfigManager(args.config)
         config = config_manager.load_config()
+        config_manager.ensure_dirs()
         
         # Inicializar el gestor de automatización
         automation_manager = AutomationManager(config)
@@ -63,7 +65,17 @@ async def main():
     except Exception as e:
         logger.error(f"Error en la aplicación: {e}")
         sys.exit(1)
+    finally:
+        if automation_manager is not None:
+            await automation_manager.aclose()
 
 
 if __name__ == "__main__":
+    # Usar uvloop como event loop si está disponible (no existe en Windows)
+    try:
+        import uvloop
+        uvloop.install()
+    except ImportError:
+        pass
+    
     asyncio.run(main())
\ No newline at end of file
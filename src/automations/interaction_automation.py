@@ -3,20 +3,71 @@ Automatización de interacciones
 """
 
 import asyncio
+import hashlib
+import json
+import random
 import re
-from typing import Dict, List, Any, Optional
+import time
+from collections import OrderedDict
+from itertools import islice
+from typing import Dict, List, Any, Optional, Pattern, Tuple
 from datetime import datetime, timedelta
 
+try:
+    import ahocorasick
+except ImportError:  # pragma: no cover - dependencia opcional
+    ahocorasick = None
+
 from src.platforms.base_platform import BasePlatform
 from src.utils.logger import setup_logger
+from src.utils.bloom_filter import BloomFilter
 from src.utils.database import DatabaseManager
+from src.utils.rate_limiter import TokenBucket
 
 logger = setup_logger(__name__)
 
+# Palabras que disparan la respuesta automática a mensajes privados
+_DM_GREETINGS = ('hola', 'hello', 'hi')
+_DM_THANKS = ('gracias', 'thanks')
+
+# Respuestas para comentarios positivos sin patrón específico
+_POSITIVE_REPLIES = (
+    "¡Gracias por tu comentario positivo! 😊",
+    "¡Nos alegra saber eso! 🎉",
+    "¡Muchas gracias! ❤️"
+)
+_choice = random.choice
+
+# Referencias a grupos dentro de un patrón (\1, (?P=nombre))
+_BACKREFERENCE = re.compile(r'\\[1-9]|\(\?P=')
+
+# Campos que ya se guardan en columnas propias y no se repiten en raw_data
+_COMMENT_FIELDS = frozenset(('id', 'author', 'content'))
+_MESSAGE_FIELDS = frozenset(('id', 'sender_id', 'content'))
+_ANALYTICS_FIELDS = frozenset(('metrics',))
+
+
+def _raw_extras(data: Dict[str, Any], known_fields: frozenset) -> Optional[Dict[str, Any]]:
+    """Retorna solo las claves no guardadas en columnas (None si no queda ninguna)"""
+    extras = {key: value for key, value in data.items() if key not in known_fields}
+    return extras or None
+
 
 class InteractionAutomation:
     """Automatización para interacciones y respuestas"""
     
+    # Atributos fijos: evita el __dict__ por instancia en el camino caliente
+    __slots__ = (
+        'config', 'db_manager', 'auto_reply_config', 'interaction_config',
+        '_auto_reply_enabled', '_pm_reply_enabled', '_sentiment_analysis_enabled',
+        'response_patterns', '_combined_pattern', '_pattern_responses',
+        'keyword_filters', '_cat_patterns', '_ac',
+        '_write_queue', '_write_task', '_write_batch_size', '_write_flush_interval',
+        '_comment_concurrency', '_comment_rate', '_comment_limiters',
+        '_processed_lru', '_processed_lru_size', '_processed_bloom', '_processed_bloom_ready', '_processed_bloom_lock',
+        '_analytics_persist_interval', '_last_analytics',
+    )
+    
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.db_manager = DatabaseManager(config)
@@ -24,15 +75,46 @@ class InteractionAutomation:
         # Configuraciones de automatización
         self.auto_reply_config = config.get('automation', {}).get('auto_reply', {})
         self.interaction_config = config.get('automation', {}).get('interactions', {})
+        self._auto_reply_enabled = bool(self.auto_reply_config.get('enabled', False))
+        self._pm_reply_enabled = bool(self.auto_reply_config.get('private_messages', {}).get('enabled', False))
+        self._sentiment_analysis_enabled = bool(self.interaction_config.get('sentiment_analysis', True))
         
         # Patrones de respuesta automática
         self.response_patterns = self._load_response_patterns()
+        self._combined_pattern = self._combine_response_patterns(self.response_patterns)
+        self._pattern_responses = list(self.response_patterns.values())
         
         # Lista de palabras clave para filtrar
         self.keyword_filters = self._load_keyword_filters()
+        self._cat_patterns = self._compile_keyword_filters(self.keyword_filters)
+        self._ac = self._build_keyword_automaton(self.keyword_filters)
+        
+        # Cola de escrituras agrupadas hacia la base de datos
+        self._write_queue: asyncio.Queue = asyncio.Queue()
+        self._write_task: Optional[asyncio.Task] = None
+        self._write_batch_size = self.interaction_config.get('write_batch_size', 50)
+        self._write_flush_interval = self.interaction_config.get('write_flush_interval', 0.5)
+        
+        # Concurrencia y rate limit al consultar comentarios de cada plataforma
+        self._comment_concurrency = self.interaction_config.get('concurrency', 4)
+        self._comment_rate = self.interaction_config.get('requests_per_second', 1.0)
+        self._comment_limiters: Dict[str, TokenBucket] = {}
+        
+        # Caché en memoria de comentarios procesados (LRU + filtro de Bloom) delante de la DB
+        self._processed_lru: OrderedDict = OrderedDict()
+        self._processed_lru_size = self.interaction_config.get('processed_cache_size', 10000)
+        self._processed_bloom = BloomFilter(
+            capacity=self.interaction_config.get('processed_bloom_capacity', 100000)
+        )
+        self._processed_bloom_ready = False
+        self._processed_bloom_lock = asyncio.Lock()
+        
+        # Último analytics guardado por plataforma: (huella del contenido, instante monotónico)
+        self._analytics_persist_interval = self.interaction_config.get('analytics_persist_interval', 900)
+        self._last_analytics: Dict[str, Tuple[str, float]] = {}
     
-    def _load_response_patterns(self) -> Dict[str, str]:
-        """Carga patrones de respuesta automática"""
+    def _load_response_patterns(self) -> Dict[Pattern[str], str]:
+        """Carga y compila patrones de respuesta automática"""
         default_patterns = {
             r'\b(gracias|thank you|thanks)\b': "¡De nada! 😊 ¡Gracias por seguirnos!",
             r'\b(hola|hello|hi)\b': "¡Hola! 👋 ¡Bienvenido/a a nuestra página!",
@@ -46,7 +128,30 @@ class InteractionAutomation:
         custom_patterns = self.auto_reply_config.get('patterns', {})
         default_patterns.update(custom_patterns)
         
-        return default_patterns
+        # Compilar una sola vez para no re-parsear los patrones en cada comentario
+        return {
+            re.compile(pattern, re.IGNORECASE): response
+            for pattern, response in default_patterns.items()
+        }
+    
+    @staticmethod
+    def _combine_response_patterns(response_patterns: Dict[Pattern[str], str]) -> Optional[Pattern[str]]:
+        """Combina los patrones de respuesta en una sola alternancia con grupos r0..rN"""
+        # Grupos con nombre o referencias a grupos cambiarían de significado al combinarse
+        if any(pattern.groupindex or _BACKREFERENCE.search(pattern.pattern)
+               for pattern in response_patterns):
+            logger.info("Patrones de respuesta con referencias a grupos; se evaluarán por separado")
+            return None
+        
+        parts = [
+            f'(?P<r{index}>{pattern.pattern})'
+            for index, pattern in enumerate(response_patterns)
+        ]
+        try:
+            return re.compile('|'.join(parts), re.IGNORECASE)
+        except re.error as e:
+            logger.warning("No se pudieron combinar los patrones de respuesta: %s", e)
+            return None
     
     def _load_keyword_filters(self) -> Dict[str, List[str]]:
         """Carga filtros de palabras clave"""
@@ -57,52 +162,149 @@ class InteractionAutomation:
             'urgent': ['urgente', 'emergencia', 'urgent', 'emergency', 'ayuda', 'help']
         }
     
+    @staticmethod
+    def _compile_keyword_filters(keyword_filters: Dict[str, List[str]]) -> Dict[str, Pattern[str]]:
+        """Compila cada categoría de palabras clave en una única alternancia"""
+        compiled = {}
+        for category, words in keyword_filters.items():
+            alternatives = []
+            for word in words:
+                escaped = re.escape(word)
+                # Límites de palabra solo en los extremos alfanuméricos (p. ej. '?' no los lleva)
+                if word[:1].isalnum():
+                    escaped = r'\b' + escaped
+                if word[-1:].isalnum():
+                    escaped = escaped + r'\b'
+                alternatives.append(escaped)
+            compiled[category] = re.compile('|'.join(alternatives), re.IGNORECASE)
+        return compiled
+    
+    @staticmethod
+    def _build_keyword_automaton(keyword_filters: Dict[str, List[str]]):
+        """Construye un autómata Aho-Corasick con todas las palabras clave etiquetadas por categoría"""
+        if ahocorasick is None:
+            return None
+        
+        categories_by_word: Dict[str, List[str]] = {}
+        for category, words in keyword_filters.items():
+            for word in words:
+                categories_by_word.setdefault(word.lower(), []).append(category)
+        
+        automaton = ahocorasick.Automaton()
+        for word, categories in categories_by_word.items():
+            automaton.add_word(word, (word, tuple(categories)))
+        automaton.make_automaton()
+        return automaton
+    
+    def _count_keyword_hits(self, comment_text: str) -> Dict[str, int]:
+        """Cuenta las palabras clave distintas por categoría en una sola pasada"""
+        if self._ac is None:
+            return {
+                category: len({match.lower() for match in pattern.findall(comment_text)})
+                for category, pattern in self._cat_patterns.items()
+            }
+        
+        # El autómata distingue mayúsculas: es la única ruta que necesita el texto en minúsculas
+        comment_text = comment_text.lower()
+        found = {category: set() for category in self.keyword_filters}
+        text_length = len(comment_text)
+        for end, (word, categories) in self._ac.iter(comment_text):
+            start = end - len(word) + 1
+            # Respetar límites de palabra en los extremos alfanuméricos
+            if word[0].isalnum() and start > 0 and comment_text[start - 1].isalnum():
+                continue
+            if word[-1].isalnum() and end + 1 < text_length and comment_text[end + 1].isalnum():
+                continue
+            for category in categories:
+                found[category].add(word)
+        
+        return {category: len(words) for category, words in found.items()}
+    
     async def process_platform_interactions(self, platform: str, client: BasePlatform):
         """Procesa interacciones para una plataforma específica"""
         try:
-            logger.info(f"Procesando interacciones para {platform}")
+            logger.info("Procesando interacciones para %s", platform)
+            
+            # Una sola marca de tiempo para todos los registros del ciclo
+            now = datetime.now()
             
             # Procesar comentarios nuevos
-            await self._process_new_comments(platform, client)
+            await self._process_new_comments(platform, client, now=now)
             
             # Procesar mensajes privados
-            await self._process_private_messages(platform, client)
+            await self._process_private_messages(platform, client, now=now)
             
             # Actualizar métricas de interacción
-            await self._update_interaction_metrics(platform, client)
+            await self._update_interaction_metrics(platform, client, now=now)
             
         except Exception as e:
-            logger.error(f"Error procesando interacciones de {platform}: {e}")
+            logger.error("Error procesando interacciones de %s: %s", platform, e)
+        finally:
+            # Persistir los registros del ciclo antes de la siguiente verificación
+            await self.flush_pending_writes()
     
-    async def _process_new_comments(self, platform: str, client: BasePlatform):
+    async def _process_new_comments(self, platform: str, client: BasePlatform,
+                                    now: Optional[datetime] = None):
         """Procesa comentarios nuevos"""
         try:
-            # Obtener posts recientes
-            recent_posts = await client.get_posts(limit=5)
+            async def process_comments(post_id: str, comments: List[Dict[str, Any]]):
+                await asyncio.gather(*(
+                    self._process_single_comment(platform, client, post_id, comment, now=now)
+                    for comment in comments
+                ))
             
-            for post in recent_posts:
-                post_id = post.get('id')
-                if not post_id:
-                    continue
+            # Posts recientes con sus comentarios en una sola petición, si la plataforma lo soporta
+            recent_posts = await client.get_posts_with_comments(limit=5)
+            
+            if recent_posts is not None:
+                posts = [post for post in recent_posts if post.get('id')]
+                post_ids = [post['id'] for post in posts]
+                results = await asyncio.gather(
+                    *(process_comments(post['id'], post.get('comments_data', [])) for post in posts),
+                    return_exceptions=True
+                )
+            else:
+                recent_posts = await client.get_posts(limit=5)
                 
-                # Obtener comentarios del post
-                comments = await client.get_comments(post_id)
+                semaphore = asyncio.Semaphore(self._comment_concurrency)
+                limiter = self._get_comment_limiter(platform)
                 
-                for comment in comments:
-                    await self._process_single_comment(platform, client, post_id, comment)
+                async def process_post(post_id: str):
+                    async with semaphore:
+                        # Respetar rate limits sin una pausa fija entre posts
+                        await limiter.acquire()
+                        
+                        # Obtener comentarios del post
+                        await process_comments(post_id, await client.get_comments(post_id))
                 
-                # Pausa entre posts para evitar rate limits
-                await asyncio.sleep(1)
+                post_ids = [post.get('id') for post in recent_posts if post.get('id')]
+                results = await asyncio.gather(
+                    *(process_post(post_id) for post_id in post_ids),
+                    return_exceptions=True
+                )
+            
+            for post_id, result in zip(post_ids, results):
+                if isinstance(result, Exception):
+                    logger.error("Error procesando comentarios del post %s en %s: %s", post_id, platform, result)
                 
         except Exception as e:
-            logger.error(f"Error procesando comentarios de {platform}: {e}")
+            logger.error("Error procesando comentarios de %s: %s", platform, e)
+    
+    def _get_comment_limiter(self, platform: str) -> TokenBucket:
+        """Obtiene el limitador de peticiones de comentarios para una plataforma"""
+        limiter = self._comment_limiters.get(platform)
+        if limiter is None:
+            limiter = TokenBucket(self._comment_rate, capacity=self._comment_concurrency)
+            self._comment_limiters[platform] = limiter
+        return limiter
     
     async def _process_single_comment(self, platform: str, client: BasePlatform, 
-                                    post_id: str, comment: Dict[str, Any]):
+                                    post_id: str, comment: Dict[str, Any],
+                                    now: Optional[datetime] = None):
         """Procesa un comentario individual"""
         try:
             comment_id = comment.get('id')
-            comment_text = comment.get('content', '').lower()
+            comment_text = comment.get('content', '')
             author = comment.get('author', '')
             created_at = comment.get('created_at', '')
             
@@ -110,47 +312,59 @@ class InteractionAutomation:
             if await self._is_comment_processed(comment_id):
                 return
             
-            # Analizar sentimiento y contenido
-            analysis = self._analyze_comment(comment_text)
+            # Analizar sentimiento y contenido (solo si algo lo va a usar)
+            if self._auto_reply_enabled or self._sentiment_analysis_enabled:
+                analysis = self._analyze_comment(comment_text)
+            else:
+                analysis = self._empty_analysis()
             
             # Guardar comentario en base de datos
-            await self._save_comment_record(platform, post_id, comment, analysis)
+            await self._save_comment_record(platform, post_id, comment, analysis, now=now)
             
             # Decidir si responder automáticamente
-            should_reply = await self._should_auto_reply(comment_text, analysis)
+            should_reply, matched_response = False, None
+            if self._auto_reply_enabled:
+                should_reply, matched_response = await self._should_auto_reply(comment_text, analysis)
             
             if should_reply:
-                reply_text = self._generate_auto_reply(comment_text, analysis)
+                reply_text = matched_response or self._generate_auto_reply(
+                    comment_text, analysis, check_patterns=False
+                )
                 
                 if reply_text:
                     # Enviar respuesta
                     result = await client.reply_to_comment(comment_id, reply_text)
                     
                     if result.get('success'):
-                        logger.info(f"Respuesta automática enviada en {platform}: {comment_id}")
-                        await self._save_reply_record(platform, comment_id, reply_text, result)
+                        logger.info("Respuesta automática enviada en %s: %s", platform, comment_id)
+                        await self._save_reply_record(platform, comment_id, reply_text, result, now=now)
             
             # Marcar comentario como procesado
             await self._mark_comment_processed(comment_id)
             
         except Exception as e:
-            logger.error(f"Error procesando comentario {comment.get('id')}: {e}")
+            logger.error("Error procesando comentario %s: %s", comment.get('id'), e)
     
-    def _analyze_comment(self, comment_text: str) -> Dict[str, Any]:
-        """Analiza el sentimiento y contenido de un comentario"""
-        analysis = {
+    @staticmethod
+    def _empty_analysis() -> Dict[str, Any]:
+        """Retorna un análisis neutro por defecto"""
+        return {
             'sentiment': 'neutral',
             'keywords': [],
             'is_question': False,
             'is_urgent': False,
             'confidence': 0.5
         }
+    
+    def _analyze_comment(self, comment_text: str) -> Dict[str, Any]:
+        """Analiza el sentimiento y contenido de un comentario"""
+        analysis = self._empty_analysis()
+        
+        keyword_hits = self._count_keyword_hits(comment_text)
         
         # Detectar sentimiento básico
-        positive_count = sum(1 for word in self.keyword_filters['positive'] 
-                           if word in comment_text)
-        negative_count = sum(1 for word in self.keyword_filters['negative'] 
-                           if word in comment_text)
+        positive_count = keyword_hits['positive']
+        negative_count = keyword_hits['negative']
         
         if positive_count > negative_count:
             analysis['sentiment'] = 'positive'
@@ -160,64 +374,78 @@ class InteractionAutomation:
             analysis['confidence'] = min(0.8, 0.5 + negative_count * 0.1)
         
         # Detectar preguntas
-        question_indicators = sum(1 for word in self.keyword_filters['questions'] 
-                                if word in comment_text)
-        analysis['is_question'] = question_indicators > 0
+        analysis['is_question'] = keyword_hits['questions'] > 0
         
         # Detectar urgencia
-        urgent_indicators = sum(1 for word in self.keyword_filters['urgent'] 
-                              if word in comment_text)
-        analysis['is_urgent'] = urgent_indicators > 0
+        analysis['is_urgent'] = keyword_hits['urgent'] > 0
         
-        # Extraer palabras clave
-        words = comment_text.split()
-        analysis['keywords'] = [word for word in words if len(word) > 3][:5]
+        # Extraer palabras clave (solo las 5 primeras, sin filtrar el texto completo)
+        analysis['keywords'] = [
+            word.lower() for word in islice((word for word in comment_text.split() if len(word) > 3), 5)
+        ]
         
         return analysis
     
-    async def _should_auto_reply(self, comment_text: str, analysis: Dict[str, Any]) -> bool:
-        """Determina si se debe responder automáticamente"""
+    async def _should_auto_reply(self, comment_text: str, 
+                                 analysis: Dict[str, Any]) -> Tuple[bool, Optional[str]]:
+        """Determina si se debe responder automáticamente.
+        
+        Retorna también la respuesta del patrón coincidente (si lo hay) para
+        que `_generate_auto_reply` no tenga que volver a recorrer los patrones.
+        """
         
         # No responder si la auto-respuesta está deshabilitada
-        if not self.auto_reply_config.get('enabled', False):
-            return False
+        if not self._auto_reply_enabled:
+            return False, None
         
         # No responder a comentarios negativos automáticamente
         if analysis['sentiment'] == 'negative':
-            return False
+            return False, None
+        
+        # Verificar patrones específicos (una sola vez por comentario)
+        matched_response = self._match_response_pattern(comment_text)
         
         # Responder a preguntas frecuentes
         if analysis['is_question']:
-            return True
+            return True, matched_response
         
         # Responder a comentarios positivos ocasionalmente
         if analysis['sentiment'] == 'positive' and analysis['confidence'] > 0.7:
-            return True
+            return True, matched_response
         
-        # Verificar patrones específicos
-        for pattern in self.response_patterns.keys():
-            if re.search(pattern, comment_text, re.IGNORECASE):
-                return True
+        return matched_response is not None, matched_response
+    
+    def _match_response_pattern(self, comment_text: str) -> Optional[str]:
+        """Retorna la respuesta del patrón que coincide antes en el comentario"""
+        if self._combined_pattern is not None:
+            match = self._combined_pattern.search(comment_text)
+            if match is None:
+                return None
+            # El grupo externo rN es el último en cerrarse
+            return self._pattern_responses[int(match.lastgroup[1:])]
         
-        return False
+        # Mismo criterio que la alternancia: gana la coincidencia que empieza
+        # antes y, a igual posición, el primer patrón configurado
+        best_start, best_response = None, None
+        for pattern, response in self.response_patterns.items():
+            match = pattern.search(comment_text)
+            if match is not None and (best_start is None or match.start() < best_start):
+                best_start, best_response = match.start(), response
+        return best_response
     
-    def _generate_auto_reply(self, comment_text: str, analysis: Dict[str, Any]) -> Optional[str]:
+    def _generate_auto_reply(self, comment_text: str, analysis: Dict[str, Any],
+                             check_patterns: bool = True) -> Optional[str]:
         """Genera una respuesta automática"""
         
         # Buscar patrón específico
-        for pattern, response in self.response_patterns.items():
-            if re.search(pattern, comment_text, re.IGNORECASE):
-                return response
+        if check_patterns:
+            matched_response = self._match_response_pattern(comment_text)
+            if matched_response:
+                return matched_response
         
         # Respuestas por sentimiento
         if analysis['sentiment'] == 'positive':
-            positive_replies = [
-                "¡Gracias por tu comentario positivo! 😊",
-                "¡Nos alegra saber eso! 🎉",
-                "¡Muchas gracias! ❤️"
-            ]
-            import random
-            return random.choice(positive_replies)
+            return _choice(_POSITIVE_REPLIES)
         
         # Respuesta para preguntas generales
         if analysis['is_question']:
@@ -225,20 +453,21 @@ class InteractionAutomation:
         
         return None
     
-    async def _process_private_messages(self, platform: str, client: BasePlatform):
+    async def _process_private_messages(self, platform: str, client: BasePlatform,
+                                        now: Optional[datetime] = None):
         """Procesa mensajes privados"""
         try:
             messages = await client.get_messages()
             
             for message in messages:
                 if not message.get('is_read', True):
-                    await self._process_single_message(platform, client, message)
+                    await self._process_single_message(platform, client, message, now=now)
                     
         except Exception as e:
-            logger.error(f"Error procesando mensajes privados de {platform}: {e}")
+            logger.error("Error procesando mensajes privados de %s: %s", platform, e)
     
     async def _process_single_message(self, platform: str, client: BasePlatform, 
-                                    message: Dict[str, Any]):
+                                    message: Dict[str, Any], now: Optional[datetime] = None):
         """Procesa un mensaje privado individual"""
         try:
             message_id = message.get('id')
@@ -246,58 +475,157 @@ class InteractionAutomation:
             sender_id = message.get('sender_id', '')
             
             # Guardar mensaje en base de datos
-            await self._save_message_record(platform, message)
+            await self._save_message_record(platform, message, now=now)
             
             # Respuesta automática para mensajes (más conservadora)
-            if self.auto_reply_config.get('private_messages', {}).get('enabled', False):
+            if self._pm_reply_enabled:
                 
                 # Solo respuestas automáticas muy básicas
                 auto_response = None
+                lowered = message_text.lower()
                 
-                if any(word in message_text.lower() for word in ['hola', 'hello', 'hi']):
+                if any(word in lowered for word in _DM_GREETINGS):
                     auto_response = "¡Hola! Gracias por contactarnos. Te responderemos pronto 😊"
-                elif any(word in message_text.lower() for word in ['gracias', 'thanks']):
+                elif any(word in lowered for word in _DM_THANKS):
                     auto_response = "¡De nada! Estamos aquí para ayudarte 😊"
                 
                 if auto_response:
                     result = await client.send_message(sender_id, auto_response)
                     if result.get('success'):
-                        logger.info(f"Respuesta automática a mensaje privado enviada en {platform}")
+                        logger.info("Respuesta automática a mensaje privado enviada en %s", platform)
             
         except Exception as e:
-            logger.error(f"Error procesando mensaje privado: {e}")
+            logger.error("Error procesando mensaje privado: %s", e)
     
-    async def _update_interaction_metrics(self, platform: str, client: BasePlatform):
+    async def _update_interaction_metrics(self, platform: str, client: BasePlatform,
+                                          now: Optional[datetime] = None):
         """Actualiza métricas de interacción"""
         try:
             # Obtener analytics generales
             analytics = await client.get_analytics()
             
-            if analytics:
+            if analytics and self._analytics_changed(platform, analytics):
                 # Guardar métricas en base de datos
-                await self._save_analytics_record(platform, analytics)
+                await self._save_analytics_record(platform, analytics, now=now)
                 
         except Exception as e:
-            logger.error(f"Error actualizando métricas de {platform}: {e}")
+            logger.error("Error actualizando métricas de %s: %s", platform, e)
+    
+    def _analytics_changed(self, platform: str, analytics: Dict[str, Any]) -> bool:
+        """Indica si hay que guardar el analytics: cambió o venció el intervalo"""
+        digest = hashlib.md5(
+            json.dumps(analytics, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        current_time = time.monotonic()
+        
+        last = self._last_analytics.get(platform)
+        if last is not None:
+            last_digest, persisted_at = last
+            if last_digest == digest and current_time - persisted_at < self._analytics_persist_interval:
+                return False
+        
+        self._last_analytics[platform] = (digest, current_time)
+        return True
     
     # Métodos de base de datos (simplificados)
     
     async def _is_comment_processed(self, comment_id: str) -> bool:
         """Verifica si un comentario ya fue procesado"""
-        try:
-            return await self.db_manager.is_comment_processed(comment_id)
-        except:
+        if comment_id in self._processed_lru:
+            self._processed_lru.move_to_end(comment_id)
+            return True
+        
+        # Un negativo del filtro de Bloom es definitivo una vez cargado desde la DB
+        await self._load_processed_bloom()
+        if self._processed_bloom_ready and comment_id not in self._processed_bloom:
             return False
+        
+        # Un error de la DB se propaga: el comentario se reintenta en el siguiente ciclo
+        # en lugar de tratarse como nuevo y responderse dos veces
+        processed = await self.db_manager.is_comment_processed(comment_id)
+        if processed:
+            self._remember_processed(comment_id)
+        return processed
+    
+    async def _load_processed_bloom(self):
+        """Carga en el filtro de Bloom los comentarios ya guardados en la DB"""
+        if self._processed_bloom_ready:
+            return
+        
+        # Las plataformas y comentarios se procesan en paralelo: solo el
+        # primero carga el filtro y el resto espera a que termine
+        async with self._processed_bloom_lock:
+            if self._processed_bloom_ready:
+                return
+            try:
+                for comment_id in await self.db_manager.get_processed_comment_ids():
+                    self._processed_bloom.add(comment_id)
+                self._processed_bloom_ready = True
+            except Exception as e:
+                logger.warning("No se pudo cargar el filtro de comentarios procesados: %s", e)
+    
+    def _remember_processed(self, comment_id: str):
+        """Registra un comentario procesado en la caché en memoria"""
+        self._processed_bloom.add(comment_id)
+        self._processed_lru[comment_id] = None
+        self._processed_lru.move_to_end(comment_id)
+        if len(self._processed_lru) > self._processed_lru_size:
+            self._processed_lru.popitem(last=False)
     
     async def _mark_comment_processed(self, comment_id: str):
         """Marca un comentario como procesado"""
+        self._remember_processed(comment_id)
+        
         try:
             await self.db_manager.mark_comment_processed(comment_id)
         except Exception as e:
-            logger.error(f"Error marcando comentario como procesado: {e}")
+            logger.error("Error marcando comentario como procesado: %s", e)
+    
+    async def _enqueue_record(self, kind: str, record: Dict[str, Any]):
+        """Encola un registro para guardarlo en el siguiente lote"""
+        if self._write_task is None or self._write_task.done():
+            self._write_task = asyncio.create_task(self._write_records_loop())
+        
+        await self._write_queue.put((kind, record))
+    
+    async def _write_records_loop(self):
+        """Vacía la cola de escrituras en lotes hacia la base de datos"""
+        loop = asyncio.get_running_loop()
+        
+        while True:
+            batch = [await self._write_queue.get()]
+            deadline = loop.time() + self._write_flush_interval
+            
+            # Agrupar hasta completar el lote o agotar el intervalo de espera
+            while len(batch) < self._write_batch_size:
+                if not self._write_queue.empty():
+                    batch.append(self._write_queue.get_nowait())
+                    continue
+                
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(self._write_queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+            
+            try:
+                await self.db_manager.bulk_save_records(batch)
+            except Exception as e:
+                logger.error("Error guardando lote de %s registros: %s", len(batch), e)
+            finally:
+                for _ in batch:
+                    self._write_queue.task_done()
+    
+    async def flush_pending_writes(self):
+        """Espera a que todos los registros encolados se hayan guardado"""
+        if self._write_task is not None and not self._write_task.done():
+            await self._write_queue.join()
     
     async def _save_comment_record(self, platform: str, post_id: str, 
-                                 comment: Dict[str, Any], analysis: Dict[str, Any]):
+                                 comment: Dict[str, Any], analysis: Dict[str, Any],
+                                 now: Optional[datetime] = None):
         """Guarda registro del comentario"""
         try:
             record = {
@@ -309,17 +637,18 @@ class InteractionAutomation:
                 'sentiment': analysis.get('sentiment'),
                 'is_question': analysis.get('is_question'),
                 'is_urgent': analysis.get('is_urgent'),
-                'processed_at': datetime.now(),
-                'raw_data': comment
+                'processed_at': now or datetime.now(),
+                'raw_data': _raw_extras(comment, _COMMENT_FIELDS)
             }
             
-            await self.db_manager.save_comment_record(record)
+            await self._enqueue_record('comment', record)
             
         except Exception as e:
-            logger.error(f"Error guardando registro de comentario: {e}")
+            logger.error("Error guardando registro de comentario: %s", e)
     
     async def _save_reply_record(self, platform: str, comment_id: str, 
-                               reply_text: str, result: Dict[str, Any]):
+                               reply_text: str, result: Dict[str, Any],
+                               now: Optional[datetime] = None):
         """Guarda registro de respuesta enviada"""
         try:
             record = {
@@ -327,16 +656,17 @@ class InteractionAutomation:
                 'comment_id': comment_id,
                 'reply_text': reply_text,
                 'reply_id': result.get('reply_id'),
-                'sent_at': datetime.now(),
+                'sent_at': now or datetime.now(),
                 'success': result.get('success', False)
             }
             
-            await self.db_manager.save_reply_record(record)
+            await self._enqueue_record('reply', record)
             
         except Exception as e:
-            logger.error(f"Error guardando registro de respuesta: {e}")
+            logger.error("Error guardando registro de respuesta: %s", e)
     
-    async def _save_message_record(self, platform: str, message: Dict[str, Any]):
+    async def _save_message_record(self, platform: str, message: Dict[str, Any],
+                                 now: Optional[datetime] = None):
         """Guarda registro de mensaje privado"""
         try:
             record = {
@@ -344,29 +674,30 @@ class InteractionAutomation:
                 'message_id': message.get('id'),
                 'sender_id': message.get('sender_id'),
                 'content': message.get('content'),
-                'received_at': datetime.now(),
-                'raw_data': message
+                'received_at': now or datetime.now(),
+                'raw_data': _raw_extras(message, _MESSAGE_FIELDS)
             }
             
-            await self.db_manager.save_message_record(record)
+            await self._enqueue_record('message', record)
             
         except Exception as e:
-            logger.error(f"Error guardando registro de mensaje: {e}")
+            logger.error("Error guardando registro de mensaje: %s", e)
     
-    async def _save_analytics_record(self, platform: str, analytics: Dict[str, Any]):
+    async def _save_analytics_record(self, platform: str, analytics: Dict[str, Any],
+                                   now: Optional[datetime] = None):
         """Guarda registro de analytics"""
         try:
             record = {
                 'platform': platform,
                 'metrics': analytics.get('metrics', {}),
-                'recorded_at': datetime.now(),
-                'raw_data': analytics
+                'recorded_at': now or datetime.now(),
+                'raw_data': _raw_extras(analytics, _ANALYTICS_FIELDS)
             }
             
-            await self.db_manager.save_analytics_record(record)
+            await self._enqueue_record('analytics', record)
             
         except Exception as e:
-            logger.error(f"Error guardando registro de analytics: {e}")
+            logger.error("Error guardando registro de analytics: %s", e)
     
     async def get_interaction_summary(self, days: int = 7) -> Dict[str, Any]:
         """Obtiene resumen de interacciones"""
@@ -394,5 +725,5 @@ class InteractionAutomation:
             return summary
             
         except Exception as e:
-            logger.error(f"Error generando resumen de interacciones: {e}")
+            logger.error("Error generando resumen de interacciones: %s", e)
             return {}
\ No newline at end of file
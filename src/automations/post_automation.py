@@ -3,16 +3,33 @@ Automatización de publicaciones
 """
 
 import asyncio
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, NamedTuple, Optional, Tuple
 from datetime import datetime, timedelta
 
+import numpy as np
+import pandas as pd
+
 from src.core.content_manager import ContentManager
+from src.platforms.base_platform import BasePlatform
 from src.platforms.platform_factory import PlatformFactory
 from src.utils.logger import setup_logger
+from src.utils.rate_limiter import TokenBucket
 
 logger = setup_logger(__name__)
 
 
+class PostTask(NamedTuple):
+    """Datos ya resueltos de una publicación lista para ejecutarse"""
+    post: Dict[str, Any]
+    post_id: Optional[str]
+    platform: Optional[str]
+    content_id: Optional[str]
+    content_text: Optional[str]  # None si el contenido no existe
+    media_paths: List[str]
+    post_config: Dict[str, Any]
+    client: Optional[BasePlatform]
+
+
 class PostAutomation:
     """Automatización para publicaciones programadas"""
     
@@ -20,84 +37,180 @@ class PostAutomation:
         self.config = config
         self.content_manager = ContentManager(config)
         self.platform_factory = PlatformFactory(config)
+        
+        # Rate limit de publicaciones por plataforma (publicaciones por segundo)
+        self.posting_config = config.get('automation', {}).get('posting', {})
+        self._post_limiters: Dict[str, TokenBucket] = {}
+        
+        # Máximo de publicaciones en vuelo por plataforma
+        self._post_semaphores: Dict[str, asyncio.Semaphore] = {}
     
     async def process_scheduled_posts(self):
         """Procesa todas las publicaciones programadas que están listas"""
         try:
-            # Obtener posts que deben ejecutarse
-            due_posts = await self.content_manager.get_due_posts()
+            total = 0
             
-            if not due_posts:
-                logger.debug("No hay publicaciones programadas para ejecutar")
-                return
+            # Una sola marca de tiempo para decidir qué está vencido en este tick
+            now = datetime.now()
             
-            logger.info(f"Procesando {len(due_posts)} publicaciones programadas")
+            # Procesar por bloques a medida que llegan de la DB
+            chunk_size = self.posting_config.get('due_chunk_size', 100)
+            async for due_posts in self.content_manager.iter_due_posts(now, chunk_size=chunk_size):
+                logger.info("Procesando %s publicaciones programadas", len(due_posts))
+                await self._process_due_posts(due_posts)
+                total += len(due_posts)
             
-            # Procesar cada post
-            for post in due_posts:
-                await self._process_single_post(post)
-                
-                # Pausa entre publicaciones para evitar rate limits
-                await asyncio.sleep(2)
+            if not total:
+                logger.debug("No hay publicaciones programadas para ejecutar")
                 
         except Exception as e:
-            logger.error(f"Error procesando publicaciones programadas: {e}")
+            logger.error("Error procesando publicaciones programadas: %s", e)
+    
+    async def _process_due_posts(self, due_posts: List[Dict[str, Any]]):
+        """Procesa un bloque de publicaciones pendientes"""
+        # Cargar todos los contenidos del bloque en una sola consulta
+        contents = await self.content_manager.get_contents_bulk(
+            {post.get('content_id') for post in due_posts}
+        )
+        
+        # Agrupar por plataforma: las plataformas distintas publican en paralelo
+        posts_by_platform: Dict[str, List[Dict[str, Any]]] = {}
+        for post in due_posts:
+            posts_by_platform.setdefault(post.get('platform'), []).append(post)
+        
+        outcomes: List[Tuple[Dict[str, Any], str, Any]] = []
+        try:
+            await asyncio.gather(*(
+                self._process_platform_posts(platform, posts, contents, outcomes)
+                for platform, posts in posts_by_platform.items()
+            ))
+        finally:
+            # Registrar todos los resultados en una sola transacción
+            if outcomes:
+                await self.content_manager.mark_posts_bulk(outcomes)
+    
+    async def _process_platform_posts(self, platform: str, posts: List[Dict[str, Any]],
+                                      contents: Dict[str, Dict[str, Any]],
+                                      outcomes: List[Tuple[Dict[str, Any], str, Any]]):
+        """Procesa las publicaciones de una plataforma respetando su rate limit
+        
+        El limitador acota el ritmo de inicio y el semáforo las publicaciones
+        simultáneas en vuelo contra la plataforma.
+        """
+        limiter = self._get_post_limiter(platform)
+        semaphore = self._get_post_semaphore(platform)
+        
+        # Un solo cliente para todo el grupo de la plataforma
+        client = self.platform_factory.get_client(platform) if platform else None
+        
+        async def publish(task: PostTask):
+            try:
+                outcomes.append(await self._process_single_post(task))
+            finally:
+                semaphore.release()
+        
+        post_tasks = [self._build_task(post, contents, client) for post in posts]
+        
+        tasks = []
+        try:
+            for post_task in post_tasks:
+                # Se toma el cupo antes de crear la tarea para no acumular tareas pendientes
+                await semaphore.acquire()
+                try:
+                    # Solo espera si se agotó el cupo de la plataforma
+                    await limiter.acquire()
+                except BaseException:
+                    semaphore.release()
+                    raise
+                tasks.append(asyncio.create_task(publish(post_task)))
+        finally:
+            if tasks:
+                await asyncio.gather(*tasks)
     
-    async def _process_single_post(self, post: Dict[str, Any]):
-        """Procesa una publicación individual"""
-        post_id = post.get('id')
-        platform = post.get('platform')
+    def _get_post_limiter(self, platform: str) -> TokenBucket:
+        """Obtiene el limitador de publicaciones para una plataforma"""
+        limiter = self._post_limiters.get(platform)
+        if limiter is None:
+            rate_limits = self.posting_config.get('rate_limits', {})
+            limiter = TokenBucket(
+                rate_limits.get(platform, self.posting_config.get('posts_per_second', 0.5)),
+                capacity=self.posting_config.get('burst', 1)
+            )
+            self._post_limiters[platform] = limiter
+        return limiter
+    
+    def _get_post_semaphore(self, platform: str) -> asyncio.Semaphore:
+        """Obtiene el semáforo de publicaciones simultáneas para una plataforma"""
+        semaphore = self._post_semaphores.get(platform)
+        if semaphore is None:
+            concurrency = self.posting_config.get('concurrency', {})
+            semaphore = asyncio.Semaphore(
+                concurrency.get(platform, self.posting_config.get('max_concurrency', 8))
+            )
+            self._post_semaphores[platform] = semaphore
+        return semaphore
+    
+    @staticmethod
+    def _build_task(post: Dict[str, Any], contents: Dict[str, Dict[str, Any]],
+                    client: Optional[BasePlatform]) -> PostTask:
+        """Resuelve de una vez los datos que necesita _process_single_post"""
         content_id = post.get('content_id')
+        content = contents.get(content_id)
+        return PostTask(
+            post=post,
+            post_id=post.get('id'),
+            platform=post.get('platform'),
+            content_id=content_id,
+            content_text=content.get('content', '') if content else None,
+            media_paths=(content.get('media_paths') or []) if content else [],
+            post_config=post.get('config') or {},
+            client=client
+        )
+    
+    async def _process_single_post(self, task: PostTask) -> Tuple[Dict[str, Any], str, Any]:
+        """Procesa una publicación individual
         
+        Retorna (post, estado, datos) para registrarlo con mark_posts_bulk.
+        """
         try:
-            logger.info(f"Procesando publicación {post_id} para {platform}")
+            logger.info("Procesando publicación %s para %s", task.post_id, task.platform)
             
-            # Obtener contenido
-            content = await self.content_manager.get_content(content_id)
-            if not content:
-                raise Exception(f"Contenido no encontrado: {content_id}")
+            if task.content_text is None:
+                raise Exception(f"Contenido no encontrado: {task.content_id}")
             
-            # Obtener cliente de plataforma
-            client = self.platform_factory.get_client(platform)
+            client = task.client
             if not client:
-                raise Exception(f"Cliente no disponible para {platform}")
-            
-            # Preparar datos de publicación
-            post_content = content.get('content', '')
-            media_paths = content.get('media_paths', [])
-            post_config = post.get('config', {})
+                raise Exception(f"Cliente no disponible para {task.platform}")
             
             # Validar archivos multimedia
             valid_media_paths = []
-            for media_path in media_paths:
+            for media_path in task.media_paths:
                 if client.validate_media_file(media_path):
                     valid_media_paths.append(media_path)
                 else:
-                    logger.warning(f"Archivo multimedia inválido: {media_path}")
+                    logger.warning("Archivo multimedia inválido: %s", media_path)
             
             # Ejecutar publicación
             result = await client.create_post(
-                content=post_content,
-                media_paths=valid_media_paths if valid_media_paths else None,
-                **post_config
+                content=task.content_text,
+                media_paths=valid_media_paths or None,
+                **task.post_config
             )
             
-            # Marcar como publicado exitosamente
-            await self.content_manager.mark_post_published(post_id, result)
-            
-            logger.info(f"✅ Publicación exitosa: {post_id} -> {result.get('post_id')}")
+            logger.info("✅ Publicación exitosa: %s -> %s", task.post_id, result.get('post_id'))
+            return task.post, 'published', result
             
         except Exception as e:
-            logger.error(f"❌ Error en publicación {post_id}: {e}")
+            logger.error("❌ Error en publicación %s: %s", task.post_id, e)
             
-            # Marcar como fallida para reintento
-            await self.content_manager.mark_post_failed(post_id, str(e))
+            # Se marcará como fallida para reintento
+            return task.post, 'failed', str(e)
     
     async def create_automated_post_series(self, content_list: List[Dict[str, Any]], 
                                          platform: str, start_time: datetime, 
                                          interval_hours: int = 24) -> List[str]:
         """Crea una serie de publicaciones automatizadas"""
-        post_ids = []
+        post_ids: List[Optional[str]] = [None] * len(content_list)
         current_time = start_time
         
         try:
@@ -112,18 +225,18 @@ class PostAutomation:
                     scheduled_time=current_time
                 )
                 
-                post_ids.append(post_id)
+                post_ids[i] = post_id
                 
                 # Incrementar tiempo para la siguiente publicación
                 current_time += timedelta(hours=interval_hours)
                 
-                logger.info(f"Publicación programada {i+1}/{len(content_list)}: {post_id}")
+                logger.info("Publicación programada %s/%s: %s", i+1, len(content_list), post_id)
             
-            logger.info(f"Serie de {len(post_ids)} publicaciones creada para {platform}")
+            logger.info("Serie de %s publicaciones creada para %s", len(post_ids), platform)
             return post_ids
             
         except Exception as e:
-            logger.error(f"Error creando serie de publicaciones: {e}")
+            logger.error("Error creando serie de publicaciones: %s", e)
             raise
     
     async def duplicate_post_across_platforms(self, content_id: str, 
@@ -139,37 +252,40 @@ class PostAutomation:
             if not content:
                 raise Exception(f"Contenido no encontrado: {content_id}")
             
+            # Verificar disponibilidad antes de lanzar tareas (una sola consulta al factory)
+            available = frozenset(self.platform_factory.get_available_platforms())
+            available_platforms = []
             for platform in platforms:
-                try:
-                    # Verificar que la plataforma está disponible
-                    if not self.platform_factory.is_platform_available(platform):
-                        logger.warning(f"Plataforma no disponible: {platform}")
-                        continue
-                    
-                    # Obtener configuración específica de la plataforma
-                    platform_config = {}
-                    if platform_configs and platform in platform_configs:
-                        platform_config = platform_configs[platform]
-                    
-                    # Programar publicación
-                    post_id = await self.content_manager.schedule_post(
-                        content_id=content_id,
-                        platform=platform,
-                        scheduled_time=scheduled_time,
-                        post_config=platform_config
-                    )
-                    
-                    post_ids[platform] = post_id
-                    logger.info(f"Post programado para {platform}: {post_id}")
-                    
-                except Exception as e:
-                    logger.error(f"Error programando post para {platform}: {e}")
-                    post_ids[platform] = f"ERROR: {str(e)}"
+                if platform.lower() in available:
+                    available_platforms.append(platform)
+                else:
+                    logger.warning("Plataforma no disponible: %s", platform)
+            
+            platform_configs = platform_configs or {}
+            
+            # Programar en todas las plataformas a la vez
+            results = await asyncio.gather(*(
+                self.content_manager.schedule_post(
+                    content_id=content_id,
+                    platform=platform,
+                    scheduled_time=scheduled_time,
+                    post_config=platform_configs.get(platform, {})
+                )
+                for platform in available_platforms
+            ), return_exceptions=True)
+            
+            for platform, result in zip(available_platforms, results):
+                if isinstance(result, Exception):
+                    logger.error("Error programando post para %s: %s", platform, result)
+                    post_ids[platform] = f"ERROR: {str(result)}"
+                else:
+                    post_ids[platform] = result
+                    logger.info("Post programado para %s: %s", platform, result)
             
             return post_ids
             
         except Exception as e:
-            logger.error(f"Error duplicando post: {e}")
+            logger.error("Error duplicando post: %s", e)
             raise
     
     async def reschedule_failed_posts(self, max_age_hours: int = 24):
@@ -186,7 +302,7 @@ class PostAutomation:
             logger.info("Función de reprogramación en desarrollo")
             
         except Exception as e:
-            logger.error(f"Error reprogramando posts fallidos: {e}")
+            logger.error("Error reprogramando posts fallidos: %s", e)
     
     async def get_post_analytics_summary(self, days: int = 7) -> Dict[str, Any]:
         """Obtiene resumen de analíticas de publicaciones recientes"""
@@ -202,15 +318,63 @@ class PostAutomation:
             # Obtener estadísticas de publicaciones
             # Esta funcionalidad requiere implementación en DatabaseManager
             
-            logger.info(f"Generando resumen de analíticas para {days} días")
+            logger.info("Generando resumen de analíticas para %s días", days)
             
             # Por ahora, retornar estructura básica
             return summary
             
         except Exception as e:
-            logger.error(f"Error generando resumen de analíticas: {e}")
+            logger.error("Error generando resumen de analíticas: %s", e)
             return {}
     
+    @staticmethod
+    def _rank_posting_hours(posts: List[Dict[str, Any]], top: int = 5) -> List[Dict[str, Any]]:
+        """Ordena las horas del día por engagement promedio (likes + comments + shares)"""
+        if not posts or top <= 0:
+            return []
+        
+        # Parseo vectorizado de fechas; las inválidas quedan como NaT
+        created_at = pd.to_datetime(
+            pd.Series([post.get('created_at') for post in posts], dtype=object),
+            utc=True, errors='coerce', format='ISO8601'
+        )
+        valid = created_at.notna().to_numpy()
+        if not valid.any():
+            return []
+        
+        hours = created_at.dt.hour.to_numpy()[valid].astype(np.int64)
+        engagement = np.fromiter(
+            (
+                (post.get('likes') or 0) + (post.get('comments') or 0) + (post.get('shares') or 0)
+                for post in posts
+            ),
+            dtype=np.float64, count=len(posts)
+        )[valid]
+        
+        # Sumas y conteos de las 24 horas en dos pasadas en C
+        totals = np.bincount(hours, weights=engagement, minlength=24)
+        counts = np.bincount(hours, minlength=24)
+        
+        active = np.flatnonzero(counts)
+        averages = totals[active] / counts[active]
+        
+        # Selección parcial O(n) de las `top` mejores; solo esas se ordenan
+        if top < len(active):
+            selected = np.argpartition(-averages, top - 1)[:top]
+        else:
+            selected = np.arange(len(active))
+        order = np.lexsort((active[selected], -averages[selected]))
+        best = active[selected[order]]
+        
+        return [
+            {
+                'hour': int(hour),
+                'avg_engagement': float(totals[hour] / counts[hour]),
+                'posts_count': int(counts[hour])
+            }
+            for hour in best
+        ]
+    
     async def optimize_posting_times(self, platform: str) -> Dict[str, Any]:
         """Analiza y sugiere mejores horarios de publicación"""
         try:
@@ -222,49 +386,8 @@ class PostAutomation:
             # Obtener posts recientes con analytics
             recent_posts = await client.get_posts(limit=50)
             
-            # Analizar performance por hora del día
-            hourly_performance = {}
-            
-            for post in recent_posts:
-                # Extraer hora de creación
-                created_at = post.get('created_at', '')
-                if created_at:
-                    try:
-                        dt = datetime.fromisoformat(created_at.replace('Z', '+00:00'))
-                        hour = dt.hour
-                        
-                        if hour not in hourly_performance:
-                            hourly_performance[hour] = {
-                                'posts': 0,
-                                'total_engagement': 0
-                            }
-                        
-                        # Calcular engagement (likes + comments + shares)
-                        engagement = (
-                            post.get('likes', 0) + 
-                            post.get('comments', 0) + 
-                            post.get('shares', 0)
-                        )
-                        
-                        hourly_performance[hour]['posts'] += 1
-                        hourly_performance[hour]['total_engagement'] += engagement
-                        
-                    except Exception as e:
-                        logger.warning(f"Error procesando fecha: {created_at}")
-            
-            # Calcular engagement promedio por hora
-            recommendations = []
-            for hour, data in hourly_performance.items():
-                if data['posts'] > 0:
-                    avg_engagement = data['total_engagement'] / data['posts']
-                    recommendations.append({
-                        'hour': hour,
-                        'avg_engagement': avg_engagement,
-                        'posts_count': data['posts']
-                    })
-            
-            # Ordenar por engagement promedio
-            recommendations.sort(key=lambda x: x['avg_engagement'], reverse=True)
+            # Analizar performance por hora del día (vectorizado)
+            recommendations = self._rank_posting_hours(recent_posts)
             
             return {
                 'platform': platform,
@@ -274,5 +397,5 @@ class PostAutomation:
             }
             
         except Exception as e:
-            logger.error(f"Error optimizando horarios para {platform}: {e}")
+            logger.error("Error optimizando horarios para %s: %s", platform, e)
             return {}
\ No newline at end of file
@@ -21,11 +21,21 @@ logger = setup_logger(__name__)
 class AutomationManager:
     """Gestor principal de todas las automatizaciones"""
     
+    # Intervalo (segundos) de procesamiento de interacciones por plataforma
+    INTERACTION_INTERVALS = {
+        'facebook': 300,  # cada 5 minutos
+        'instagram': 600  # cada 10 minutos
+    }
+    
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.content_manager = ContentManager(config)
-        self.scheduler = SchedulerManager(config)
         self.platform_factory = PlatformFactory(config)
+        self.scheduler = SchedulerManager(
+            config,
+            content_manager=self.content_manager,
+            platform_factory=self.platform_factory
+        )
         self.db_manager = DatabaseManager(config)
         
         # Automatizaciones disponibles
@@ -35,6 +45,8 @@ class AutomationManager:
         }
         
         self._running = False
+        self._stop_event: Optional[asyncio.Event] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
     
     async def start_scheduler(self, platform: str = "all"):
         """Inicia el programador de tareas"""
@@ -42,6 +54,8 @@ class AutomationManager:
         
         try:
             self._running = True
+            self._loop = asyncio.get_running_loop()
+            self._stop_event = asyncio.Event()
             
             # Configurar tareas programadas
             await self._setup_scheduled_tasks(platform)
@@ -49,9 +63,8 @@ class AutomationManager:
             # Iniciar el scheduler
             await self.scheduler.start()
             
-            # Mantener el bucle principal
-            while self._running:
-                await asyncio.sleep(1)
+            # Mantener el bucle principal hasta que se llame a stop()
+            await self._stop_event.wait()
                 
         except Exception as e:
             logger.error(f"Error en scheduler: {e}")
@@ -70,7 +83,7 @@ class AutomationManager:
             print("5. Configurar automatizaciones")
             print("0. Salir")
             
-            choice = input("\nSeleccione una opción: ").strip()
+            choice = await self._ainput("\nSeleccione una opción: ")
             
             if choice == "0":
                 break
@@ -87,6 +100,10 @@ class AutomationManager:
             else:
                 print("Opción no válida")
     
+    async def _ainput(self, prompt: str) -> str:
+        """Lee una línea de la consola sin bloquear el event loop"""
+        return (await asyncio.to_thread(input, prompt)).strip()
+    
     async def start_api_server(self):
         """Inicia el servidor API"""
         from src.api.main import create_app
@@ -109,21 +126,18 @@ class AutomationManager:
         # Obtener publicaciones programadas
         scheduled_posts = await self.content_manager.get_scheduled_posts(platform)
         
-        for post in scheduled_posts:
-            await self.scheduler.schedule_post(post)
-        
-        # Configurar automatizaciones periódicas
-        if platform in ["all", "facebook"]:
-            self.scheduler.add_recurring_task(
-                self._process_facebook_interactions,
-                interval=300  # cada 5 minutos
-            )
-        
-        if platform in ["all", "instagram"]:
-            self.scheduler.add_recurring_task(
-                self._process_instagram_interactions,
-                interval=600  # cada 10 minutos
-            )
+        await self.scheduler.schedule_posts_bulk(scheduled_posts)
+        
+        # Configurar automatizaciones periódicas: una tarea por plataforma, así
+        # un ciclo lento de una plataforma no retrasa a las demás
+        for name, interval in self.INTERACTION_INTERVALS.items():
+            if platform in ["all", name]:
+                self.scheduler.add_recurring_task(
+                    self._process_platform_interactions,
+                    interval=interval,
+                    task_id=f"interactions_{name}",
+                    args=[name]
+                )
     
     async def _interactive_post(self):
         """Maneja la publicación interactiva"""
@@ -135,7 +149,7 @@ class AutomationManager:
         for i, platform in enumerate(platforms, 1):
             print(f"{i}. {platform.title()}")
         
-        platform_choice = input("Seleccione plataforma: ").strip()
+        platform_choice = await self._ainput("Seleccione plataforma: ")
         try:
             platform = platforms[int(platform_choice) - 1]
         except (ValueError, IndexError):
@@ -143,8 +157,8 @@ class AutomationManager:
             return
         
         # Obtener contenido
-        content = input("Contenido del post: ").strip()
-        media_path = input("Ruta de media (opcional): ").strip()
+        content = await self._ainput("Contenido del post: ")
+        media_path = await self._ainput("Ruta de media (opcional): ")
         
         if content:
             try:
@@ -178,7 +192,7 @@ class AutomationManager:
         print("2. Agregar nuevo contenido")
         print("3. Programar publicación")
         
-        choice = input("Seleccione opción: ").strip()
+        choice = await self._ainput("Seleccione opción: ")
         
         if choice == "1":
             content_list = await self.content_manager.list_content()
@@ -186,8 +200,8 @@ class AutomationManager:
                 print(f"- {content['title']}: {content['content'][:30]}...")
         
         elif choice == "2":
-            title = input("Título: ").strip()
-            content = input("Contenido: ").strip()
+            title = await self._ainput("Título: ")
+            content = await self._ainput("Contenido: ")
             
             if title and content:
                 await self.content_manager.add_content({
@@ -217,34 +231,33 @@ class AutomationManager:
         print("2. Configurar programación de posts")
         print("3. Configurar métricas")
         
-        choice = input("Seleccione opción: ").strip()
+        choice = await self._ainput("Seleccione opción: ")
         # Implementar configuraciones según la opción
         print("Configuración en desarrollo...")
     
-    async def _process_facebook_interactions(self):
-        """Procesa interacciones de Facebook"""
+    async def _process_platform_interactions(self, platform: str):
+        """Procesa las interacciones de una plataforma"""
         try:
-            facebook_client = self.platform_factory.get_client('facebook')
-            if facebook_client:
+            client = self.platform_factory.get_client(platform)
+            if client:
                 await self.automations['interaction'].process_platform_interactions(
-                    'facebook', facebook_client
+                    platform, client
                 )
         except Exception as e:
-            logger.error(f"Error procesando interacciones de Facebook: {e}")
-    
-    async def _process_instagram_interactions(self):
-        """Procesa interacciones de Instagram"""
-        try:
-            instagram_client = self.platform_factory.get_client('instagram')
-            if instagram_client:
-                await self.automations['interaction'].process_platform_interactions(
-                    'instagram', instagram_client
-                )
-        except Exception as e:
-            logger.error(f"Error procesando interacciones de Instagram: {e}")
+            logger.error(f"Error procesando interacciones de {platform.title()}: {e}")
     
     def stop(self):
         """Detiene el gestor de automatización"""
         logger.info("Deteniendo AutomationManager")
         self._running = False
-        self.scheduler.stop()
\ No newline at end of file
+        
+        # stop() puede llamarse desde otro hilo (p. ej. un manejador de señales)
+        if self._stop_event is not None and self._loop is not None and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._stop_event.set)
+        
+        self.scheduler.stop()
+    
+    async def aclose(self):
+        """Libera los recursos asíncronos (resultados pendientes y conexiones HTTP)"""
+        await self.scheduler.flush_pending_marks()
+        await self.platform_factory.aclose()
\ No newline at end of file
@@ -3,40 +3,131 @@ Gestor de configuración
 """
 
 import os
+import hashlib
+import pickle
+import tempfile
 import yaml
 import json
-from typing import Dict, Any, Optional
+from functools import lru_cache
+from typing import Callable, Dict, Any, Mapping, Optional, Tuple
 from pathlib import Path
 from dotenv import load_dotenv
 
 from src.utils.logger import setup_logger
+from src.utils.paths import ensure_dirs
+
+# Usar LibYAML (extensión en C) si está disponible
+try:
+    from yaml import CSafeLoader as _YamlLoader, CSafeDumper as _YamlDumper
+except ImportError:
+    from yaml import SafeLoader as _YamlLoader, SafeDumper as _YamlDumper
 
 logger = setup_logger(__name__)
 
 
+def _default_cache_dir() -> Path:
+    """Directorio de caché del usuario para la configuración ya parseada"""
+    base = os.environ.get('XDG_CACHE_HOME') or Path.home() / '.cache'
+    return Path(base) / 'fanpage_automation'
+
+
+@lru_cache(maxsize=512)
+def _split_key_path(key_path: str) -> Tuple[str, ...]:
+    """Separa una ruta con puntos; las rutas usadas son pocas y se repiten"""
+    return tuple(key_path.split('.'))
+
+
+def _env_bool(value: str) -> bool:
+    """Interpreta una variable de entorno booleana"""
+    return value.lower() == 'true'
+
+
+@lru_cache(maxsize=128)
+def _cast_env_value(cast: Callable[[str], Any], raw_value: str) -> Any:
+    """Convierte el valor de una variable de entorno
+    
+    La clave incluye el texto leído, así una recarga siempre ve el entorno
+    actual y solo se evita volver a convertir valores que no cambiaron.
+    """
+    return cast(raw_value)
+
+
 class ConfigManager:
     """Gestor de configuración de la aplicación"""
     
+    # (variable de entorno, ruta en la configuración, conversión)
+    _ENV_OVERRIDES: Tuple[Tuple[str, str, Callable[[str], Any]], ...] = (
+        ('DEBUG', 'general.debug', _env_bool),
+        ('LOG_LEVEL', 'general.log_level', str),
+        ('TIMEZONE', 'general.timezone', str),
+        ('DATABASE_URL', 'database.url', str),
+        ('SCHEDULER_INTERVAL', 'scheduler.interval', int),
+        ('MAX_RETRIES', 'scheduler.max_retries', int),
+        ('API_HOST', 'api.host', str),
+        ('API_PORT', 'api.port', int),
+        ('API_SECRET_KEY', 'api.secret_key', str),
+        ('MEDIA_UPLOAD_PATH', 'content.media_upload_path', str),
+        ('MAX_FILE_SIZE', 'content.max_file_size', int),
+        ('LOG_FILE', 'logging.file', str),
+    )
+    
+    # Credenciales por plataforma: clave de configuración -> variable de entorno
+    _PLATFORM_ENV_VARS: Dict[str, Dict[str, str]] = {
+        'facebook': {
+            'app_id': 'FACEBOOK_APP_ID',
+            'app_secret': 'FACEBOOK_APP_SECRET',
+            'access_token': 'FACEBOOK_ACCESS_TOKEN'
+        },
+        'instagram': {
+            'username': 'INSTAGRAM_USERNAME',
+            'password': 'INSTAGRAM_PASSWORD'
+        },
+        'twitter': {
+            'api_key': 'TWITTER_API_KEY',
+            'api_secret': 'TWITTER_API_SECRET',
+            'access_token': 'TWITTER_ACCESS_TOKEN',
+            'access_token_secret': 'TWITTER_ACCESS_TOKEN_SECRET'
+        }
+    }
+    
     def __init__(self, config_path: str = "config/config.yaml"):
         self.config_path = Path(config_path)
-        self.config: Dict[str, Any] = {}
+        self.cache_dir = _default_cache_dir()
+        
+        # Se carga de forma perezosa en el primer acceso (ver `config`)
+        self._config: Optional[Dict[str, Any]] = None
         
         # Cargar variables de entorno
         load_dotenv()
     
+    @property
+    def config(self) -> Dict[str, Any]:
+        """Configuración actual; se carga en el primer acceso"""
+        if self._config is None:
+            self.load_config()
+        return self._config
+    
+    @config.setter
+    def config(self, value: Dict[str, Any]):
+        self._config = value
+    
     def load_config(self) -> Dict[str, Any]:
-        """Carga la configuración desde archivo y variables de entorno"""
+        """Carga (o recarga) la configuración desde archivo y variables de entorno
+        
+        No crea directorios: llamar a ensure_dirs() antes de usar rutas de datos.
+        """
+        self._config = {}
         
         # Cargar configuración base desde archivo
         if self.config_path.exists():
             try:
-                with open(self.config_path, 'r', encoding='utf-8') as file:
-                    if self.config_path.suffix.lower() == '.yaml':
-                        self.config = yaml.safe_load(file) or {}
-                    elif self.config_path.suffix.lower() == '.json':
+                if self.config_path.suffix.lower() == '.yaml':
+                    self.config = self._load_yaml_cached()
+                elif self.config_path.suffix.lower() == '.json':
+                    with open(self.config_path, 'r', encoding='utf-8') as file:
                         self.config = json.load(file)
-                    else:
-                        logger.warning(f"Formato de configuración no soportado: {self.config_path.suffix}")
+                else:
+                    logger.warning(f"Formato de configuración no soportado: {self.config_path.suffix}")
                         
                 logger.info(f"Configuración cargada desde: {self.config_path}")
             except Exception as e:
@@ -54,6 +145,50 @@ class ConfigManager:
         
         return self.config
     
+    def _load_yaml_cached(self) -> Dict[str, Any]:
+        """Parsea el YAML reutilizando la copia en caché si el archivo no cambió
+        
+        Hay un solo archivo de caché por ruta de configuración, que guarda el
+        mtime y tamaño del YAML parseado: cualquier edición lo invalida y la
+        nueva versión lo sustituye, sin dejar copias antiguas. Solo se guarda
+        el contenido del archivo: las variables de entorno se aplican siempre
+        después.
+        """
+        stat_result = self.config_path.stat()
+        file_version = (stat_result.st_mtime_ns, stat_result.st_size)
+        path_hash = hashlib.sha1(str(self.config_path.resolve()).encode('utf-8')).hexdigest()
+        cache_file = self.cache_dir / f"config_{path_hash}.pkl"
+        
+        try:
+            with open(cache_file, 'rb') as file:
+                cached_version, cached_config = pickle.load(file)
+            if cached_version == file_version:
+                return cached_config
+        except FileNotFoundError:
+            pass
+        except Exception as e:
+            logger.debug(f"Caché de configuración inválida, se ignora: {e}")
+        
+        with open(self.config_path, 'r', encoding='utf-8') as file:
+            config = yaml.load(file, Loader=_YamlLoader) or {}
+        
+        # Escritura atómica: archivo temporal + os.replace; mkstemp lo crea con
+        # permisos 0600, ya que la configuración puede contener credenciales
+        try:
+            self.cache_dir.mkdir(mode=0o700, parents=True, exist_ok=True)
+            fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.tmp')
+            try:
+                with os.fdopen(fd, 'wb') as file:
+                    pickle.dump((file_version, config), file, protocol=pickle.HIGHEST_PROTOCOL)
+                os.replace(tmp_path, cache_file)
+            except BaseException:
+                os.unlink(tmp_path)
+                raise
+        except Exception as e:
+            logger.debug(f"No se pudo escribir la caché de configuración: {e}")
+        
+        return config
+    
     def _get_default_config(self) -> Dict[str, Any]:
         """Retorna la configuración por defecto"""
         return {
@@ -109,74 +244,27 @@ class ConfigManager:
     
     def _override_with_env_vars(self):
         """Sobrescribe configuración con variables de entorno"""
+        env = os.environ
         
-        # Configuración general
-        if os.getenv('DEBUG'):
-            self.config.setdefault('general', {})['debug'] = os.getenv('DEBUG').lower() == 'true'
-        
-        if os.getenv('LOG_LEVEL'):
-            self.config.setdefault('general', {})['log_level'] = os.getenv('LOG_LEVEL')
-        
-        if os.getenv('TIMEZONE'):
-            self.config.setdefault('general', {})['timezone'] = os.getenv('TIMEZONE')
-        
-        # Base de datos
-        if os.getenv('DATABASE_URL'):
-            self.config.setdefault('database', {})['url'] = os.getenv('DATABASE_URL')
-        
-        # Scheduler
-        if os.getenv('SCHEDULER_INTERVAL'):
-            self.config.setdefault('scheduler', {})['interval'] = int(os.getenv('SCHEDULER_INTERVAL'))
-        
-        if os.getenv('MAX_RETRIES'):
-            self.config.setdefault('scheduler', {})['max_retries'] = int(os.getenv('MAX_RETRIES'))
-        
-        # API
-        if os.getenv('API_HOST'):
-            self.config.setdefault('api', {})['host'] = os.getenv('API_HOST')
-        
-        if os.getenv('API_PORT'):
-            self.config.setdefault('api', {})['port'] = int(os.getenv('API_PORT'))
-        
-        if os.getenv('API_SECRET_KEY'):
-            self.config.setdefault('api', {})['secret_key'] = os.getenv('API_SECRET_KEY')
+        # Configuración general, base de datos, scheduler, API, contenido y logging
+        for env_var, key_path, cast in self._ENV_OVERRIDES:
+            env_value = env.get(env_var)
+            if env_value:
+                self.set(key_path, _cast_env_value(cast, env_value))
         
         # Plataformas
-        self._load_platform_config('facebook', {
-            'app_id': 'FACEBOOK_APP_ID',
-            'app_secret': 'FACEBOOK_APP_SECRET',
-            'access_token': 'FACEBOOK_ACCESS_TOKEN'
-        })
-        
-        self._load_platform_config('instagram', {
-            'username': 'INSTAGRAM_USERNAME',
-            'password': 'INSTAGRAM_PASSWORD'
-        })
-        
-        self._load_platform_config('twitter', {
-            'api_key': 'TWITTER_API_KEY',
-            'api_secret': 'TWITTER_API_SECRET',
-            'access_token': 'TWITTER_ACCESS_TOKEN',
-            'access_token_secret': 'TWITTER_ACCESS_TOKEN_SECRET'
-        })
-        
-        # Contenido
-        if os.getenv('MEDIA_UPLOAD_PATH'):
-            self.config.setdefault('content', {})['media_upload_path'] = os.getenv('MEDIA_UPLOAD_PATH')
-        
-        if os.getenv('MAX_FILE_SIZE'):
-            self.config.setdefault('content', {})['max_file_size'] = int(os.getenv('MAX_FILE_SIZE'))
-        
-        # Logging
-        if os.getenv('LOG_FILE'):
-            self.config.setdefault('logging', {})['file'] = os.getenv('LOG_FILE')
+        for platform, env_mapping in self._PLATFORM_ENV_VARS.items():
+            self._load_platform_config(platform, env_mapping, env)
     
-    def _load_platform_config(self, platform: str, env_mapping: Dict[str, str]):
+    def _load_platform_config(self, platform: str, env_mapping: Dict[str, str],
+                              env: Optional[Mapping[str, str]] = None):
         """Carga configuración de plataforma desde variables de entorno"""
+        if env is None:
+            env = os.environ
         platform_config = self.config.setdefault('platforms', {}).setdefault(platform, {})
         
         for config_key, env_var in env_mapping.items():
-            env_value = os.getenv(env_var)
+            env_value = env.get(env_var)
             if env_value:
                 platform_config[config_key] = env_value
                 platform_config['enabled'] = True
@@ -198,12 +286,9 @@ class ConfigManager:
         
         if not platforms_enabled:
             logger.warning("No hay plataformas habilitadas. Revise la configuración.")
-        
-        # Crear directorios necesarios
-        self._create_required_directories()
     
-    def _create_required_directories(self):
-        """Crea los directorios necesarios"""
+    def ensure_dirs(self):
+        """Crea los directorios necesarios (datos, logs, media y plantillas)"""
         directories = [
             'data',
             'logs',
@@ -212,12 +297,11 @@ class ConfigManager:
             os.path.dirname(self.config.get('logging', {}).get('file', 'logs/fanpage_automation.log'))
         ]
         
-        for directory in directories:
-            Path(directory).mkdir(parents=True, exist_ok=True)
+        ensure_dirs(*directories)
     
     def get(self, key_path: str, default: Any = None) -> Any:
         """Obtiene un valor de configuración usando notación de puntos"""
-        keys = key_path.split('.')
+        keys = _split_key_path(key_path)
         value = self.config
         
         try:
@@ -229,7 +313,7 @@ class ConfigManager:
     
     def set(self, key_path: str, value: Any):
         """Establece un valor de configuración usando notación de puntos"""
-        keys = key_path.split('.')
+        keys = _split_key_path(key_path)
         config_ref = self.config
         
         for key in keys[:-1]:
@@ -247,7 +331,7 @@ class ConfigManager:
             save_path.parent.mkdir(parents=True, exist_ok=True)
             
             with open(save_path, 'w', encoding='utf-8') as file:
-                yaml.dump(self.config, file, default_flow_style=False, allow_unicode=True)
+                yaml.dump(self.config, file, Dumper=_YamlDumper, default_flow_style=False, allow_unicode=True)
             
             logger.info(f"Configuración guardada en: {save_path}")
         except Exception as e:
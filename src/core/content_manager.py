@@ -2,19 +2,50 @@
 Gestor de contenido
 """
 
+import io
 import os
+import re
 import asyncio
-from typing import Dict, List, Any, Optional
+import copy
+import secrets
+from collections import OrderedDict
+from typing import AsyncIterator, BinaryIO, Dict, Iterable, List, Any, Optional, Sequence, Tuple, Union
 from datetime import datetime, timedelta
+from functools import lru_cache
 from pathlib import Path
 import json
 import hashlib
 
+try:
+    import orjson
+except ImportError:  # opcional: se usa json de la librería estándar
+    orjson = None
+
 from src.utils.database import DatabaseManager
 from src.utils.logger import setup_logger
+from src.utils.paths import ensure_dirs
 
 logger = setup_logger(__name__)
 
+# Caracteres no permitidos en nombres de archivo (solo ASCII alfanumérico y ._-)
+_UNSAFE_FILENAME_CHARS = re.compile(r'[^A-Za-z0-9._-]+')
+
+# Variables de plantilla: {nombre}
+_TEMPLATE_VARIABLE = re.compile(r'\{([^{}]+)\}')
+
+# Tamaño de bloque para copiar archivos multimedia
+MEDIA_CHUNK_SIZE = 1 << 20  # 1MB
+
+
+@lru_cache(maxsize=128)
+def _load_template_file(path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """Parsea una plantilla JSON; mtime y tamaño forman parte de la clave de caché"""
+    if orjson is not None:
+        return orjson.loads(Path(path).read_bytes())
+    
+    with open(path, 'r', encoding='utf-8') as f:
+        return json.load(f)
+
 
 class ContentManager:
     """Gestor de contenido y publicaciones"""
@@ -26,12 +57,18 @@ class ContentManager:
         self.templates_path = Path(config.get('content', {}).get('templates_path', 'data/templates/'))
         
         # Crear directorios si no existen
-        self.media_path.mkdir(parents=True, exist_ok=True)
-        self.templates_path.mkdir(parents=True, exist_ok=True)
+        ensure_dirs(self.media_path, self.templates_path)
+        
+        # IDs de contenido que se sabe que existen (LRU): evita consultar la DB
+        # en cada schedule_post; el borrado es lógico, así que la fila persiste
+        self._known_content_ids: OrderedDict[str, None] = OrderedDict()
+        self._known_content_ids_size = config.get('content', {}).get('known_ids_cache_size', 4096)
     
     async def add_content(self, content_data: Dict[str, Any]) -> str:
         """Agrega nuevo contenido"""
-        content_id = self._generate_content_id(content_data)
+        # Una sola marca de tiempo para el ID y las fechas del registro
+        now = datetime.now()
+        content_id = self._generate_content_id(content_data, now)
         
         content_record = {
             'id': content_id,
@@ -39,19 +76,30 @@ class ContentManager:
             'content': content_data.get('content', ''),
             'media_paths': content_data.get('media_paths', []),
             'tags': content_data.get('tags', []),
-            'created_at': datetime.now(),
-            'updated_at': datetime.now(),
+            'created_at': now,
+            'updated_at': now,
             'status': 'active'
         }
         
         await self.db_manager.save_content(content_record)
+        self._remember_content_id(content_id)
         logger.info(f"Contenido agregado: {content_id}")
         
         return content_id
     
     async def get_content(self, content_id: str) -> Optional[Dict[str, Any]]:
         """Obtiene contenido por ID"""
-        return await self.db_manager.get_content(content_id)
+        content = await self.db_manager.get_content(content_id)
+        if content:
+            self._remember_content_id(content_id)
+        return content
+    
+    def _remember_content_id(self, content_id: str):
+        """Registra un ID de contenido existente en la LRU"""
+        self._known_content_ids[content_id] = None
+        self._known_content_ids.move_to_end(content_id)
+        if len(self._known_content_ids) > self._known_content_ids_size:
+            self._known_content_ids.popitem(last=False)
     
     async def list_content(self, limit: int = 50, status: str = 'active') -> List[Dict[str, Any]]:
         """Lista contenido disponible"""
@@ -69,15 +117,17 @@ class ContentManager:
     
     async def delete_content(self, content_id: str) -> bool:
         """Elimina contenido (soft delete)"""
+        self._known_content_ids.pop(content_id, None)
         return await self.update_content(content_id, {'status': 'deleted'})
     
     async def schedule_post(self, content_id: str, platform: str, scheduled_time: datetime, 
                            post_config: Optional[Dict[str, Any]] = None) -> str:
         """Programa una publicación"""
         
-        # Verificar que el contenido existe
-        content = await self.get_content(content_id)
-        if not content:
+        # Verificar que el contenido existe (sin ir a la DB si ya se vio)
+        if content_id in self._known_content_ids:
+            self._known_content_ids.move_to_end(content_id)
+        elif not await self.get_content(content_id):
             raise ValueError(f"Contenido no encontrado: {content_id}")
         
         # Crear registro de publicación programada
@@ -112,15 +162,27 @@ class ContentManager:
         
         return await self.db_manager.get_due_posts(current_time)
     
+    async def get_contents_bulk(self, content_ids: Iterable[str]) -> Dict[str, Dict[str, Any]]:
+        """Obtiene varios contenidos en una sola consulta, indexados por ID"""
+        return await self.db_manager.get_contents(list(content_ids))
+    
+    async def iter_due_posts(self, current_time: Optional[datetime] = None,
+                             chunk_size: int = 100) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Recorre en bloques las publicaciones que deben ejecutarse ahora"""
+        if current_time is None:
+            current_time = datetime.now()
+        
+        async for chunk in self.db_manager.iter_due_posts(current_time, chunk_size):
+            yield chunk
+    
+    def iter_scheduled_posts(self, status: str = 'scheduled', columns: Sequence[str] = ('id', 'scheduled_time', 'attempts', 'max_attempts'),
+                             until: Optional[datetime] = None) -> AsyncIterator[Tuple]:
+        """Recorre publicaciones proyectando solo las columnas indicadas"""
+        return self.db_manager.iter_scheduled_posts(status=status, columns=columns, until=until)
+    
     async def mark_post_published(self, post_id: str, result: Dict[str, Any]):
         """Marca una publicación como publicada"""
-        updates = {
-            'status': 'published',
-            'published_at': datetime.now(),
-            'result': result
-        }
-        
-        await self.db_manager.update_scheduled_post(post_id, updates)
+        await self.db_manager.update_scheduled_post(post_id, self._published_updates(result))
         logger.info(f"Publicación marcada como publicada: {post_id}")
     
     async def mark_post_failed(self, post_id: str, error: str):
@@ -129,13 +191,64 @@ class ContentManager:
         if not post:
             return
         
+        await self.db_manager.update_scheduled_post(post_id, self._failed_updates(post, error))
+    
+    async def mark_posts_bulk(self, outcomes: List[Tuple[Dict[str, Any], str, Any]],
+                              now: Optional[datetime] = None):
+        """Marca varias publicaciones en una sola transacción
+        
+        Cada resultado es (post, estado, datos) con estado 'published' (datos =
+        resultado de la plataforma) o 'failed' (datos = mensaje de error). Los
+        contadores de intentos de las fallidas se leen de la base de datos en
+        una sola consulta, no de la copia del post encolada al programarlo.
+        Todo el lote comparte una misma marca de tiempo.
+        """
+        if now is None:
+            now = datetime.now()
+        
+        failed_ids = [post['id'] for post, status, _ in outcomes if status != 'published']
+        attempts_by_id = await self.db_manager.get_post_attempts(failed_ids)
+        
+        updates_by_id = {}
+        for post, status, data in outcomes:
+            post_id = post['id']
+            if status == 'published':
+                updates_by_id[post_id] = self._published_updates(data, now)
+            elif post_id in attempts_by_id:
+                attempts, max_attempts = attempts_by_id[post_id]
+                updates = self._failed_updates(
+                    {'id': post_id, 'attempts': attempts, 'max_attempts': max_attempts}, str(data), now
+                )
+                # Un mismo post fallido dos veces en el lote suma ambos intentos
+                attempts_by_id[post_id] = (updates['attempts'], max_attempts)
+                updates_by_id[post_id] = updates
+        
+        await self.db_manager.update_scheduled_posts(updates_by_id)
+        logger.info(f"{len(updates_by_id)} publicaciones marcadas")
+    
+    def _published_updates(self, result: Dict[str, Any],
+                           now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Cambios para una publicación publicada"""
+        return {
+            'status': 'published',
+            'published_at': now or datetime.now(),
+            'result': result
+        }
+    
+    def _failed_updates(self, post: Dict[str, Any], error: str,
+                        now: Optional[datetime] = None) -> Dict[str, Any]:
+        """Cambios para una publicación fallida (reintento o fallo definitivo)"""
+        if now is None:
+            now = datetime.now()
+        
+        post_id = post.get('id')
         attempts = post.get('attempts', 0) + 1
         max_attempts = post.get('max_attempts', 3)
         
         updates = {
             'attempts': attempts,
             'last_error': error,
-            'updated_at': datetime.now()
+            'updated_at': now
         }
         
         if attempts >= max_attempts:
@@ -144,27 +257,45 @@ class ContentManager:
         else:
             # Reprogramar para más tarde
             retry_delay = self.config.get('scheduler', {}).get('retry_delay', 60)
-            new_time = datetime.now() + timedelta(seconds=retry_delay * attempts)
+            new_time = now + timedelta(seconds=retry_delay * attempts)
             updates['scheduled_time'] = new_time
             logger.warning(f"Reprogramando publicación {post_id} para {new_time}")
         
-        await self.db_manager.update_scheduled_post(post_id, updates)
+        return updates
     
-    async def save_media(self, media_data: bytes, filename: str, 
+    async def save_media(self, media_data: Union[bytes, BinaryIO], filename: str, 
                         content_type: str = 'image/jpeg') -> str:
-        """Guarda archivo multimedia"""
+        """Guarda archivo multimedia
+        
+        `media_data` puede ser bytes o un archivo binario abierto; en ese caso se
+        copia por bloques, calculando el hash a la vez, sin cargarlo entero en memoria.
+        """
+        if isinstance(media_data, (bytes, bytearray, memoryview)):
+            media_stream = io.BytesIO(media_data)
+        else:
+            media_stream = media_data
         
-        # Generar nombre de archivo único
-        file_hash = hashlib.md5(media_data).hexdigest()[:8]
         timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
         safe_filename = self._sanitize_filename(filename)
         
-        new_filename = f"{timestamp}_{file_hash}_{safe_filename}"
-        file_path = self.media_path / new_filename
-        
-        # Guardar archivo
-        with open(file_path, 'wb') as f:
-            f.write(media_data)
+        # Copiar a un temporal calculando el hash; el nombre final depende del hash
+        file_hash = hashlib.blake2b(digest_size=4)
+        # open('xb') en lugar de mkstemp: así el archivo recibe los permisos
+        # por defecto (umask) y no 0600
+        tmp_path = self.media_path / f".{secrets.token_hex(8)}.part"
+        f = open(tmp_path, 'xb')
+        try:
+            with f:
+                while chunk := media_stream.read(MEDIA_CHUNK_SIZE):
+                    file_hash.update(chunk)
+                    f.write(chunk)
+            
+            new_filename = f"{timestamp}_{file_hash.hexdigest()}_{safe_filename}"
+            file_path = self.media_path / new_filename
+            os.replace(tmp_path, file_path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
         
         logger.info(f"Media guardado: {file_path}")
         return str(file_path)
@@ -192,25 +323,34 @@ class ContentManager:
             'created_by': template_data.get('created_by', 'system')
         }
         
-        with open(template_file, 'w', encoding='utf-8') as f:
-            json.dump(template_record, f, indent=2, ensure_ascii=False)
+        if orjson is not None:
+            template_file.write_bytes(orjson.dumps(template_record, option=orjson.OPT_INDENT_2))
+        else:
+            with open(template_file, 'w', encoding='utf-8') as f:
+                json.dump(template_record, f, indent=2, ensure_ascii=False)
+        _load_template_file.cache_clear()
         
         logger.info(f"Plantilla creada: {template_name}")
         return str(template_file)
     
     async def load_content_template(self, template_name: str) -> Optional[Dict[str, Any]]:
-        """Carga una plantilla de contenido"""
+        """Carga una plantilla de contenido (cacheada mientras el archivo no cambie)"""
         template_file = self.templates_path / f"{template_name}.json"
         
-        if not template_file.exists():
+        try:
+            stat_result = template_file.stat()
+        except FileNotFoundError:
             return None
         
         try:
-            with open(template_file, 'r', encoding='utf-8') as f:
-                return json.load(f)
+            template = _load_template_file(str(template_file), stat_result.st_mtime_ns, stat_result.st_size)
         except Exception as e:
             logger.error(f"Error cargando plantilla {template_name}: {e}")
             return None
+        
+        # Copia completa: las listas anidadas (variables, platforms) también
+        # pertenecen a la versión cacheada
+        return copy.deepcopy(template)
     
     async def generate_content_from_template(self, template_name: str, 
                                            variables: Dict[str, Any]) -> Dict[str, Any]:
@@ -222,9 +362,11 @@ class ContentManager:
         
         content_template = template.get('content_template', '')
         
-        # Reemplazar variables en la plantilla
-        for var_name, var_value in variables.items():
-            content_template = content_template.replace(f"{{{var_name}}}", str(var_value))
+        # Reemplazar variables en la plantilla en una sola pasada; las desconocidas se dejan tal cual
+        content_template = _TEMPLATE_VARIABLE.sub(
+            lambda match: str(variables[match.group(1)]) if match.group(1) in variables else match.group(0),
+            content_template
+        )
         
         return {
             'title': f"Contenido desde plantilla {template_name}",
@@ -233,21 +375,27 @@ class ContentManager:
             'variables_used': variables
         }
     
-    def _generate_content_id(self, content_data: Dict[str, Any]) -> str:
+    def _generate_content_id(self, content_data: Dict[str, Any],
+                             now: Optional[datetime] = None) -> str:
         """Genera ID único para contenido"""
         content_text = content_data.get('content', '')
-        timestamp = datetime.now().isoformat()
         
-        hash_source = f"{content_text[:100]}{timestamp}"
-        return f"content_{hashlib.md5(hash_source.encode()).hexdigest()[:12]}"
+        # Alimentar el hash por partes evita construir la cadena concatenada;
+        # isoformat() es ASCII puro
+        digest = hashlib.blake2b(digest_size=6)
+        digest.update(content_text[:100].encode('utf-8', 'ignore'))
+        digest.update((now or datetime.now()).isoformat().encode('ascii'))
+        return f"content_{digest.hexdigest()}"
     
     def _generate_post_id(self, content_id: str, platform: str, scheduled_time: datetime) -> str:
         """Genera ID único para publicación programada"""
-        hash_source = f"{content_id}{platform}{scheduled_time.isoformat()}"
-        return f"post_{hashlib.md5(hash_source.encode()).hexdigest()[:12]}"
+        digest = hashlib.blake2b(digest_size=6)
+        digest.update(content_id.encode('utf-8', 'ignore'))
+        digest.update(platform.encode('utf-8', 'ignore'))
+        digest.update(scheduled_time.isoformat().encode('ascii'))
+        return f"post_{digest.hexdigest()}"
     
     def _sanitize_filename(self, filename: str) -> str:
         """Sanitiza nombre de archivo"""
         # Remover caracteres peligrosos
-        safe_chars = "abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789.-_"
-        return ''.join(c for c in filename if c in safe_chars)
\ No newline at end of file
+        return _UNSAFE_FILENAME_CHARS.sub('', filename)
\ No newline at end of file
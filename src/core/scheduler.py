@@ -3,31 +3,92 @@ Programador de tareas
 """
 
 import asyncio
-from typing import Dict, List, Any, Callable, Optional
+import heapq
+from typing import Dict, List, Any, Callable, Optional, Set, Tuple
 from datetime import datetime, timedelta
+from functools import lru_cache
 from apscheduler.schedulers.asyncio import AsyncIOScheduler
 from apscheduler.triggers.cron import CronTrigger
-from apscheduler.triggers.date import DateTrigger
 from apscheduler.triggers.interval import IntervalTrigger
 
 from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
 
+# Columnas que necesita reschedule_failed_posts para reprogramar un post
+RETRY_POST_COLUMNS = ('id', 'content_id', 'platform', 'scheduled_time', 'config', 'attempts', 'max_attempts')
+
+
+@lru_cache(maxsize=256)
+def _build_cron_trigger(cron_expression: str) -> CronTrigger:
+    """Construye (y reutiliza) el CronTrigger de una expresión de 5 campos
+    
+    Los triggers no guardan estado entre ejecuciones, así que varias tareas
+    con la misma expresión pueden compartir la misma instancia.
+    """
+    cron_parts = cron_expression.split()
+    if len(cron_parts) != 5:
+        raise ValueError("se esperaban 5 campos")
+    
+    minute, hour, day, month, day_of_week = cron_parts
+    return CronTrigger(
+        minute=minute,
+        hour=hour,
+        day=day,
+        month=month,
+        day_of_week=day_of_week
+    )
+
 
 class SchedulerManager:
     """Gestor de programación de tareas"""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], content_manager=None, platform_factory=None):
         self.config = config
         self.scheduler = AsyncIOScheduler()
-        self.running_tasks: Dict[str, Any] = {}
         self._is_running = False
+        
+        # Dependencias compartidas: inyectadas o creadas una sola vez al primer uso
+        self._content_manager = content_manager
+        self._platform_factory = platform_factory
+        
+        # Resultados de publicaciones pendientes de registrar en un solo lote
+        self._pending_marks: List[Tuple[Dict[str, Any], str, Any]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+        self._mark_flush_delay = config.get('scheduler', {}).get('mark_flush_delay', 0.5)
+        
+        # Publicaciones programadas: un heap por fecha y un único bucle que
+        # duerme hasta la próxima, en lugar de un job de APScheduler por post
+        self._post_heap: List[Tuple[datetime, str]] = []
+        self._pending_posts: Dict[str, Tuple[datetime, Dict[str, Any]]] = {}
+        self._dispatch_task: Optional[asyncio.Task] = None
+        self._dispatch_wakeup: Optional[asyncio.Event] = None
+        self._executing: Set[asyncio.Task] = set()
+        self._max_dispatch_sleep = config.get('scheduler', {}).get('max_dispatch_sleep', 60)
+    
+    @property
+    def content_manager(self):
+        """ContentManager compartido por todas las ejecuciones"""
+        if self._content_manager is None:
+            # Importar aquí para evitar dependencia circular
+            from src.core.content_manager import ContentManager
+            self._content_manager = ContentManager(self.config)
+        return self._content_manager
+    
+    @property
+    def platform_factory(self):
+        """PlatformFactory compartido por todas las ejecuciones"""
+        if self._platform_factory is None:
+            from src.platforms.platform_factory import PlatformFactory
+            self._platform_factory = PlatformFactory(self.config)
+        return self._platform_factory
     
     async def start(self):
         """Inicia el programador"""
         if not self._is_running:
             self.scheduler.start()
+            self._dispatch_wakeup = asyncio.Event()
+            self._dispatch_task = asyncio.create_task(self._dispatch_loop())
             self._is_running = True
             logger.info("Scheduler iniciado")
     
@@ -35,39 +96,90 @@ class SchedulerManager:
         """Detiene el programador"""
         if self._is_running:
             self.scheduler.shutdown()
+            if self._dispatch_task is not None:
+                self._dispatch_task.cancel()
+                self._dispatch_task = None
             self._is_running = False
             logger.info("Scheduler detenido")
     
     async def schedule_post(self, post_data: Dict[str, Any]):
         """Programa una publicación específica"""
+        if self._add_post_job(post_data, datetime.now()):
+            logger.info(f"Post programado: {post_data.get('id')} para {post_data.get('scheduled_time')}")
+    
+    async def schedule_posts_bulk(self, posts: List[Dict[str, Any]]) -> int:
+        """Programa varias publicaciones de una vez (p. ej. al arrancar)
+        
+        Registrar un job en APScheduler no hace I/O, así que se agregan todos
+        en un solo bucle con una única lectura del reloj.
+        """
+        now = datetime.now()
+        scheduled = sum(1 for post_data in posts if self._add_post_job(post_data, now))
+        logger.info(f"{scheduled}/{len(posts)} publicaciones programadas")
+        return scheduled
+    
+    def _add_post_job(self, post_data: Dict[str, Any], now: datetime) -> bool:
+        """Registra el job de una publicación; retorna False si no se pudo programar"""
         post_id = post_data.get('id')
         scheduled_time = post_data.get('scheduled_time')
         
         if not post_id or not scheduled_time:
             logger.error("Datos insuficientes para programar publicación")
-            return
-        
-        # Convertir a datetime si es string
-        if isinstance(scheduled_time, str):
-            scheduled_time = datetime.fromisoformat(scheduled_time)
+            return False
         
         # Verificar que la fecha sea futura
-        if scheduled_time <= datetime.now():
+        if scheduled_time <= now:
             logger.warning(f"Fecha de programación ya pasó para post {post_id}")
-            return
+            return False
         
-        # Programar la tarea
-        job = self.scheduler.add_job(
-            self._execute_scheduled_post,
-            trigger=DateTrigger(run_date=scheduled_time),
-            args=[post_data],
-            id=f"post_{post_id}",
-            name=f"Publicación programada: {post_id}",
-            replace_existing=True
-        )
+        # Encolar en el heap; si ya estaba programado se reemplaza (la entrada
+        # anterior del heap queda obsoleta y se descarta al salir)
+        self._pending_posts[post_id] = (scheduled_time, post_data)
+        heapq.heappush(self._post_heap, (scheduled_time, post_id))
         
-        self.running_tasks[post_id] = job
-        logger.info(f"Post programado: {post_id} para {scheduled_time}")
+        # Despertar al bucle por si esta publicación es anterior a la que esperaba
+        if self._dispatch_wakeup is not None:
+            self._dispatch_wakeup.set()
+        return True
+    
+    def _pop_due_posts(self, now: datetime) -> List[Dict[str, Any]]:
+        """Saca del heap las publicaciones vencidas"""
+        due = []
+        while self._post_heap and self._post_heap[0][0] <= now:
+            scheduled_time, post_id = heapq.heappop(self._post_heap)
+            pending = self._pending_posts.get(post_id)
+            # Ignorar entradas reemplazadas o canceladas
+            if pending is None or pending[0] != scheduled_time:
+                continue
+            del self._pending_posts[post_id]
+            due.append(pending[1])
+        return due
+    
+    def _next_dispatch_delay(self, now: datetime) -> float:
+        """Segundos hasta la próxima publicación (acotado para tolerar saltos del reloj)"""
+        while self._post_heap:
+            scheduled_time, post_id = self._post_heap[0]
+            pending = self._pending_posts.get(post_id)
+            if pending is not None and pending[0] == scheduled_time:
+                return min(max((scheduled_time - now).total_seconds(), 0), self._max_dispatch_sleep)
+            heapq.heappop(self._post_heap)
+        return self._max_dispatch_sleep
+    
+    async def _dispatch_loop(self):
+        """Bucle único que ejecuta las publicaciones a medida que vencen"""
+        while True:
+            self._dispatch_wakeup.clear()
+            now = datetime.now()
+            
+            for post_data in self._pop_due_posts(now):
+                task = asyncio.create_task(self._execute_scheduled_post(post_data))
+                self._executing.add(task)
+                task.add_done_callback(self._executing.discard)
+            
+            try:
+                await asyncio.wait_for(self._dispatch_wakeup.wait(), self._next_dispatch_delay(now))
+            except asyncio.TimeoutError:
+                pass
     
     def add_recurring_task(self, func: Callable, interval: int, 
                           task_id: Optional[str] = None, **kwargs):
@@ -76,7 +188,7 @@ class SchedulerManager:
         if task_id is None:
             task_id = f"recurring_{func.__name__}_{interval}"
         
-        job = self.scheduler.add_job(
+        self.scheduler.add_job(
             func,
             trigger=IntervalTrigger(seconds=interval),
             id=task_id,
@@ -85,7 +197,6 @@ class SchedulerManager:
             **kwargs
         )
         
-        self.running_tasks[task_id] = job
         logger.info(f"Tarea recurrente agregada: {task_id} cada {interval}s")
     
     def add_cron_task(self, func: Callable, cron_expression: str, 
@@ -95,38 +206,35 @@ class SchedulerManager:
         if task_id is None:
             task_id = f"cron_{func.__name__}"
         
-        # Parsear expresión cron
-        cron_parts = cron_expression.split()
-        if len(cron_parts) != 5:
-            logger.error(f"Expresión cron inválida: {cron_expression}")
+        # Parsear expresión cron (un trigger por expresión distinta)
+        try:
+            trigger = _build_cron_trigger(cron_expression)
+        except ValueError as e:
+            logger.error(f"Expresión cron inválida: {cron_expression} ({e})")
             return
         
-        minute, hour, day, month, day_of_week = cron_parts
-        
-        job = self.scheduler.add_job(
+        self.scheduler.add_job(
             func,
-            trigger=CronTrigger(
-                minute=minute,
-                hour=hour,
-                day=day,
-                month=month,
-                day_of_week=day_of_week
-            ),
+            trigger=trigger,
             id=task_id,
             name=f"Tarea cron: {func.__name__}",
             replace_existing=True,
             **kwargs
         )
         
-        self.running_tasks[task_id] = job
         logger.info(f"Tarea cron agregada: {task_id} - {cron_expression}")
     
     def remove_task(self, task_id: str):
         """Elimina una tarea programada"""
+        # Publicaciones programadas (id "post_<id>", como en get_scheduled_jobs)
+        post_id = task_id[len('post_'):] if task_id.startswith('post_') else None
+        if post_id is not None and post_id in self._pending_posts:
+            del self._pending_posts[post_id]
+            logger.info(f"Tarea eliminada: {task_id}")
+            return
+        
         try:
             self.scheduler.remove_job(task_id)
-            if task_id in self.running_tasks:
-                del self.running_tasks[task_id]
             logger.info(f"Tarea eliminada: {task_id}")
         except Exception as e:
             logger.error(f"Error eliminando tarea {task_id}: {e}")
@@ -145,6 +253,15 @@ class SchedulerManager:
             }
             jobs.append(job_info)
         
+        for post_id, (scheduled_time, post_data) in self._pending_posts.items():
+            jobs.append({
+                'id': f"post_{post_id}",
+                'name': f"Publicación programada: {post_id}",
+                'next_run_time': scheduled_time,
+                'trigger': f"date[{scheduled_time.isoformat()}]",
+                'func_name': '_execute_scheduled_post'
+            })
+        
         return jobs
     
     async def _execute_scheduled_post(self, post_data: Dict[str, Any]):
@@ -154,22 +271,16 @@ class SchedulerManager:
         try:
             logger.info(f"Ejecutando publicación programada: {post_id}")
             
-            # Importar aquí para evitar dependencia circular
-            from src.core.automation_manager import AutomationManager
-            from src.platforms.platform_factory import PlatformFactory
-            from src.core.content_manager import ContentManager
-            
             # Obtener el contenido
-            content_manager = ContentManager(self.config)
+            content_manager = self.content_manager
             content = await content_manager.get_content(post_data.get('content_id'))
             
             if not content:
                 raise ValueError(f"Contenido no encontrado para post {post_id}")
             
             # Obtener cliente de la plataforma
-            platform_factory = PlatformFactory(self.config)
             platform = post_data.get('platform')
-            client = platform_factory.get_client(platform)
+            client = self.platform_factory.get_client(platform)
             
             if not client:
                 raise ValueError(f"Cliente no disponible para plataforma: {platform}")
@@ -186,25 +297,37 @@ class SchedulerManager:
                 **post_config
             )
             
-            # Marcar como publicado
-            await content_manager.mark_post_published(post_id, result)
+            # Marcar como publicado (en el próximo lote)
+            self._queue_mark(post_data, 'published', result)
             
             logger.info(f"Publicación ejecutada exitosamente: {post_id}")
             
         except Exception as e:
             logger.error(f"Error ejecutando publicación {post_id}: {e}")
             
-            # Marcar como fallida
-            try:
-                content_manager = ContentManager(self.config)
-                await content_manager.mark_post_failed(post_id, str(e))
-            except Exception as mark_error:
-                logger.error(f"Error marcando publicación como fallida: {mark_error}")
+            # Marcar como fallida (en el próximo lote, con los intentos de la DB)
+            self._queue_mark(post_data, 'failed', str(e))
+    
+    def _queue_mark(self, post_data: Dict[str, Any], status: str, data: Any):
+        """Encola el resultado de una publicación y programa el volcado del lote"""
+        self._pending_marks.append((post_data, status, data))
         
-        finally:
-            # Limpiar tarea de la lista
-            if post_id in self.running_tasks:
-                del self.running_tasks[post_id]
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.create_task(self._flush_marks_later())
+    
+    async def _flush_marks_later(self):
+        """Espera a que terminen las publicaciones del mismo instante y vuelca el lote"""
+        await asyncio.sleep(self._mark_flush_delay)
+        await self.flush_pending_marks()
+    
+    async def flush_pending_marks(self):
+        """Registra en una sola transacción todos los resultados pendientes"""
+        while self._pending_marks:
+            outcomes, self._pending_marks = self._pending_marks, []
+            try:
+                await self.content_manager.mark_posts_bulk(outcomes)
+            except Exception as e:
+                logger.error(f"Error registrando {len(outcomes)} resultados de publicaciones: {e}")
     
     def schedule_daily_task(self, func: Callable, hour: int, minute: int = 0, 
                            task_id: Optional[str] = None):
@@ -221,23 +344,18 @@ class SchedulerManager:
     async def reschedule_failed_posts(self):
         """Reprograma publicaciones fallidas que pueden reintentarse"""
         try:
-            from src.core.content_manager import ContentManager
-            
-            content_manager = ContentManager(self.config)
-            
-            # Obtener posts que necesitan reintento
-            retry_posts = await content_manager.get_scheduled_posts(status='scheduled')
+            # Recorrer solo las columnas necesarias de los posts ya vencidos
+            now = datetime.now()
+            retry_posts = self.content_manager.iter_scheduled_posts(
+                status='scheduled', columns=RETRY_POST_COLUMNS, until=now
+            )
             
-            for post in retry_posts:
-                scheduled_time = post.get('scheduled_time')
-                if isinstance(scheduled_time, str):
-                    scheduled_time = datetime.fromisoformat(scheduled_time)
-                
-                # Solo reprogramar si la fecha ya pasó y no se ha alcanzado el máximo de intentos
-                if (scheduled_time <= datetime.now() and 
-                    post.get('attempts', 0) < post.get('max_attempts', 3)):
-                    
-                    await self.schedule_post(post)
+            async for post in retry_posts:
+                # Solo reprogramar si no se ha alcanzado el máximo de intentos
+                if (post.attempts or 0) < (post.max_attempts or 3):
+                    post_data = post._asdict()
+                    post_data['config'] = post_data['config'] or {}
+                    await self.schedule_post(post_data)
                     
         except Exception as e:
             logger.error(f"Error reprogramando posts fallidos: {e}")
\ No newline at end of file
@@ -2,17 +2,56 @@
 Clase base para todos los clientes de plataformas
 """
 
+import asyncio
+import os
+import stat
+import time
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import AsyncIterator, Dict, List, Any, Optional
 from datetime import datetime
+from types import MappingProxyType
+
+from src.utils.logger import setup_logger
+from src.utils.rate_limiter import TokenBucket
+
+logger = setup_logger(__name__)
+
+ALLOWED_MEDIA_EXTENSIONS = frozenset({'.jpg', '.jpeg', '.png', '.gif', '.mp4', '.mov', '.avi'})
+
+# Mapeo vacío compartido para los valores por defecto de los formateadores
+_EMPTY = MappingProxyType({})
+
+
+@lru_cache(maxsize=1)
+def _iso_second(second: int) -> str:
+    """Marca de tiempo ISO (hora local, sin microsegundos) de un segundo epoch"""
+    return datetime.fromtimestamp(second).isoformat()
+
+
+def now_iso() -> str:
+    """Marca de tiempo ISO actual con precisión de segundos
+    
+    Las respuestas de un mismo segundo comparten la cadena ya formateada.
+    """
+    return _iso_second(int(time.time()))
 
 
 class BasePlatform(ABC):
     """Clase base abstracta para todas las plataformas de redes sociales"""
     
+    # Ritmo máximo de peticiones por defecto (configurable con 'rps')
+    DEFAULT_RPS = 10
+    
     def __init__(self, config: Dict[str, Any]):
         self.config = config
         self.platform_name = self.__class__.__name__.replace('Client', '').lower()
+        
+        # Límites aplicados antes de cada petición a la API, para no provocar
+        # ráfagas de 429: peticiones simultáneas y ritmo máximo (rps)
+        self._request_semaphore = asyncio.Semaphore(config.get('max_concurrent', 8))
+        self._request_limiter = TokenBucket(config.get('rps', self.DEFAULT_RPS), capacity=1)
     
     @abstractmethod
     async def authenticate(self) -> bool:
@@ -67,82 +106,103 @@ class BasePlatform(ABC):
     
     # Métodos comunes (no abstractos)
     
+    async def get_posts_with_comments(self, limit: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Obtiene publicaciones recientes con sus comentarios en una sola petición
+        
+        Cada publicación incluye la lista de comentarios formateados en
+        'comments_data'. Retorna None si la plataforma no lo soporta; en ese
+        caso se debe usar get_posts + get_comments.
+        """
+        return None
+    
     def get_platform_name(self) -> str:
         """Retorna el nombre de la plataforma"""
         return self.platform_name
     
     def validate_media_file(self, media_path: str) -> bool:
         """Valida un archivo multimedia"""
-        import os
-        from pathlib import Path
-        
-        if not os.path.exists(media_path):
+        # Verificar extensión (sin tocar el disco)
+        if os.path.splitext(media_path)[1].lower() not in ALLOWED_MEDIA_EXTENSIONS:
             return False
         
-        file_path = Path(media_path)
+        # Un solo stat: existencia y tamaño a la vez
+        try:
+            file_stat = os.stat(media_path)
+        except OSError:
+            return False
         
-        # Verificar extensión
-        allowed_extensions = {'.jpg', '.jpeg', '.png', '.gif', '.mp4', '.mov', '.avi'}
-        if file_path.suffix.lower() not in allowed_extensions:
+        if not stat.S_ISREG(file_stat.st_mode):
             return False
         
         # Verificar tamaño (50MB máximo por defecto)
         max_size = self.config.get('max_file_size', 52428800)  # 50MB
-        if file_path.stat().st_size > max_size:
-            return False
-        
-        return True
+        return file_stat.st_size <= max_size
     
     def prepare_content(self, content: str, max_length: Optional[int] = None) -> str:
         """Prepara el contenido para la plataforma"""
-        if max_length and len(content) > max_length:
-            return content[:max_length-3] + "..."
-        return content
+        # Caso habitual: cabe entero y se devuelve la misma cadena sin copiar
+        if not max_length or len(content) <= max_length:
+            return content
+        return content[:max_length-3] + "..."
     
-    def format_post_data(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Formatea datos de publicación a formato estándar"""
-        return {
-            'id': raw_data.get('id', ''),
-            'content': raw_data.get('text', raw_data.get('message', '')),
-            'created_at': raw_data.get('created_time', raw_data.get('created_at', '')),
-            'likes': raw_data.get('likes', {}).get('summary', {}).get('total_count', 0),
-            'comments': raw_data.get('comments', {}).get('summary', {}).get('total_count', 0),
-            'shares': raw_data.get('shares', {}).get('count', 0),
-            'platform': self.platform_name,
-            'raw_data': raw_data
+    def format_post_data(self, raw_data: Dict[str, Any], keep_raw: bool = True) -> Dict[str, Any]:
+        """Formatea datos de publicación a formato estándar
+        
+        Con keep_raw=False no se incluye 'raw_data', de modo que el payload
+        original puede liberarse en cuanto se formatea la publicación.
+        """
+        get = raw_data.get
+        post = {
+            'id': get('id', ''),
+            'content': raw_data['text'] if 'text' in raw_data else get('message', ''),
+            'created_at': raw_data['created_time'] if 'created_time' in raw_data else get('created_at', ''),
+            'likes': (get('likes') or _EMPTY).get('summary', _EMPTY).get('total_count', 0),
+            'comments': (get('comments') or _EMPTY).get('summary', _EMPTY).get('total_count', 0),
+            'shares': (get('shares') or _EMPTY).get('count', 0),
+            'platform': self.platform_name
         }
+        if keep_raw:
+            post['raw_data'] = raw_data
+        return post
     
     def format_comment_data(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
         """Formatea datos de comentario a formato estándar"""
+        get = raw_data.get
+        author = get('from')
         return {
-            'id': raw_data.get('id', ''),
-            'content': raw_data.get('message', raw_data.get('text', '')),
-            'author': raw_data.get('from', {}).get('name', raw_data.get('user', '')),
-            'author_id': raw_data.get('from', {}).get('id', raw_data.get('user_id', '')),
-            'created_at': raw_data.get('created_time', raw_data.get('created_at', '')),
-            'likes': raw_data.get('like_count', 0),
+            'id': get('id', ''),
+            'content': raw_data['message'] if 'message' in raw_data else get('text', ''),
+            'author': author.get('name', get('user', '')) if author else get('user', ''),
+            'author_id': author.get('id', get('user_id', '')) if author else get('user_id', ''),
+            'created_at': raw_data['created_time'] if 'created_time' in raw_data else get('created_at', ''),
+            'likes': get('like_count', 0),
             'platform': self.platform_name,
             'raw_data': raw_data
         }
     
     def format_message_data(self, raw_data: Dict[str, Any]) -> Dict[str, Any]:
         """Formatea datos de mensaje a formato estándar"""
+        get = raw_data.get
+        sender = get('from')
         return {
-            'id': raw_data.get('id', ''),
-            'content': raw_data.get('message', raw_data.get('text', '')),
-            'sender': raw_data.get('from', {}).get('name', raw_data.get('sender', '')),
-            'sender_id': raw_data.get('from', {}).get('id', raw_data.get('sender_id', '')),
-            'created_at': raw_data.get('created_time', raw_data.get('created_at', '')),
-            'is_read': raw_data.get('unread', 0) == 0,
+            'id': get('id', ''),
+            'content': raw_data['message'] if 'message' in raw_data else get('text', ''),
+            'sender': sender.get('name', get('sender', '')) if sender else get('sender', ''),
+            'sender_id': sender.get('id', get('sender_id', '')) if sender else get('sender_id', ''),
+            'created_at': raw_data['created_time'] if 'created_time' in raw_data else get('created_at', ''),
+            'is_read': get('unread', 0) == 0,
             'platform': self.platform_name,
             'raw_data': raw_data
         }
     
+    @asynccontextmanager
+    async def _throttle(self) -> AsyncIterator[None]:
+        """Reserva un hueco de concurrencia y espera el turno del limitador"""
+        async with self._request_semaphore:
+            await self._request_limiter.acquire()
+            yield
+    
     async def handle_rate_limit(self, retry_after: int = 60):
         """Maneja límites de velocidad de API"""
-        import asyncio
-        from src.utils.logger import setup_logger
-        
-        logger = setup_logger(f"{self.__class__.__name__}")
-        logger.warning(f"Rate limit alcanzado, esperando {retry_after} segundos")
+        logger.warning("Rate limit alcanzado en %s, esperando %s segundos", self.platform_name, retry_after)
         await asyncio.sleep(retry_after)
\ No newline at end of file
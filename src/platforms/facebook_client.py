@@ -3,56 +3,186 @@ Cliente para Facebook
 """
 
 import asyncio
+import hashlib
+import os
+import time
 import aiohttp
-from typing import Dict, List, Any, Optional
-from datetime import datetime
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, FrozenSet, List, Any, Optional, Tuple
+from urllib.parse import urlencode
 
-from src.platforms.base_platform import BasePlatform
+from src.platforms.base_platform import BasePlatform, now_iso
+from src.utils.http_session import HTTP_ERRORS, get_shared_session, iter_file_chunks, json_dumps, json_loads
 from src.utils.logger import setup_logger
+from src.utils.rate_limiter import backoff_delay
 
 logger = setup_logger(__name__)
 
+# Máximo de peticiones por llamada al endpoint /batch de la Graph API
+GRAPH_BATCH_LIMIT = 50
+# Máximo de registros por página en los listados de la Graph API
+GRAPH_PAGE_SIZE = 100
+
+POST_FIELDS = 'id,message,created_time,likes.summary(true),comments.summary(true),shares'
+COMMENT_FIELDS = 'id,message,from,created_time,like_count'
+POST_INSIGHT_FIELDS = 'insights.metric(post_impressions,post_engaged_users,post_clicks)'
+PAGE_INSIGHT_METRICS = 'page_fans,page_impressions,page_engaged_users'
+
+# Respuestas transitorias que se reintentan con backoff
+RETRY_STATUS = frozenset({429, 500, 502, 503, 504})
+# Las escrituras que crean contenido solo se reintentan si la petición no se
+# procesó: un 5xx podría haber publicado igualmente
+WRITE_RETRY_STATUS = frozenset({429})
+# Métodos que pueden repetirse aunque la petición llegara a procesarse
+IDEMPOTENT_METHODS = frozenset({'GET', 'HEAD', 'DELETE'})
+# Errores de conexión que se reintentan en cada caso: en las llamadas no
+# idempotentes solo los que garantizan que la petición no llegó a enviarse
+SAFE_CONNECTION_ERRORS = (aiohttp.ClientConnectorError,)
+IDEMPOTENT_CONNECTION_ERRORS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+# Código de error de la Graph API para tokens inválidos o caducados
+INVALID_TOKEN_CODE = 190
+
 
 class FacebookClient(BasePlatform):
     """Cliente para la API de Facebook"""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], session: Optional[aiohttp.ClientSession] = None):
         super().__init__(config)
         self.app_id = config.get('app_id')
         self.app_secret = config.get('app_secret')
         self.access_token = config.get('access_token')
         self.page_id = config.get('page_id')
+        self.comments_per_post = config.get('comments_per_post', 50)
+        self.max_attempts = config.get('max_attempts', 3)
+        self.retry_base = config.get('retry_base', 1.0)
+        self.retry_cap = config.get('retry_cap', 30.0)
+        
+        # Una autenticación correcta se da por válida durante auth_ttl segundos
+        self.auth_ttl = config.get('auth_ttl', 300)
+        self._auth_ok_until = 0.0
+        
+        # Respuestas GET con ETag (LRU), para peticiones condicionales
+        self._etag_cache: OrderedDict[str, Tuple[str, Any]] = OrderedDict()
+        self._etag_cache_size = config.get('etag_cache_size', 256)
         
         self.base_url = "https://graph.facebook.com/v18.0"
-        self.session = None
+        self._session = session
+        
+        # URLs y parámetros fijos de la página, construidos una sola vez
+        # (los diccionarios de parámetros no se modifican tras crearse)
+        page_url = f"{self.base_url}/{self.page_id or 'me'}"
+        self._feed_url = f"{page_url}/feed"
+        self._posts_url = f"{page_url}/posts"
+        self._photos_url = f"{page_url}/photos"
+        self._insights_url = f"{page_url}/insights"
+        self._posts_params = {'fields': POST_FIELDS}
+        self._comments_params = {'fields': COMMENT_FIELDS}
+        self._post_insights_params = {'fields': POST_INSIGHT_FIELDS}
+        self._page_insights_params = {'metric': PAGE_INSIGHT_METRICS}
+        
+        # El token viaja en la cabecera Authorization y no en la URL, así las
+        # URLs no dependen del token (caché ETag, proxies) y son más cortas
+        self._auth_headers = {'Authorization': f"Bearer {self.access_token}"}
         
         if not all([self.app_id, self.app_secret, self.access_token]):
             logger.warning("Configuración incompleta para Facebook")
     
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Sesión HTTP inyectada o, en su defecto, el pool compartido del event loop"""
+        if self._session is None or self._session.closed:
+            return get_shared_session()
+        return self._session
+    
+    @session.setter
+    def session(self, session: Optional[aiohttp.ClientSession]):
+        self._session = session
+    
+    @asynccontextmanager
+    async def _request(self, method: str, url: str, retry_status: FrozenSet[int] = RETRY_STATUS,
+                       max_attempts: Optional[int] = None, headers: Optional[Dict[str, str]] = None,
+                       idempotent: Optional[bool] = None, **kwargs) -> AsyncIterator[aiohttp.ClientResponse]:
+        """Ejecuta una petición limitada, reintentando los fallos transitorios
+        
+        Los estados de `retry_status` y los errores de conexión se reintentan
+        hasta `max_attempts` veces con backoff exponencial (o lo que indique
+        Retry-After); la última respuesta se entrega tal cual al llamador.
+        Si la llamada no es idempotente (por defecto, según el método) solo se
+        reintentan los errores de conexión previos al envío: un timeout o una
+        desconexión posteriores podrían haber publicado igualmente.
+        """
+        attempts = max_attempts or self.max_attempts
+        headers = {**self._auth_headers, **headers} if headers else self._auth_headers
+        if idempotent is None:
+            idempotent = method in IDEMPOTENT_METHODS
+        retry_errors = IDEMPOTENT_CONNECTION_ERRORS if idempotent else SAFE_CONNECTION_ERRORS
+        
+        for attempt in range(attempts):
+            last_attempt = attempt == attempts - 1
+            retry_after = None
+            
+            async with self._throttle():
+                # Solo los errores al enviar se reintentan, no los del llamador
+                try:
+                    response = await self.session.request(method, url, headers=headers, **kwargs)
+                except retry_errors as e:
+                    if last_attempt:
+                        raise
+                    logger.warning(f"Error de conexión con Facebook ({e}), reintentando")
+                    response = None
+                
+                if response is not None:
+                    async with response:
+                        if response.status not in retry_status or last_attempt:
+                            yield response
+                            return
+                        retry_after = response.headers.get('Retry-After')
+                        logger.warning(f"Facebook respondió {response.status} en {method} {url}, reintentando")
+            
+            await asyncio.sleep(backoff_delay(attempt, self.retry_base, self.retry_cap, retry_after))
+    
+    async def _fetch(self, method: str, url: str, **kwargs) -> Tuple[int, Any]:
+        """Ejecuta una petición con `_request` y decodifica el cuerpo JSON
+        
+        Retorna (status, cuerpo) tanto si la respuesta es correcta como si no;
+        cada método decide qué hacer con el error.
+        """
+        async with self._request(method, url, **kwargs) as response:
+            status, data = response.status, await response.json(loads=json_loads)
+        self._check_token(status, data)
+        return status, data
+    
+    def _check_token(self, status: int, data: Any):
+        """Invalida la autenticación cacheada si Facebook rechaza el token"""
+        if status == 401 or (isinstance(data, dict)
+                             and (data.get('error') or {}).get('code') == INVALID_TOKEN_CODE):
+            self._auth_ok_until = 0.0
+    
     async def authenticate(self) -> bool:
-        """Autentica con Facebook"""
+        """Autentica con Facebook
+        
+        Un resultado correcto se reutiliza durante `auth_ttl` segundos sin
+        consultar /me de nuevo, salvo que Facebook rechace antes el token.
+        """
+        if time.monotonic() < self._auth_ok_until:
+            return True
+        
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
             # Verificar el token de acceso
             url = f"{self.base_url}/me"
-            params = {
-                'access_token': self.access_token,
-                'fields': 'id,name'
-            }
+            params = {'fields': 'id,name'}
+            
+            status, data = await self._fetch('GET', url, params=params)
+            if status == 200:
+                logger.info("Autenticado en Facebook como: %s", data.get('name'))
+                self._auth_ok_until = time.monotonic() + self.auth_ttl
+                return True
             
-            async with self.session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    logger.info(f"Autenticado en Facebook como: {data.get('name')}")
-                    return True
-                else:
-                    error_data = await response.json()
-                    logger.error(f"Error de autenticación Facebook: {error_data}")
-                    return False
+            logger.error(f"Error de autenticación Facebook: {data}")
+            return False
                     
-        except Exception as e:
+        except HTTP_ERRORS as e:
             logger.error(f"Error conectando con Facebook: {e}")
             return False
     
@@ -64,21 +194,11 @@ class FacebookClient(BasePlatform):
                          **kwargs) -> Dict[str, Any]:
         """Crea una publicación en Facebook"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
             # Preparar contenido
             prepared_content = self.prepare_content(content, max_length=63206)
             
-            # Determinar endpoint según si hay página específica
-            endpoint = f"{self.page_id}/feed" if self.page_id else "me/feed"
-            url = f"{self.base_url}/{endpoint}"
-            
             # Datos básicos del post
-            post_data = {
-                'message': prepared_content,
-                'access_token': self.access_token
-            }
+            post_data = {'message': prepared_content}
             
             # Agregar configuraciones adicionales
             if kwargs.get('link'):
@@ -89,9 +209,9 @@ class FacebookClient(BasePlatform):
             
             # Si hay archivos multimedia
             if media_paths:
-                return await self._create_post_with_media(url, post_data, media_paths)
+                return await self._create_post_with_media(self._feed_url, post_data, media_paths)
             else:
-                return await self._create_simple_post(url, post_data)
+                return await self._create_simple_post(self._feed_url, post_data)
                 
         except Exception as e:
             logger.error(f"Error creando post en Facebook: {e}")
@@ -99,20 +219,18 @@ class FacebookClient(BasePlatform):
     
     async def _create_simple_post(self, url: str, post_data: Dict[str, Any]) -> Dict[str, Any]:
         """Crea un post de solo texto"""
-        async with self.session.post(url, data=post_data) as response:
-            if response.status == 200:
-                result = await response.json()
-                logger.info(f"Post creado en Facebook: {result.get('id')}")
-                return {
-                    'success': True,
-                    'platform': 'facebook',
-                    'post_id': result.get('id'),
-                    'created_at': datetime.now().isoformat()
-                }
-            else:
-                error_data = await response.json()
-                logger.error(f"Error creando post Facebook: {error_data}")
-                raise Exception(f"Error Facebook: {error_data}")
+        status, result = await self._fetch('POST', url, retry_status=WRITE_RETRY_STATUS, data=post_data)
+        if status != 200:
+            logger.error(f"Error creando post Facebook: {result}")
+            raise Exception(f"Error Facebook: {result}")
+        
+        logger.info("Post creado en Facebook: %s", result.get('id'))
+        return {
+            'success': True,
+            'platform': 'facebook',
+            'post_id': result.get('id'),
+            'created_at': now_iso()
+        }
     
     async def _create_post_with_media(self, url: str, post_data: Dict[str, Any], 
                                     media_paths: List[str]) -> Dict[str, Any]:
@@ -128,27 +246,25 @@ class FacebookClient(BasePlatform):
             raise ValueError(f"Archivo multimedia inválido: {media_path}")
         
         # Subir foto
-        photo_url = f"{self.base_url}/{self.page_id or 'me'}/photos"
+        # El archivo se lee en bloques desde el event loop sin bloquearlo
+        form_data = aiohttp.FormData()
+        form_data.add_field('message', post_data['message'])
+        form_data.add_field('source', iter_file_chunks(media_path),
+                            filename=os.path.basename(media_path),
+                            content_type='application/octet-stream')
         
-        with open(media_path, 'rb') as media_file:
-            form_data = aiohttp.FormData()
-            form_data.add_field('message', post_data['message'])
-            form_data.add_field('access_token', post_data['access_token'])
-            form_data.add_field('source', media_file, filename=media_path.split('/')[-1])
-            
-            async with self.session.post(photo_url, data=form_data) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    logger.info(f"Post con media creado en Facebook: {result.get('id')}")
-                    return {
-                        'success': True,
-                        'platform': 'facebook',
-                        'post_id': result.get('id'),
-                        'created_at': datetime.now().isoformat()
-                    }
-                else:
-                    error_data = await response.json()
-                    raise Exception(f"Error subiendo media a Facebook: {error_data}")
+        # Sin reintentos: el cuerpo se envía en streaming y no puede repetirse
+        status, result = await self._fetch('POST', self._photos_url, max_attempts=1, data=form_data)
+        if status != 200:
+            raise Exception(f"Error subiendo media a Facebook: {result}")
+        
+        logger.info("Post con media creado en Facebook: %s", result.get('id'))
+        return {
+            'success': True,
+            'platform': 'facebook',
+            'post_id': result.get('id'),
+            'created_at': now_iso()
+        }
     
     async def _create_album_post(self, post_data: Dict[str, Any], 
                                media_paths: List[str]) -> Dict[str, Any]:
@@ -158,123 +274,240 @@ class FacebookClient(BasePlatform):
         
         # Por ahora, subir solo la primera imagen
         return await self._create_post_with_media(
-            f"{self.base_url}/{self.page_id or 'me'}/feed", 
+            self._feed_url,
             post_data, 
             [media_paths[0]]
         )
     
-    async def get_posts(self, limit: int = 10) -> List[Dict[str, Any]]:
-        """Obtiene publicaciones recientes"""
+    async def get_posts(self, limit: int = 10, include_comments: bool = False,
+                        keep_raw: bool = True) -> List[Dict[str, Any]]:
+        """Obtiene publicaciones recientes
+        
+        Con include_comments=True cada publicación trae sus comentarios en
+        'comments_data' usando la misma petición (expansión de campos).
+        Con keep_raw=False las publicaciones no incluyen 'raw_data'.
+        """
+        if include_comments:
+            return await self.get_posts_with_comments(limit=limit)
+        
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
+            records = await self._paginated_get(self._posts_url, self._posts_params, limit, "posts")
+            format_post = self.format_post_data
+            return [format_post(record, keep_raw) for record in records]
+                    
+        except HTTP_ERRORS as e:
+            logger.error(f"Error obteniendo posts de Facebook: {e}")
+            return []
+    
+    async def _paginated_get(self, url: str, params: Dict[str, Any], limit: int,
+                             what: str) -> List[Dict[str, Any]]:
+        """Recorre las páginas de un listado de la Graph API hasta reunir `limit` registros
+        
+        Los cursores solo se conocen al recibir cada página, así que las páginas
+        se piden en serie; para minimizar viajes se usa el tamaño de página
+        máximo. Si falla una página se devuelve lo reunido hasta entonces.
+        """
+        records: List[Dict[str, Any]] = []
+        params = {**params, 'limit': min(limit, GRAPH_PAGE_SIZE)}
+        
+        while url and len(records) < limit:
+            data = await self._get_json(url, params, what)
+            if data is None:
+                break
             
-            endpoint = f"{self.page_id}/posts" if self.page_id else "me/posts"
-            url = f"{self.base_url}/{endpoint}"
+            records.extend(data.get('data', []))
+            # La URL de la página siguiente ya incluye todos los parámetros
+            url = data.get('paging', {}).get('next')
+            params = None
+        
+        return records[:limit]
+    
+    async def _get_json(self, url: str, params: Optional[Dict[str, Any]], what: str) -> Optional[Dict[str, Any]]:
+        """GET condicional: si Facebook responde 304 se reutiliza la respuesta cacheada
+        
+        Las respuestas con ETag se guardan en una LRU por URL y parámetros y se
+        revalidan con If-None-Match. Retorna None (y lo registra) si falla.
+        """
+        key = self._etag_key(url, params)
+        cached = self._etag_cache.get(key)
+        headers = {'If-None-Match': cached[0]} if cached else None
+        
+        async with self._request('GET', url, params=params, headers=headers) as response:
+            if response.status == 304 and cached:
+                self._etag_cache.move_to_end(key)
+                return cached[1]
+            if response.status != 200:
+                error_data = await response.json(loads=json_loads)
+                self._check_token(response.status, error_data)
+                logger.error(f"Error obteniendo {what} Facebook: {error_data}")
+                return None
             
+            data = await response.json(loads=json_loads)
+            etag = response.headers.get('ETag')
+        
+        if etag:
+            self._etag_cache[key] = (etag, data)
+            self._etag_cache.move_to_end(key)
+            if len(self._etag_cache) > self._etag_cache_size:
+                self._etag_cache.popitem(last=False)
+        return data
+    
+    @staticmethod
+    def _etag_key(url: str, params: Optional[Dict[str, Any]]) -> str:
+        """Clave de caché de una petición GET (URL y parámetros ordenados)"""
+        query = urlencode(sorted(params.items())) if params else ''
+        return hashlib.blake2b(f"{url}?{query}".encode('utf-8'), digest_size=16).hexdigest()
+    
+    async def get_posts_with_comments(self, limit: int = 5) -> Optional[List[Dict[str, Any]]]:
+        """Obtiene publicaciones recientes con sus comentarios (expansión de campos)"""
+        try:
             params = {
-                'access_token': self.access_token,
                 'limit': limit,
-                'fields': 'id,message,created_time,likes.summary(true),comments.summary(true),shares'
+                'fields': (
+                    'id,message,created_time,likes.summary(true),'
+                    f'comments.limit({self.comments_per_post}).summary(true)'
+                    f'{{{COMMENT_FIELDS}}},shares'
+                )
             }
             
-            async with self.session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    posts = []
-                    
-                    for post_data in data.get('data', []):
-                        posts.append(self.format_post_data(post_data))
-                    
-                    return posts
-                else:
-                    error_data = await response.json()
-                    logger.error(f"Error obteniendo posts Facebook: {error_data}")
-                    return []
+            data = await self._get_json(self._posts_url, params, "posts con comentarios")
+            if data is None:
+                return []
+            
+            # Métodos resueltos una vez para toda la página
+            format_post = self.format_post_data
+            format_comment = self.format_comment_data
+            posts = []
+            for post_data in data.get('data', ()):
+                post = format_post(post_data)
+                post['comments_data'] = list(map(
+                    format_comment, (post_data.get('comments') or {}).get('data', ())
+                ))
+                posts.append(post)
+            
+            return posts
                     
-        except Exception as e:
-            logger.error(f"Error obteniendo posts de Facebook: {e}")
+        except HTTP_ERRORS as e:
+            logger.error(f"Error obteniendo posts con comentarios de Facebook: {e}")
             return []
     
     async def delete_post(self, post_id: str) -> bool:
         """Elimina una publicación"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
-            url = f"{self.base_url}/{post_id}"
-            params = {'access_token': self.access_token}
+            status, data = await self._fetch('DELETE', f"{self.base_url}/{post_id}")
+            if status == 200:
+                logger.info("Post eliminado de Facebook: %s", post_id)
+                return True
             
-            async with self.session.delete(url, params=params) as response:
-                if response.status == 200:
-                    logger.info(f"Post eliminado de Facebook: {post_id}")
-                    return True
-                else:
-                    error_data = await response.json()
-                    logger.error(f"Error eliminando post Facebook: {error_data}")
-                    return False
+            logger.error(f"Error eliminando post Facebook: {data}")
+            return False
                     
-        except Exception as e:
+        except HTTP_ERRORS as e:
             logger.error(f"Error eliminando post de Facebook: {e}")
             return False
     
-    async def get_comments(self, post_id: str) -> List[Dict[str, Any]]:
-        """Obtiene comentarios de una publicación"""
+    async def get_comments(self, post_id: str, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        """Obtiene comentarios de una publicación (hasta `limit`, por defecto comments_per_post)"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
-            url = f"{self.base_url}/{post_id}/comments"
-            params = {
-                'access_token': self.access_token,
-                'fields': 'id,message,from,created_time,like_count'
-            }
-            
-            async with self.session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    comments = []
-                    
-                    for comment_data in data.get('data', []):
-                        comments.append(self.format_comment_data(comment_data))
+            records = await self._paginated_get(
+                f"{self.base_url}/{post_id}/comments", self._comments_params,
+                limit or self.comments_per_post, "comentarios"
+            )
+            return list(map(self.format_comment_data, records))
                     
-                    return comments
-                else:
-                    error_data = await response.json()
-                    logger.error(f"Error obteniendo comentarios Facebook: {error_data}")
-                    return []
-                    
-        except Exception as e:
+        except HTTP_ERRORS as e:
             logger.error(f"Error obteniendo comentarios de Facebook: {e}")
             return []
     
+    async def get_comments_bulk(self, post_ids: List[str]) -> Dict[str, List[Dict[str, Any]]]:
+        """Obtiene los comentarios de varias publicaciones con peticiones /batch"""
+        bodies = await self._batch_get([
+            f"{post_id}/comments?fields={COMMENT_FIELDS}&limit={self.comments_per_post}"
+            for post_id in post_ids
+        ])
+        
+        format_comment = self.format_comment_data
+        return {
+            post_id: list(map(format_comment, body.get('data', ())))
+            for post_id, body in zip(post_ids, bodies)
+            if body is not None
+        }
+    
+    async def get_analytics_bulk(self, post_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Obtiene las métricas de varias publicaciones con peticiones /batch"""
+        bodies = await self._batch_get([
+            f"{post_id}?fields={POST_INSIGHT_FIELDS}" for post_id in post_ids
+        ])
+        retrieved_at = now_iso()
+        
+        return {
+            post_id: {
+                'platform': 'facebook',
+                'post_id': post_id,
+                'metrics': body,
+                'retrieved_at': retrieved_at
+            }
+            for post_id, body in zip(post_ids, bodies)
+            if body is not None
+        }
+    
+    async def _batch_get(self, relative_urls: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Ejecuta varios GET en bloques de GRAPH_BATCH_LIMIT por petición
+        
+        Retorna el cuerpo decodificado de cada respuesta en el mismo orden que
+        `relative_urls`, o None para las que fallaron.
+        """
+        chunks = [
+            relative_urls[i:i + GRAPH_BATCH_LIMIT]
+            for i in range(0, len(relative_urls), GRAPH_BATCH_LIMIT)
+        ]
+        results = await asyncio.gather(*(self._post_batch(chunk) for chunk in chunks))
+        return [body for chunk_result in results for body in chunk_result]
+    
+    async def _post_batch(self, relative_urls: List[str]) -> List[Optional[Dict[str, Any]]]:
+        """Envía una petición /batch y decodifica cada respuesta"""
+        batch = [{'method': 'GET', 'relative_url': relative_url} for relative_url in relative_urls]
+        data = {'batch': json_dumps(batch)}
+        
+        try:
+            # El lote solo contiene lecturas, así que puede repetirse
+            status, items = await self._fetch('POST', self.base_url, idempotent=True, data=data)
+            if status != 200:
+                logger.error(f"Error en petición batch Facebook: {items}")
+                return [None] * len(relative_urls)
+        except HTTP_ERRORS as e:
+            logger.error(f"Error en petición batch de Facebook: {e}")
+            return [None] * len(relative_urls)
+        
+        bodies = []
+        for relative_url, item in zip(relative_urls, items):
+            # Una entrada nula indica que Facebook no llegó a procesarla
+            if not item or item.get('code') != 200:
+                logger.error(f"Error en {relative_url} (batch Facebook): {item and item.get('body')}")
+                bodies.append(None)
+            else:
+                bodies.append(json_loads(item['body']))
+        return bodies
+    
     async def reply_to_comment(self, comment_id: str, reply_text: str) -> Dict[str, Any]:
         """Responde a un comentario"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
             url = f"{self.base_url}/{comment_id}/comments"
-            data = {
-                'message': reply_text,
-                'access_token': self.access_token
-            }
+            data = {'message': reply_text}
             
-            async with self.session.post(url, data=data) as response:
-                if response.status == 200:
-                    result = await response.json()
-                    logger.info(f"Respuesta enviada en Facebook: {result.get('id')}")
-                    return {
-                        'success': True,
-                        'reply_id': result.get('id'),
-                        'platform': 'facebook'
-                    }
-                else:
-                    error_data = await response.json()
-                    logger.error(f"Error respondiendo comentario Facebook: {error_data}")
-                    return {'success': False, 'error': error_data}
+            status, result = await self._fetch('POST', url, retry_status=WRITE_RETRY_STATUS, data=data)
+            if status != 200:
+                logger.error(f"Error respondiendo comentario Facebook: {result}")
+                return {'success': False, 'error': result}
+            
+            logger.info("Respuesta enviada en Facebook: %s", result.get('id'))
+            return {
+                'success': True,
+                'reply_id': result.get('id'),
+                'platform': 'facebook'
+            }
                     
-        except Exception as e:
+        except HTTP_ERRORS as e:
             logger.error(f"Error respondiendo comentario Facebook: {e}")
             return {'success': False, 'error': str(e)}
     
@@ -293,45 +526,30 @@ class FacebookClient(BasePlatform):
     async def get_analytics(self, post_id: Optional[str] = None) -> Dict[str, Any]:
         """Obtiene métricas y analíticas"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
             if post_id:
                 # Métricas de un post específico
                 url = f"{self.base_url}/{post_id}"
-                params = {
-                    'access_token': self.access_token,
-                    'fields': 'insights.metric(post_impressions,post_engaged_users,post_clicks)'
-                }
+                params = self._post_insights_params
             else:
                 # Métricas generales de la página
-                endpoint = f"{self.page_id}/insights" if self.page_id else "me/insights"
-                url = f"{self.base_url}/{endpoint}"
-                params = {
-                    'access_token': self.access_token,
-                    'metric': 'page_fans,page_impressions,page_engaged_users'
-                }
+                url = self._insights_url
+                params = self._page_insights_params
+            
+            data = await self._get_json(url, params, "analytics")
+            if data is None:
+                return {}
             
-            async with self.session.get(url, params=params) as response:
-                if response.status == 200:
-                    data = await response.json()
-                    return {
-                        'platform': 'facebook',
-                        'post_id': post_id,
-                        'metrics': data,
-                        'retrieved_at': datetime.now().isoformat()
-                    }
-                else:
-                    error_data = await response.json()
-                    logger.error(f"Error obteniendo analytics Facebook: {error_data}")
-                    return {}
+            return {
+                'platform': 'facebook',
+                'post_id': post_id,
+                'metrics': data,
+                'retrieved_at': now_iso()
+            }
                     
-        except Exception as e:
+        except HTTP_ERRORS as e:
             logger.error(f"Error obteniendo analytics de Facebook: {e}")
             return {}
     
     async def close(self):
-        """Cierra la sesión HTTP"""
-        if self.session:
-            await self.session.close()
-            self.session = None
\ No newline at end of file
+        """Suelta la sesión HTTP (el pool compartido lo cierra PlatformFactory.aclose)"""
+        self._session = None
\ No newline at end of file
@@ -3,30 +3,89 @@ Cliente para Instagram
 """
 
 import asyncio
-import os
+import threading
+import time
+from pathlib import Path
 from typing import Dict, List, Any, Optional
-from datetime import datetime
 from instagrapi import Client as InstagrapiClient
-from instagrapi.exceptions import LoginRequired, ChallengeRequired
+from instagrapi.exceptions import (
+    AlbumConfigureError, ChallengeRequired, ClientRequestTimeout, ClientThrottledError, FeedbackRequired,
+    LoginRequired, PleaseWaitFewMinutes, RateLimitError
+)
+from instagrapi.extractors import extract_media_v1
 
-from src.platforms.base_platform import BasePlatform
+from src.platforms.base_platform import BasePlatform, now_iso
+from src.utils.http_session import json_dumps
 from src.utils.logger import setup_logger
+from src.utils.rate_limiter import AIMDLimiter, backoff_delay
 
 logger = setup_logger(__name__)
 
+# Formatos de imagen que admite la subida paralela de álbumes
+ALBUM_PHOTO_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.webp')
+# Intentos de configurar un álbum ya subido (los mismos que album_upload)
+ALBUM_CONFIGURE_ATTEMPTS = 50
+
+# Errores con los que Instagram indica que se está llamando demasiado;
+# ChallengeRequired no es uno de ellos: esperar no resuelve la verificación
+THROTTLE_ERRORS = (
+    ClientThrottledError, PleaseWaitFewMinutes, RateLimitError,
+    FeedbackRequired, ClientRequestTimeout
+)
+
+
+def _call_locked(lock: threading.Lock, func, *args, **kwargs):
+    """Ejecuta `func` con el lock de su Client tomado (en el hilo de trabajo)"""
+    with lock:
+        return func(*args, **kwargs)
+
 
 class InstagramClient(BasePlatform):
-    """Cliente para Instagram usando instagrapi"""
+    """Cliente para Instagram usando instagrapi
+    
+    instagrapi es síncrono: sus llamadas pasan por `_api`, que las limita
+    con `_throttle` y las ejecuta con asyncio.to_thread para no bloquear el
+    event loop durante subidas y consultas.
+    
+    Un Client de instagrapi no es seguro entre hilos (cada respuesta se
+    guarda en el `last_json` compartido), así que sus llamadas se ejecutan
+    de una en una; las consultas en paralelo usan copias de la sesión
+    creadas con `_fork_clients`.
+    """
+    
+    # Instagram bloquea hacia las 150 peticiones cada 90 segundos; se deja
+    # margen con 120 por ventana
+    DEFAULT_RPS = 120 / 90
     
     def __init__(self, config: Dict[str, Any]):
         super().__init__(config)
         self.username = config.get('username')
         self.password = config.get('password')
         self.session_file = config.get('session_file', f'data/instagram_session_{self.username}.json')
+        self.session_path = Path(self.session_file)
         
         self.client = InstagrapiClient()
+        self._client_lock = threading.Lock()
         self.authenticated = False
         
+        # Info del propio usuario, reutilizada durante user_info_ttl segundos
+        self.user_info_ttl = config.get('user_info_ttl', 300)
+        self._user_info_cache = None
+        self._user_info_ts = 0.0
+        
+        # Threads de mensajes directos consultados a la vez en get_messages
+        self.direct_fetch_concurrency = config.get('direct_fetch_concurrency', 4)
+        
+        # Las fotos de un álbum se suben en paralelo (album_concurrency a la vez)
+        self.parallel_album_upload = config.get('parallel_album_upload', True)
+        self.album_concurrency = config.get('album_concurrency', 3)
+        self.album_configure_timeout = config.get('album_configure_timeout', 3)
+        
+        # Velocidad adaptativa: se reduce a la mitad al recibir un error de
+        # saturación y vuelve a subir hasta `rps` con las llamadas correctas
+        self._adaptive_limiter = AIMDLimiter(self._request_limiter, window=config.get('aimd_window', 10))
+        self.throttle_backoff = config.get('throttle_backoff', 30.0)
+        
         if not all([self.username, self.password]):
             logger.warning("Configuración incompleta para Instagram")
     
@@ -34,38 +93,46 @@ class InstagramClient(BasePlatform):
         """Autentica con Instagram"""
         try:
             # Intentar cargar sesión existente
-            if os.path.exists(self.session_file):
+            if self.session_path.is_file():
                 try:
-                    self.client.load_settings(self.session_file)
-                    self.client.login(self.username, self.password)
-                    
-                    # Verificar que la sesión funciona
-                    user_info = self.client.user_info_by_username(self.username)
-                    if user_info:
-                        logger.info(f"Sesión de Instagram cargada para: {self.username}")
-                        self.authenticated = True
-                        return True
+                    await self._api(self.client.load_settings, self.session_file)
                 except Exception as e:
                     logger.warning(f"Error cargando sesión Instagram: {e}")
                     # Eliminar archivo de sesión corrupto
-                    os.remove(self.session_file)
+                    self.session_path.unlink(missing_ok=True)
+                else:
+                    # Verificar la sesión con una llamada autenticada, sin
+                    # reenviar las credenciales si sigue siendo válida; otros
+                    # errores (límites, verificación) conservan la sesión
+                    try:
+                        await self._api(self.client.get_timeline_feed)
+                    except LoginRequired:
+                        # Sesión caducada: login reutilizando el dispositivo guardado
+                        await self._api(self.client.login, self.username, self.password)
+                        await self._api(self.client.dump_settings, self.session_file)
+                    
+                    logger.info("Sesión de Instagram cargada para: %s", self.username)
+                    self.authenticated = True
+                    return True
             
             # Login nuevo
-            self.client.login(self.username, self.password)
+            await self._api(self.client.login, self.username, self.password)
             
             # Guardar sesión
-            os.makedirs(os.path.dirname(self.session_file), exist_ok=True)
-            self.client.dump_settings(self.session_file)
+            self.session_path.parent.mkdir(parents=True, exist_ok=True)
+            await self._api(self.client.dump_settings, self.session_file)
             
-            logger.info(f"Autenticado en Instagram: {self.username}")
+            logger.info("Autenticado en Instagram: %s", self.username)
             self.authenticated = True
             return True
             
         except ChallengeRequired as e:
             logger.error(f"Verificación requerida para Instagram: {e}")
+            self._invalidate_user_info()
             return False
         except LoginRequired as e:
             logger.error(f"Login requerido para Instagram: {e}")
+            self._invalidate_user_info()
             return False
         except Exception as e:
             logger.error(f"Error autenticando con Instagram: {e}")
@@ -78,13 +145,82 @@ class InstagramClient(BasePlatform):
         
         try:
             # Verificar conexión obteniendo info del usuario
-            user_info = self.client.user_info_by_username(self.username)
+            user_info = await self._get_self_user_info()
             return user_info is not None
         except Exception as e:
             logger.error(f"Error probando conexión Instagram: {e}")
             self.authenticated = False
+            self._invalidate_user_info()
             return False
     
+    async def _api(self, func, *args, **kwargs):
+        """Ejecuta una llamada de instagrapi sobre `self.client`"""
+        return await self._call(self._client_lock, func, *args, **kwargs)
+    
+    async def _call(self, lock: threading.Lock, func, *args, **kwargs):
+        """Ejecuta una llamada de instagrapi respetando los límites de peticiones
+        
+        `lock` es el del Client al que pertenece `func`: se toma dentro del
+        hilo, así una espera cancelada no lo libera con la llamada en curso.
+        Ante un error de saturación (THROTTLE_ERRORS) se reduce la velocidad
+        adaptativa y se espera `throttle_backoff` segundos (con jitter) antes
+        de propagar el error.
+        """
+        limiter = self._adaptive_limiter
+        try:
+            async with self._throttle():
+                result = await asyncio.to_thread(_call_locked, lock, func, *args, **kwargs)
+        except THROTTLE_ERRORS as e:
+            limiter.record(throttled=True)
+            logger.warning(
+                "Instagram limita las peticiones (%s), velocidad reducida a %.2f peticiones/s",
+                type(e).__name__, limiter.rate
+            )
+            await asyncio.sleep(backoff_delay(0, self.throttle_backoff, self.throttle_backoff * 2))
+            raise
+        except BaseException:
+            limiter.record(success=False)
+            raise
+        
+        limiter.record()
+        return result
+    
+    async def _fork_clients(self, count: int) -> asyncio.Queue:
+        """Crea `count` Clients con la sesión actual para llamadas en paralelo
+        
+        Se devuelven en una cola de pares (Client, lock): cada tarea toma uno,
+        lo usa y lo devuelve, de modo que nunca comparten Client.
+        """
+        settings = await asyncio.to_thread(_call_locked, self._client_lock, self.client.get_settings)
+        pool = asyncio.Queue()
+        for _ in range(count):
+            pool.put_nowait((InstagrapiClient(settings=settings), threading.Lock()))
+        return pool
+    
+    def get_rl_stats(self) -> Dict[str, Any]:
+        """Estado de la velocidad de peticiones adaptativa"""
+        return self._adaptive_limiter.stats()
+    
+    async def _get_self_user_info(self, force: bool = False):
+        """Info del usuario autenticado, cacheada durante user_info_ttl segundos
+        
+        user_info_by_username es de los endpoints con límites más estrictos
+        de Instagram, así que solo se consulta al caducar la caché o con force.
+        """
+        if (not force and self._user_info_cache is not None
+                and time.monotonic() - self._user_info_ts < self.user_info_ttl):
+            return self._user_info_cache
+        
+        user_info = await self._api(self.client.user_info_by_username, self.username)
+        self._user_info_cache = user_info
+        self._user_info_ts = time.monotonic()
+        return user_info
+    
+    def _invalidate_user_info(self):
+        """Descarta la info de usuario cacheada"""
+        self._user_info_cache = None
+        self._user_info_ts = 0.0
+    
     async def create_post(self, content: str, media_paths: Optional[List[str]] = None, 
                          **kwargs) -> Dict[str, Any]:
         """Crea una publicación en Instagram"""
@@ -128,19 +264,19 @@ class InstagramClient(BasePlatform):
             # Determinar tipo de archivo
             if media_path.lower().endswith(('.mp4', '.mov', '.avi')):
                 # Video
-                media = self.client.video_upload(media_path, caption)
+                media = await self._api(self.client.video_upload, media_path, caption)
             else:
                 # Imagen
-                media = self.client.photo_upload(media_path, caption)
+                media = await self._api(self.client.photo_upload, media_path, caption)
             
-            logger.info(f"Post creado en Instagram: {media.pk}")
+            logger.info("Post creado en Instagram: %s", media.pk)
             
             return {
                 'success': True,
                 'platform': 'instagram',
                 'post_id': media.pk,
                 'media_id': media.id,
-                'created_at': datetime.now().isoformat()
+                'created_at': now_iso()
             }
             
         except Exception as e:
@@ -153,9 +289,15 @@ class InstagramClient(BasePlatform):
             # Instagram permite hasta 10 imágenes por álbum
             album_paths = media_paths[:10]
             
-            media = self.client.album_upload(album_paths, caption)
+            media = None
+            if self.parallel_album_upload and all(
+                path.lower().endswith(ALBUM_PHOTO_EXTENSIONS) for path in album_paths
+            ):
+                media = await self._upload_album_parallel(album_paths, caption)
+            if media is None:
+                media = await self._api(self.client.album_upload, album_paths, caption)
             
-            logger.info(f"Álbum creado en Instagram: {media.pk}")
+            logger.info("Álbum creado en Instagram: %s", media.pk)
             
             return {
                 'success': True,
@@ -163,25 +305,88 @@ class InstagramClient(BasePlatform):
                 'post_id': media.pk,
                 'media_id': media.id,
                 'album_size': len(album_paths),
-                'created_at': datetime.now().isoformat()
+                'created_at': now_iso()
             }
             
         except Exception as e:
             logger.error(f"Error creando álbum en Instagram: {e}")
             raise
     
+    async def _upload_album_parallel(self, photo_paths: List[str], caption: str):
+        """Sube las fotos de un álbum en paralelo y después lo configura
+        
+        album_upload sube los archivos uno a uno. Si falla alguna subida se
+        retorna None para recurrir a él; los errores al configurar se propagan,
+        ya que el álbum podría haberse publicado.
+        """
+        # upload_id explícito por foto: el que genera instagrapi (milisegundos
+        # actuales) se repetiría entre subidas simultáneas
+        base_upload_id = int(time.time() * 1000)
+        
+        async def upload(index: int, path: str):
+            forked, lock = await pool.get()
+            try:
+                return await self._call(
+                    lock, forked.photo_rupload, Path(path), str(base_upload_id + index), to_album=True
+                )
+            finally:
+                pool.put_nowait((forked, lock))
+        
+        try:
+            # Cada subida simultánea usa su propio Client
+            pool = await self._fork_clients(min(self.album_concurrency, len(photo_paths)))
+            uploads = await asyncio.gather(*(upload(i, path) for i, path in enumerate(photo_paths)))
+        except Exception as e:
+            logger.warning(f"Error en la subida paralela del álbum, se sube en serie: {e}")
+            return None
+        
+        children = [
+            {
+                'upload_id': upload_id,
+                'edits': json_dumps({
+                    'crop_original_size': [width, height],
+                    'crop_center': [0.0, -0.0],
+                    'crop_zoom': 1.0
+                }),
+                'extra': json_dumps({'source_width': width, 'source_height': height}),
+                'scene_capture_type': '',
+                'scene_type': None
+            }
+            for upload_id, width, height in uploads
+        ]
+        
+        # Igual que album_upload: esperar antes de cada intento de configurar y
+        # reintentar mientras Instagram no haya terminado de procesar la media
+        configured = None
+        for _ in range(ALBUM_CONFIGURE_ATTEMPTS):
+            await asyncio.sleep(self.album_configure_timeout)
+            try:
+                configured = await self._api(self.client.album_configure, children, caption)
+            except Exception as e:
+                if "Transcode not finished yet" in str(e):
+                    await asyncio.sleep(self.album_configure_timeout)
+                    continue
+                raise
+            if configured:
+                break
+        
+        media = configured.get('media') if isinstance(configured, dict) else None
+        if media is None:
+            raise AlbumConfigureError("Álbum configurado sin media en la respuesta")
+        return extract_media_v1(media)
+    
     async def get_posts(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Obtiene publicaciones recientes"""
         try:
             if not self.authenticated:
                 await self.authenticate()
             
-            # Obtener info del usuario
-            user_info = self.client.user_info_by_username(self.username)
+            # Obtener info del usuario (cacheada)
+            user_info = await self._get_self_user_info()
             user_id = user_info.pk
             
             # Obtener medias del usuario
-            medias = self.client.user_medias(user_id, amount=limit)
+            medias = await self._api(self.client.user_medias, user_id, amount=limit)
             
             posts = []
             for media in medias:
@@ -208,10 +413,10 @@ class InstagramClient(BasePlatform):
             if not self.authenticated:
                 await self.authenticate()
             
-            result = self.client.media_delete(post_id)
+            result = await self._api(self.client.media_delete, post_id)
             
             if result:
-                logger.info(f"Post eliminado de Instagram: {post_id}")
+                logger.info("Post eliminado de Instagram: %s", post_id)
                 return True
             else:
                 logger.error(f"No se pudo eliminar post de Instagram: {post_id}")
@@ -227,7 +432,7 @@ class InstagramClient(BasePlatform):
             if not self.authenticated:
                 await self.authenticate()
             
-            comments = self.client.media_comments(post_id)
+            comments = await self._api(self.client.media_comments, post_id)
             
             formatted_comments = []
             for comment in comments:
@@ -257,7 +462,7 @@ class InstagramClient(BasePlatform):
             # En su lugar, se puede mencionar al usuario en un nuevo comentario
             
             # Obtener info del comentario original
-            comment = self.client.comment_info(comment_id)
+            comment = await self._api(self.client.comment_info, comment_id)
             username = comment.user.username
             
             # Crear respuesta mencionando al usuario
@@ -267,9 +472,9 @@ class InstagramClient(BasePlatform):
             media_id = comment.media_id
             
             # Crear nuevo comentario
-            new_comment = self.client.media_comment(media_id, reply_with_mention)
+            new_comment = await self._api(self.client.media_comment, media_id, reply_with_mention)
             
-            logger.info(f"Respuesta enviada en Instagram: {new_comment.pk}")
+            logger.info("Respuesta enviada en Instagram: %s", new_comment.pk)
             
             return {
                 'success': True,
@@ -288,12 +493,24 @@ class InstagramClient(BasePlatform):
                 await self.authenticate()
             
             # Obtener threads de mensajes directos
-            threads = self.client.direct_threads()
+            threads = await self._api(self.client.direct_threads)
+            
+            # Los mensajes de cada thread (los 10 últimos) se piden en paralelo,
+            # cada consulta con su propio Client
+            threads = threads[:10]
+            pool = await self._fork_clients(min(self.direct_fetch_concurrency, len(threads)))
+            
+            async def fetch_thread(thread):
+                forked, lock = await pool.get()
+                try:
+                    return thread, await self._call(lock, forked.direct_messages, thread.id, amount=5)
+                finally:
+                    pool.put_nowait((forked, lock))
+            
+            results = await asyncio.gather(*(fetch_thread(thread) for thread in threads))
             
             messages = []
-            for thread in threads[:10]:  # Limitar a los 10 últimos threads
-                thread_messages = self.client.direct_messages(thread.id, amount=5)
-                
+            for thread, thread_messages in results:
                 for msg in thread_messages:
                     message_data = {
                         'id': msg.id,
@@ -318,10 +535,10 @@ class InstagramClient(BasePlatform):
                 await self.authenticate()
             
             # Enviar mensaje directo
-            result = self.client.direct_send(message, [recipient_id])
+            result = await self._api(self.client.direct_send, message, [recipient_id])
             
             if result:
-                logger.info(f"Mensaje enviado en Instagram a: {recipient_id}")
+                logger.info("Mensaje enviado en Instagram a: %s", recipient_id)
                 return {
                     'success': True,
                     'message_id': result[0].id if result else None,
@@ -342,7 +559,7 @@ class InstagramClient(BasePlatform):
             
             if post_id:
                 # Métricas de un post específico
-                media_info = self.client.media_info(post_id)
+                media_info = await self._api(self.client.media_info, post_id)
                 
                 return {
                     'platform': 'instagram',
@@ -352,11 +569,11 @@ class InstagramClient(BasePlatform):
                         'comments': media_info.comment_count,
                         'views': getattr(media_info, 'view_count', 0)
                     },
-                    'retrieved_at': datetime.now().isoformat()
+                    'retrieved_at': now_iso()
                 }
             else:
                 # Métricas generales del perfil
-                user_info = self.client.user_info_by_username(self.username)
+                user_info = await self._get_self_user_info()
                 
                 return {
                     'platform': 'instagram',
@@ -365,7 +582,7 @@ class InstagramClient(BasePlatform):
                         'following': user_info.following_count,
                         'posts': user_info.media_count
                     },
-                    'retrieved_at': datetime.now().isoformat()
+                    'retrieved_at': now_iso()
                 }
                 
         except Exception as e:
@@ -377,6 +594,7 @@ class InstagramClient(BasePlatform):
         try:
             self.client.logout()
             self.authenticated = False
+            self._invalidate_user_info()
             logger.info("Sesión cerrada en Instagram")
         except Exception as e:
             logger.error(f"Error cerrando sesión Instagram: {e}")
\ No newline at end of file
@@ -3,13 +3,14 @@ Factory para crear clientes de plataformas
 """
 
 import asyncio
+import aiohttp
 from typing import Dict, Any, Optional, List
-from datetime import datetime
 
 from src.platforms.facebook_client import FacebookClient
 from src.platforms.instagram_client import InstagramClient
 from src.platforms.twitter_client import TwitterClient
-from src.platforms.base_platform import BasePlatform
+from src.platforms.base_platform import BasePlatform, now_iso
+from src.utils.http_session import configure_http_session, close_shared_session
 from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -18,9 +19,13 @@ logger = setup_logger(__name__)
 class PlatformFactory:
     """Factory para crear clientes de redes sociales"""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], session: Optional[aiohttp.ClientSession] = None):
         self.config = config
         self.clients: Dict[str, BasePlatform] = {}
+        self._session = session
+        
+        # Los clientes HTTP comparten un único pool de conexiones keep-alive
+        configure_http_session(config.get('http', {}))
         self._initialize_clients()
     
     def _initialize_clients(self):
@@ -30,7 +35,7 @@ class PlatformFactory:
         # Facebook
         if platforms_config.get('facebook', {}).get('enabled', False):
             try:
-                self.clients['facebook'] = FacebookClient(platforms_config['facebook'])
+                self.clients['facebook'] = FacebookClient(platforms_config['facebook'], session=self._session)
                 logger.info("Cliente de Facebook inicializado")
             except Exception as e:
                 logger.error(f"Error inicializando cliente de Facebook: {e}")
@@ -46,7 +51,7 @@ class PlatformFactory:
         # Twitter
         if platforms_config.get('twitter', {}).get('enabled', False):
             try:
-                self.clients['twitter'] = TwitterClient(platforms_config['twitter'])
+                self.clients['twitter'] = TwitterClient(platforms_config['twitter'], session=self._session)
                 logger.info("Cliente de Twitter inicializado")
             except Exception as e:
                 logger.error(f"Error inicializando cliente de Twitter: {e}")
@@ -77,7 +82,7 @@ class PlatformFactory:
         
         if platform == 'facebook' and platforms_config.get('facebook', {}).get('enabled', False):
             try:
-                self.clients['facebook'] = FacebookClient(platforms_config['facebook'])
+                self.clients['facebook'] = FacebookClient(platforms_config['facebook'], session=self._session)
                 logger.info("Cliente de Facebook refrescado")
             except Exception as e:
                 logger.error(f"Error refrescando cliente de Facebook: {e}")
@@ -91,31 +96,64 @@ class PlatformFactory:
         
         elif platform == 'twitter' and platforms_config.get('twitter', {}).get('enabled', False):
             try:
-                self.clients['twitter'] = TwitterClient(platforms_config['twitter'])
+                self.clients['twitter'] = TwitterClient(platforms_config['twitter'], session=self._session)
                 logger.info("Cliente de Twitter refrescado")
             except Exception as e:
                 logger.error(f"Error refrescando cliente de Twitter: {e}")
     
-    def get_platform_status(self) -> Dict[str, Dict[str, Any]]:
-        """Obtiene el estado de todas las plataformas"""
-        status = {}
-        
+    async def aclose(self):
+        """Cierra los clientes y el pool de conexiones HTTP compartido"""
         for platform_name, client in self.clients.items():
+            close = getattr(client, 'close', None)
+            if close is None:
+                continue
             try:
-                # Verificar conexión
-                is_connected = asyncio.run(client.test_connection())
-                
-                status[platform_name] = {
-                    'available': True,
-                    'connected': is_connected,
-                    'last_check': datetime.now().isoformat()
-                }
+                await close()
             except Exception as e:
+                logger.error(f"Error cerrando cliente de {platform_name}: {e}")
+        
+        await close_shared_session()
+    
+    async def get_platform_status_async(self) -> Dict[str, Dict[str, Any]]:
+        """Obtiene el estado de todas las plataformas, comprobándolas en paralelo"""
+        if not self.clients:
+            return {}
+        
+        names = list(self.clients)
+        results = await asyncio.gather(
+            *(client.test_connection() for client in self.clients.values()),
+            return_exceptions=True
+        )
+        
+        status = {}
+        for platform_name, result in zip(names, results):
+            if isinstance(result, Exception):
                 status[platform_name] = {
                     'available': False,
                     'connected': False,
-                    'error': str(e),
-                    'last_check': datetime.now().isoformat()
+                    'error': str(result),
+                    'last_check': now_iso()
+                }
+            else:
+                status[platform_name] = {
+                    'available': True,
+                    'connected': result,
+                    'last_check': now_iso()
                 }
         
-        return status
\ No newline at end of file
+        return status
+    
+    def get_platform_status(self) -> Dict[str, Dict[str, Any]]:
+        """Obtiene el estado de todas las plataformas
+        
+        Desde código asíncrono debe usarse get_platform_status_async, ya que
+        este método arranca su propio event loop. El pool HTTP creado en ese
+        loop se cierra antes de terminar.
+        """
+        async def check():
+            try:
+                return await self.get_platform_status_async()
+            finally:
+                await close_shared_session()
+        
+        return asyncio.run(check())
@@ -6,11 +6,12 @@ import asyncio
 import aiohttp
 import base64
 import json
+import os
 from typing import Dict, List, Any, Optional
-from datetime import datetime
 import urllib.parse
 
-from src.platforms.base_platform import BasePlatform
+from src.platforms.base_platform import BasePlatform, now_iso
+from src.utils.http_session import get_shared_session, iter_file_chunks
 from src.utils.logger import setup_logger
 
 logger = setup_logger(__name__)
@@ -19,7 +20,7 @@ logger = setup_logger(__name__)
 class TwitterClient(BasePlatform):
     """Cliente para la API de Twitter (X)"""
     
-    def __init__(self, config: Dict[str, Any]):
+    def __init__(self, config: Dict[str, Any], session: Optional[aiohttp.ClientSession] = None):
         super().__init__(config)
         self.api_key = config.get('api_key')
         self.api_secret = config.get('api_secret')
@@ -29,17 +30,25 @@ class TwitterClient(BasePlatform):
         
         self.base_url = "https://api.twitter.com/2"
         self.upload_url = "https://upload.twitter.com/1.1"
-        self.session = None
+        self._session = session
         
         if not all([self.api_key, self.api_secret, self.access_token, self.access_token_secret]):
             logger.warning("Configuración incompleta para Twitter")
     
+    @property
+    def session(self) -> aiohttp.ClientSession:
+        """Sesión HTTP inyectada o, en su defecto, el pool compartido del event loop"""
+        if self._session is None or self._session.closed:
+            return get_shared_session()
+        return self._session
+    
+    @session.setter
+    def session(self, session: Optional[aiohttp.ClientSession]):
+        self._session = session
+    
     async def authenticate(self) -> bool:
         """Autentica con Twitter"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
             # Verificar credenciales obteniendo info del usuario
             url = f"{self.base_url}/users/me"
             headers = await self._get_oauth_headers("GET", url)
@@ -48,7 +57,7 @@ class TwitterClient(BasePlatform):
                 if response.status == 200:
                     data = await response.json()
                     user_data = data.get('data', {})
-                    logger.info(f"Autenticado en Twitter como: @{user_data.get('username')}")
+                    logger.info("Autenticado en Twitter como: @%s", user_data.get('username'))
                     return True
                 else:
                     error_data = await response.json()
@@ -67,9 +76,6 @@ class TwitterClient(BasePlatform):
                          **kwargs) -> Dict[str, Any]:
         """Crea un tweet"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
             # Preparar contenido (280 caracteres máximo)
             prepared_content = self.prepare_content(content, max_length=280)
             
@@ -97,13 +103,13 @@ class TwitterClient(BasePlatform):
                 if response.status == 201:
                     result = await response.json()
                     tweet_id = result.get('data', {}).get('id')
-                    logger.info(f"Tweet creado: {tweet_id}")
+                    logger.info("Tweet creado: %s", tweet_id)
                     
                     return {
                         'success': True,
                         'platform': 'twitter',
                         'post_id': tweet_id,
-                        'created_at': datetime.now().isoformat()
+                        'created_at': now_iso()
                     }
                 else:
                     error_data = await response.json()
@@ -127,18 +133,21 @@ class TwitterClient(BasePlatform):
                 # Subir archivo
                 url = f"{self.upload_url}/media/upload.json"
                 
-                with open(media_path, 'rb') as media_file:
-                    files = {'media': media_file}
-                    headers = await self._get_oauth_headers("POST", url)
-                    
-                    async with self.session.post(url, headers=headers, data=files) as response:
-                        if response.status == 200:
-                            result = await response.json()
-                            media_ids.append(result['media_id_string'])
-                            logger.info(f"Media subido: {result['media_id_string']}")
-                        else:
-                            error_data = await response.json()
-                            logger.error(f"Error subiendo media: {error_data}")
+                # El archivo se envía en streaming sin bloquear el event loop
+                form_data = aiohttp.FormData()
+                form_data.add_field('media', iter_file_chunks(media_path),
+                                    filename=os.path.basename(media_path),
+                                    content_type='application/octet-stream')
+                headers = await self._get_oauth_headers("POST", url)
+                
+                async with self.session.post(url, headers=headers, data=form_data) as response:
+                    if response.status == 200:
+                        result = await response.json()
+                        media_ids.append(result['media_id_string'])
+                        logger.info("Media subido: %s", result['media_id_string'])
+                    else:
+                        error_data = await response.json()
+                        logger.error(f"Error subiendo media: {error_data}")
                             
             except Exception as e:
                 logger.error(f"Error subiendo archivo {media_path}: {e}")
@@ -148,9 +157,6 @@ class TwitterClient(BasePlatform):
     async def get_posts(self, limit: int = 10) -> List[Dict[str, Any]]:
         """Obtiene tweets recientes del usuario"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
             # Obtener ID del usuario primero
             user_url = f"{self.base_url}/users/me"
             user_headers = await self._get_oauth_headers("GET", user_url)
@@ -201,15 +207,12 @@ class TwitterClient(BasePlatform):
     async def delete_post(self, post_id: str) -> bool:
         """Elimina un tweet"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
             url = f"{self.base_url}/tweets/{post_id}"
             headers = await self._get_oauth_headers("DELETE", url)
             
             async with self.session.delete(url, headers=headers) as response:
                 if response.status == 200:
-                    logger.info(f"Tweet eliminado: {post_id}")
+                    logger.info("Tweet eliminado: %s", post_id)
                     return True
                 else:
                     error_data = await response.json()
@@ -223,9 +226,6 @@ class TwitterClient(BasePlatform):
     async def get_comments(self, post_id: str) -> List[Dict[str, Any]]:
         """Obtiene respuestas a un tweet"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
             # Buscar respuestas al tweet
             url = f"{self.base_url}/tweets/search/recent"
             params = {
@@ -285,9 +285,6 @@ class TwitterClient(BasePlatform):
     async def get_analytics(self, post_id: Optional[str] = None) -> Dict[str, Any]:
         """Obtiene métricas y analíticas"""
         try:
-            if not self.session:
-                self.session = aiohttp.ClientSession()
-            
             if post_id:
                 # Métricas de un tweet específico
                 url = f"{self.base_url}/tweets/{post_id}"
@@ -304,7 +301,7 @@ class TwitterClient(BasePlatform):
                             'platform': 'twitter',
                             'post_id': post_id,
                             'metrics': metrics,
-                            'retrieved_at': datetime.now().isoformat()
+                            'retrieved_at': now_iso()
                         }
             else:
                 # Métricas generales del usuario
@@ -321,7 +318,7 @@ class TwitterClient(BasePlatform):
                         return {
                             'platform': 'twitter',
                             'metrics': metrics,
-                            'retrieved_at': datetime.now().isoformat()
+                            'retrieved_at': now_iso()
                         }
             
             return {}
@@ -376,7 +373,5 @@ class TwitterClient(BasePlatform):
         return {'Authorization': auth_header}
     
     async def close(self):
-        """Cierra la sesión HTTP"""
-        if self.session:
-            await self.session.close()
-            self.session = None
\ No newline at end of file
+        """Suelta la sesión HTTP (el pool compartido lo cierra PlatformFactory.aclose)"""
+        self._session = None
\ No newline at end of file
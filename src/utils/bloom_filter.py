@@ -0,0 +1,49 @@
+"""
+Filtro de Bloom para pruebas de pertenencia en memoria
+"""
+
+import hashlib
+import math
+
+
+class BloomFilter:
+    """Filtro de Bloom simple
+
+    Un resultado negativo es definitivo; uno positivo puede ser un falso
+    positivo (con probabilidad aproximada `error_rate` mientras no se supere
+    `capacity`) y debe confirmarse contra la fuente de verdad.
+    """
+
+    def __init__(self, capacity: int = 100000, error_rate: float = 0.01):
+        if capacity <= 0:
+            raise ValueError("capacity debe ser mayor que 0")
+        if not 0 < error_rate < 1:
+            raise ValueError("error_rate debe estar entre 0 y 1")
+
+        self.capacity = capacity
+        self.error_rate = error_rate
+        self.num_bits = max(8, int(-capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.num_hashes = max(1, round(self.num_bits / capacity * math.log(2)))
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        self._count = 0
+
+    def _positions(self, item: str):
+        """Calcula las posiciones de bits del elemento (doble hashing)"""
+        digest = hashlib.blake2b(item.encode('utf-8'), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], 'little')
+        h2 = int.from_bytes(digest[8:], 'little') | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, item: str):
+        """Agrega un elemento al filtro"""
+        for position in self._positions(item):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self._count += 1
+
+    def __contains__(self, item: str) -> bool:
+        return all(self._bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(item))
+
+    def __len__(self) -> int:
+        return self._count
@@ -3,14 +3,16 @@ Gestor de base de datos
 """
 
 import asyncio
+import hashlib
 import json
-from typing import Dict, List, Any, Optional
+from typing import AsyncIterator, Dict, List, Any, Optional, Sequence, Tuple
 from datetime import datetime, timedelta
 from pathlib import Path
 
 # SQLAlchemy imports
-from sqlalchemy import create_engine, Column, String, DateTime, Text, Integer, Boolean, JSON
+from sqlalchemy import create_engine, select, update, bindparam, and_, or_, Column, String, DateTime, Text, Integer, Boolean, JSON
 from sqlalchemy.ext.declarative import declarative_base
+from sqlalchemy.engine import Row
 from sqlalchemy.orm import sessionmaker, Session
 from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
 
@@ -42,7 +44,7 @@ class ScheduledPostModel(Base):
     id = Column(String, primary_key=True)
     content_id = Column(String, nullable=False)
     platform = Column(String, nullable=False)
-    scheduled_time = Column(DateTime, nullable=False)
+    scheduled_time = Column(DateTime, nullable=False, index=True)
     status = Column(String, default='scheduled')  # scheduled, published, failed
     config = Column(JSON, default=dict)
     created_at = Column(DateTime, default=datetime.now)
@@ -108,6 +110,14 @@ class AnalyticsModel(Base):
     raw_data = Column(JSON, nullable=True)
 
 
+RECORD_MODELS = {
+    'comment': CommentModel,
+    'reply': ReplyModel,
+    'message': MessageModel,
+    'analytics': AnalyticsModel
+}
+
+
 class DatabaseManager:
     """Gestor de base de datos"""
     
@@ -185,21 +195,45 @@ class DatabaseManager:
                     content = session.get(ContentModel, content_id)
             
             if content:
-                return {
-                    'id': content.id,
-                    'title': content.title,
-                    'content': content.content,
-                    'media_paths': content.media_paths or [],
-                    'tags': content.tags or [],
-                    'created_at': content.created_at,
-                    'updated_at': content.updated_at,
-                    'status': content.status
-                }
+                return self._content_to_dict(content)
             return None
         except Exception as e:
             logger.error(f"Error obteniendo contenido {content_id}: {e}")
             return None
     
+    async def get_contents(self, content_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Obtiene varios contenidos en una sola consulta, indexados por ID"""
+        if not content_ids:
+            return {}
+        
+        try:
+            query = select(ContentModel).where(ContentModel.id.in_(list(content_ids)))
+            if self.async_mode:
+                async with self._get_session() as session:
+                    contents = (await session.execute(query)).scalars().all()
+            else:
+                with self._get_session() as session:
+                    contents = session.execute(query).scalars().all()
+            
+            return {content.id: self._content_to_dict(content) for content in contents}
+        except Exception as e:
+            logger.error(f"Error obteniendo contenidos: {e}")
+            return {}
+    
+    @staticmethod
+    def _content_to_dict(content: ContentModel) -> Dict[str, Any]:
+        """Convierte un ContentModel a diccionario"""
+        return {
+            'id': content.id,
+            'title': content.title,
+            'content': content.content,
+            'media_paths': content.media_paths or [],
+            'tags': content.tags or [],
+            'created_at': content.created_at,
+            'updated_at': content.updated_at,
+            'status': content.status
+        }
+    
     async def list_content(self, limit: int = 50, status: str = 'active') -> List[Dict[str, Any]]:
         """Lista contenido"""
         try:
@@ -320,22 +354,111 @@ class DatabaseManager:
                         ScheduledPostModel.scheduled_time <= current_time
                     ).all()
             
-            return [
-                {
-                    'id': post.id,
-                    'content_id': post.content_id,
-                    'platform': post.platform,
-                    'scheduled_time': post.scheduled_time,
-                    'config': post.config or {},
-                    'attempts': post.attempts,
-                    'max_attempts': post.max_attempts
-                }
-                for post in posts
-            ]
+            return [self._due_post_to_dict(post) for post in posts]
         except Exception as e:
             logger.error(f"Error obteniendo posts para ejecutar: {e}")
             return []
     
+    async def iter_due_posts(self, current_time: datetime,
+                             chunk_size: int = 100) -> AsyncIterator[List[Dict[str, Any]]]:
+        """Recorre las publicaciones que deben ejecutarse en bloques de `chunk_size`
+        
+        Usa paginación por clave (scheduled_time, id) con una consulta corta por
+        bloque, de modo que no queda un cursor abierto mientras se procesan.
+        """
+        last_key: Optional[Tuple[datetime, str]] = None
+        
+        while True:
+            query = select(ScheduledPostModel).where(
+                ScheduledPostModel.status == 'scheduled',
+                ScheduledPostModel.scheduled_time <= current_time
+            )
+            if last_key is not None:
+                last_time, last_id = last_key
+                query = query.where(or_(
+                    ScheduledPostModel.scheduled_time > last_time,
+                    and_(ScheduledPostModel.scheduled_time == last_time, ScheduledPostModel.id > last_id)
+                ))
+            query = query.order_by(ScheduledPostModel.scheduled_time, ScheduledPostModel.id).limit(chunk_size)
+            
+            try:
+                if self.async_mode:
+                    async with self._get_session() as session:
+                        posts = (await session.execute(query)).scalars().all()
+                else:
+                    with self._get_session() as session:
+                        posts = session.execute(query).scalars().all()
+            except Exception as e:
+                logger.error(f"Error obteniendo posts para ejecutar: {e}")
+                return
+            
+            if not posts:
+                return
+            
+            last_key = (posts[-1].scheduled_time, posts[-1].id)
+            yield [self._due_post_to_dict(post) for post in posts]
+            
+            if len(posts) < chunk_size:
+                return
+    
+    async def iter_scheduled_posts(self, status: str = 'scheduled',
+                                   columns: Sequence[str] = ('id', 'scheduled_time', 'attempts', 'max_attempts'),
+                                   until: Optional[datetime] = None,
+                                   chunk_size: int = 500) -> AsyncIterator[Row]:
+        """Recorre publicaciones proyectando solo `columns`, fila a fila
+        
+        Devuelve filas ligeras (tuplas con nombre) en orden de scheduled_time
+        sin materializar modelos ORM ni diccionarios; con `until` solo se leen
+        las programadas hasta esa fecha. `id` y `scheduled_time` se incluyen
+        siempre porque se usan para paginar por clave.
+        """
+        names = list(dict.fromkeys(('id', 'scheduled_time', *columns)))
+        selected = [getattr(ScheduledPostModel, name) for name in names]
+        last_key: Optional[Tuple[datetime, str]] = None
+        
+        while True:
+            query = select(*selected).where(ScheduledPostModel.status == status)
+            if until is not None:
+                query = query.where(ScheduledPostModel.scheduled_time <= until)
+            if last_key is not None:
+                last_time, last_id = last_key
+                query = query.where(or_(
+                    ScheduledPostModel.scheduled_time > last_time,
+                    and_(ScheduledPostModel.scheduled_time == last_time, ScheduledPostModel.id > last_id)
+                ))
+            query = query.order_by(ScheduledPostModel.scheduled_time, ScheduledPostModel.id).limit(chunk_size)
+            
+            try:
+                if self.async_mode:
+                    async with self._get_session() as session:
+                        rows = (await session.execute(query)).all()
+                else:
+                    with self._get_session() as session:
+                        rows = session.execute(query).all()
+            except Exception as e:
+                logger.error(f"Error recorriendo publicaciones programadas: {e}")
+                return
+            
+            for row in rows:
+                yield row
+            
+            if len(rows) < chunk_size:
+                return
+            last_key = (rows[-1].scheduled_time, rows[-1].id)
+    
+    @staticmethod
+    def _due_post_to_dict(post: ScheduledPostModel) -> Dict[str, Any]:
+        """Convierte una publicación pendiente a diccionario"""
+        return {
+            'id': post.id,
+            'content_id': post.content_id,
+            'platform': post.platform,
+            'scheduled_time': post.scheduled_time,
+            'config': post.config or {},
+            'attempts': post.attempts,
+            'max_attempts': post.max_attempts
+        }
+    
     async def update_scheduled_post(self, post_id: str, updates: Dict[str, Any]) -> bool:
         """Actualiza publicación programada"""
         try:
@@ -360,6 +483,73 @@ class DatabaseManager:
             logger.error(f"Error actualizando publicación programada {post_id}: {e}")
             return False
     
+    async def update_scheduled_posts(self, updates_by_id: Dict[str, Dict[str, Any]]) -> int:
+        """Actualiza varias publicaciones programadas en una sola transacción
+        
+        Agrupa los cambios por conjunto de columnas y ejecuta un UPDATE por
+        grupo en modo executemany, sin cargar las filas antes. Los IDs que ya no
+        existan simplemente no actualizan nada.
+        """
+        if not updates_by_id:
+            return 0
+        
+        table = ScheduledPostModel.__table__
+        
+        # Publicadas y fallidas modifican columnas distintas: un statement por forma.
+        # Las claves que no son columnas (p. ej. 'updated_at') se ignoran.
+        groups: Dict[Tuple[str, ...], List[Dict[str, Any]]] = {}
+        for post_id, updates in updates_by_id.items():
+            updates = {key: value for key, value in updates.items() if key in table.c}
+            if not updates:
+                continue
+            params = {f"v_{key}": value for key, value in updates.items()}
+            params['b_id'] = post_id
+            groups.setdefault(tuple(sorted(updates)), []).append(params)
+        
+        statements = [
+            (
+                update(table)
+                .where(table.c.id == bindparam('b_id'))
+                .values({key: bindparam(f"v_{key}") for key in keys}),
+                rows
+            )
+            for keys, rows in groups.items()
+        ]
+        
+        try:
+            if self.async_mode:
+                async with self._get_session() as session:
+                    for statement, rows in statements:
+                        await session.execute(statement, rows)
+                    await session.commit()
+            else:
+                with self._get_session() as session:
+                    for statement, rows in statements:
+                        session.execute(statement, rows)
+                    session.commit()
+            return len(updates_by_id)
+        except Exception as e:
+            logger.error(f"Error actualizando {len(updates_by_id)} publicaciones programadas: {e}")
+            return 0
+    
+    async def get_post_attempts(self, post_ids: Sequence[str]) -> Dict[str, Tuple[int, int]]:
+        """Obtiene (attempts, max_attempts) actuales de varias publicaciones en una consulta"""
+        if not post_ids:
+            return {}
+        
+        query = select(
+            ScheduledPostModel.id, ScheduledPostModel.attempts, ScheduledPostModel.max_attempts
+        ).where(ScheduledPostModel.id.in_(list(post_ids)))
+        
+        if self.async_mode:
+            async with self._get_session() as session:
+                rows = (await session.execute(query)).all()
+        else:
+            with self._get_session() as session:
+                rows = session.execute(query).all()
+        
+        return {row.id: (row.attempts or 0, row.max_attempts or 3) for row in rows}
+    
     async def get_scheduled_post(self, post_id: str) -> Optional[Dict[str, Any]]:
         """Obtiene una publicación programada específica"""
         try:
@@ -390,20 +580,51 @@ class DatabaseManager:
     
     # Métodos para interacciones
     
+    @staticmethod
+    def _generate_record_id(kind: str, record: Dict[str, Any]) -> str:
+        """Genera el ID único de un registro de interacción"""
+        if kind == 'comment':
+            hash_source = f"{record['comment_id']}{record['platform']}"
+        elif kind == 'reply':
+            hash_source = f"{record['comment_id']}{record['platform']}{datetime.now().isoformat()}"
+        elif kind == 'message':
+            hash_source = f"{record['message_id']}{record['platform']}"
+        else:
+            hash_source = f"{record['platform']}{datetime.now().isoformat()}"
+        return hashlib.md5(hash_source.encode()).hexdigest()
+    
     async def is_comment_processed(self, comment_id: str) -> bool:
         """Verifica si un comentario ya fue procesado"""
         try:
             if self.async_mode:
                 async with self._get_session() as session:
-                    comment = await session.query(CommentModel).filter_by(comment_id=comment_id).first()
+                    result = await session.execute(
+                        select(CommentModel.id).filter_by(comment_id=comment_id).limit(1)
+                    )
+                    comment = result.scalar_one_or_none()
             else:
                 with self._get_session() as session:
                     comment = session.query(CommentModel).filter_by(comment_id=comment_id).first()
             
             return comment is not None
         except Exception as e:
+            # Sin respuesta fiable no se asume "no procesado": se propaga al llamador
             logger.error(f"Error verificando comentario procesado: {e}")
-            return False
+            raise
+    
+    async def get_processed_comment_ids(self) -> List[str]:
+        """Obtiene los IDs de todos los comentarios ya procesados"""
+        try:
+            if self.async_mode:
+                async with self._get_session() as session:
+                    result = await session.execute(select(CommentModel.comment_id))
+                    return list(result.scalars().all())
+            else:
+                with self._get_session() as session:
+                    return [row[0] for row in session.query(CommentModel.comment_id).all()]
+        except Exception as e:
+            logger.error(f"Error obteniendo comentarios procesados: {e}")
+            raise
     
     async def mark_comment_processed(self, comment_id: str):
         """Marca un comentario como procesado"""
@@ -415,9 +636,7 @@ class DatabaseManager:
         """Guarda registro de comentario"""
         try:
             # Generar ID único
-            import hashlib
-            record_id = hashlib.md5(f"{record['comment_id']}{record['platform']}".encode()).hexdigest()
-            record['id'] = record_id
+            record['id'] = self._generate_record_id('comment', record)
             
             if self.async_mode:
                 async with self._get_session() as session:
@@ -435,9 +654,7 @@ class DatabaseManager:
     async def save_reply_record(self, record: Dict[str, Any]):
         """Guarda registro de respuesta"""
         try:
-            import hashlib
-            record_id = hashlib.md5(f"{record['comment_id']}{record['platform']}{datetime.now().isoformat()}".encode()).hexdigest()
-            record['id'] = record_id
+            record['id'] = self._generate_record_id('reply', record)
             
             if self.async_mode:
                 async with self._get_session() as session:
@@ -455,9 +672,7 @@ class DatabaseManager:
     async def save_message_record(self, record: Dict[str, Any]):
         """Guarda registro de mensaje"""
         try:
-            import hashlib
-            record_id = hashlib.md5(f"{record['message_id']}{record['platform']}".encode()).hexdigest()
-            record['id'] = record_id
+            record['id'] = self._generate_record_id('message', record)
             
             if self.async_mode:
                 async with self._get_session() as session:
@@ -475,9 +690,7 @@ class DatabaseManager:
     async def save_analytics_record(self, record: Dict[str, Any]):
         """Guarda registro de analytics"""
         try:
-            import hashlib
-            record_id = hashlib.md5(f"{record['platform']}{datetime.now().isoformat()}".encode()).hexdigest()
-            record['id'] = record_id
+            record['id'] = self._generate_record_id('analytics', record)
             
             if self.async_mode:
                 async with self._get_session() as session:
@@ -492,6 +705,38 @@ class DatabaseManager:
         except Exception as e:
             logger.error(f"Error guardando registro de analytics: {e}")
     
+    async def bulk_save_records(self, records: List[Tuple[str, Dict[str, Any]]]):
+        """Guarda un lote de registros de interacción en una sola transacción
+        
+        Args:
+            records: Lista de tuplas (tipo, registro) donde tipo es
+                'comment', 'reply', 'message' o 'analytics'
+        """
+        if not records:
+            return
+        
+        try:
+            models = []
+            for kind, record in records:
+                record['id'] = self._generate_record_id(kind, record)
+                models.append(RECORD_MODELS[kind](**record))
+            
+            if self.async_mode:
+                async with self._get_session() as session:
+                    session.add_all(models)
+                    await session.commit()
+            else:
+                with self._get_session() as session:
+                    session.add_all(models)
+                    session.commit()
+            
+            logger.debug(f"Lote de {len(records)} registros guardado")
+        except Exception as e:
+            # Un registro inválido o duplicado no debe hacer perder el resto del lote
+            logger.warning(f"Error guardando lote de registros, reintentando uno a uno: {e}")
+            for kind, record in records:
+                await getattr(self, f"save_{kind}_record")(record)
+    
     async def get_statistics(self) -> Dict[str, Any]:
         """Obtiene estadísticas generales"""
         try:
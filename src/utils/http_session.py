@@ -0,0 +1,136 @@
+"""
+Sesión HTTP compartida entre los clientes de plataformas
+"""
+
+import asyncio
+import json
+from typing import AsyncIterator, Dict, Any, Optional, Set
+
+import aiofiles
+import aiohttp
+
+try:
+    import orjson
+except ImportError:  # opcional: se usa json de la librería estándar
+    orjson = None
+
+
+# Límites del pool de conexiones (sobrescribibles con la sección `http` del config)
+DEFAULT_HTTP_LIMITS = {
+    'max_connections': 100,
+    'max_connections_per_host': 20,
+    'keepalive_timeout': 30,
+    'dns_cache_ttl': 600,
+    'request_timeout': 180
+}
+
+# Fallos esperables de una petición: red, timeout o cuerpo que no es JSON válido;
+# otros ValueError son errores de programación y no se ocultan
+HTTP_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, json.JSONDecodeError)
+if orjson is not None:
+    HTTP_ERRORS += (orjson.JSONDecodeError,)
+
+# Tamaño de bloque al leer archivos multimedia para subirlos
+UPLOAD_CHUNK_SIZE = 1 << 18
+
+_limits: Dict[str, Any] = dict(DEFAULT_HTTP_LIMITS)
+
+# Codificación JSON de peticiones y respuestas (orjson si está instalado);
+# json_loads se pasa a `response.json(loads=...)`
+if orjson is not None:
+    json_loads = orjson.loads
+
+    def json_dumps(obj: Any) -> str:
+        """Serializa a JSON con orjson"""
+        return orjson.dumps(obj).decode('utf-8')
+else:
+    json_loads = json.loads
+    json_dumps = json.dumps
+
+_session: Optional[aiohttp.ClientSession] = None
+_session_loop: Optional[asyncio.AbstractEventLoop] = None
+# Cierres en curso de sesiones de loops anteriores (referencia para que no se recojan)
+_closing: Set[asyncio.Future] = set()
+
+
+def configure_http_session(http_config: Optional[Dict[str, Any]] = None):
+    """Ajusta los límites del pool; aplica a la próxima sesión que se cree"""
+    _limits.update(http_config or {})
+
+
+def get_shared_session() -> aiohttp.ClientSession:
+    """Obtiene la sesión HTTP compartida del event loop actual
+
+    Todas las llamadas reutilizan el mismo pool de conexiones keep-alive, así
+    cada publicación no paga un nuevo handshake TCP+TLS.
+    """
+    global _session, _session_loop
+
+    loop = asyncio.get_running_loop()
+    if _session is not None and not _session.closed and _session_loop is not loop:
+        _close_stale_session(_session, _session_loop, loop)
+
+    if _session is None or _session.closed or _session_loop is not loop:
+        connector = aiohttp.TCPConnector(
+            limit=_limits['max_connections'],
+            limit_per_host=_limits['max_connections_per_host'],
+            keepalive_timeout=_limits['keepalive_timeout'],
+            ttl_dns_cache=_limits['dns_cache_ttl']
+        )
+        _session = aiohttp.ClientSession(
+            connector=connector,
+            timeout=aiohttp.ClientTimeout(total=_limits['request_timeout'])
+        )
+        _session_loop = loop
+
+    return _session
+
+
+def _close_stale_session(session: aiohttp.ClientSession,
+                         session_loop: Optional[asyncio.AbstractEventLoop],
+                         loop: asyncio.AbstractEventLoop):
+    """Cierra la sesión de un event loop anterior al cambiar de loop
+
+    Si ese loop sigue en marcha (otro hilo) se cierra en él; si no, se cierra
+    desde el loop actual para liberar el conector.
+    """
+    if session_loop is not None and session_loop.is_running():
+        future = asyncio.run_coroutine_threadsafe(session.close(), session_loop)
+    else:
+        future = loop.create_task(_close_quietly(session))
+    _closing.add(future)
+    future.add_done_callback(_closing.discard)
+
+
+async def _close_quietly(session: aiohttp.ClientSession):
+    """Cierra una sesión cuyo event loop ya terminó"""
+    try:
+        await session.close()
+    except RuntimeError:
+        # El conector ya cerró sus conexiones; solo falla la espera final,
+        # que no puede programarse en un loop cerrado
+        pass
+
+
+async def close_shared_session():
+    """Cierra la sesión HTTP compartida"""
+    global _session, _session_loop
+
+    if _session is not None and not _session.closed:
+        await _session.close()
+    _session = None
+    _session_loop = None
+
+
+async def iter_file_chunks(path: str, chunk_size: int = UPLOAD_CHUNK_SIZE) -> AsyncIterator[bytes]:
+    """Lee un archivo en bloques sin bloquear el event loop
+
+    Pasado como valor de `aiohttp.FormData.add_field`, aiohttp envía el
+    archivo en streaming sin cargarlo entero en memoria.
+    """
+    async with aiofiles.open(path, 'rb') as f:
+        while True:
+            chunk = await f.read(chunk_size)
+            if not chunk:
+                return
+            yield chunk
@@ -0,0 +1,28 @@
+"""
+Utilidades de rutas y directorios
+"""
+
+from pathlib import Path
+from typing import Set, Union
+
+# Directorios ya verificados en este proceso
+_ensured_dirs: Set[Path] = set()
+
+
+def ensure_dirs(*directories: Union[str, Path]):
+    """Crea los directorios que falten, una sola vez por proceso
+
+    Las rutas se normalizan y deduplican; las ya verificadas no vuelven a
+    tocar el sistema de archivos y las existentes solo cuestan un stat.
+    """
+    for directory in directories:
+        if not directory:
+            continue
+
+        path = Path(directory).resolve()
+        if path in _ensured_dirs:
+            continue
+
+        if not path.is_dir():
+            path.mkdir(parents=True, exist_ok=True)
+        _ensured_dirs.add(path)
@@ -0,0 +1,129 @@
+"""
+Limitadores de velocidad para llamadas a APIs
+"""
+
+import asyncio
+import random
+import time
+from typing import Any, Dict, Optional
+
+
+class TokenBucket:
+    """Limitador token-bucket asíncrono
+
+    Permite ráfagas de hasta `capacity` llamadas y repone `rate` tokens por
+    segundo. Solo espera cuando el bucket está vacío, en lugar de dormir un
+    tiempo fijo entre cada llamada.
+    """
+
+    def __init__(self, rate: float, capacity: Optional[float] = None):
+        if rate <= 0:
+            raise ValueError("rate debe ser mayor que 0")
+
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self._tokens = self.capacity
+        self._updated_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    def _refill(self):
+        """Repone los tokens acumulados desde la última consulta"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+
+    async def acquire(self, tokens: float = 1.0):
+        """Consume tokens, esperando lo necesario si el bucket está vacío"""
+        async with self._lock:
+            self._refill()
+            while self._tokens < tokens:
+                await asyncio.sleep((tokens - self._tokens) / self.rate)
+                self._refill()
+            self._tokens -= tokens
+
+    def set_rate(self, rate: float):
+        """Cambia la velocidad, conservando los tokens acumulados hasta ahora"""
+        if rate <= 0:
+            raise ValueError("rate debe ser mayor que 0")
+
+        self._refill()
+        self.rate = rate
+
+    async def __aenter__(self):
+        await self.acquire()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class AIMDLimiter:
+    """Velocidad de peticiones adaptativa (AIMD) sobre un TokenBucket
+
+    Cuando la API indica saturación la velocidad del bucket se multiplica por
+    `decrease` (sin bajar de `min_ratio` veces la inicial); tras cada `window`
+    llamadas correctas seguidas se suma `increase` veces la velocidad inicial,
+    sin pasar de ella. Así se busca el ritmo real de la API sin fijarlo.
+    """
+
+    def __init__(self, bucket: TokenBucket, increase: float = 0.1, decrease: float = 0.5,
+                 min_ratio: float = 0.1, window: int = 10):
+        if not 0 < min_ratio <= 1:
+            raise ValueError("min_ratio debe estar entre 0 y 1")
+
+        self.bucket = bucket
+        self.max_rate = bucket.rate
+        self.min_rate = bucket.rate * min_ratio
+        self.increase = bucket.rate * increase
+        self.decrease = decrease
+        self.window = window
+        self.throttled = 0
+        self._successes = 0
+
+    @property
+    def rate(self) -> float:
+        """Velocidad actual del bucket (peticiones por segundo)"""
+        return self.bucket.rate
+
+    def record(self, success: bool = True, throttled: bool = False):
+        """Ajusta la velocidad según el resultado de una llamada
+
+        Los errores que no son de saturación (success=False) no cambian la
+        velocidad, pero interrumpen la racha de llamadas correctas.
+        """
+        if throttled:
+            self.bucket.set_rate(max(self.min_rate, self.rate * self.decrease))
+            self.throttled += 1
+            self._successes = 0
+        elif not success:
+            self._successes = 0
+        else:
+            self._successes += 1
+            if self._successes >= self.window:
+                self._successes = 0
+                self.bucket.set_rate(min(self.max_rate, self.rate + self.increase))
+
+    def stats(self) -> Dict[str, Any]:
+        """Estado actual del limitador"""
+        return {
+            'rate': self.rate,
+            'max_rate': self.max_rate,
+            'throttled': self.throttled
+        }
+
+
+def backoff_delay(attempt: int, base: float = 1.0, cap: float = 30.0,
+                  retry_after: Optional[str] = None) -> float:
+    """Segundos a esperar antes del reintento número `attempt` (desde 0)
+
+    Respeta la cabecera Retry-After si trae segundos; si no, aplica backoff
+    exponencial acotado por `cap` con jitter de ±50% para que los clientes
+    no reintenten todos a la vez.
+    """
+    if retry_after:
+        try:
+            return min(cap, max(0.0, float(retry_after)))
+        except ValueError:
+            pass  # Retry-After con fecha HTTP: usar el backoff
+
+    return min(cap, base * 2 ** attempt) * random.uniform(0.5, 1.5)
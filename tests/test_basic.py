@@ -16,6 +16,11 @@ from src.platforms.platform_factory import PlatformFactory
 class TestConfigManager:
     """Tests para ConfigManager"""
     
+    @pytest.fixture(autouse=True)
+    def isolated_cache(self, tmp_path, monkeypatch):
+        """Aísla la caché de configuración en un directorio temporal"""
+        monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path / "cache"))
+    
     def test_load_default_config(self):
         """Test de carga de configuración por defecto"""
         config_manager = ConfigManager("config/nonexistent.yaml")
@@ -46,6 +51,71 @@ class TestConfigManager:
         
         config_manager.set('test.key', 'test_value')
         assert config_manager.get('test.key') == 'test_value'
+    
+    def test_lazy_load_on_first_get(self, tmp_path):
+        """Test de carga perezosa en el primer acceso y creación explícita de directorios"""
+        config_path = tmp_path / "config.yaml"
+        config_path.write_text(
+            "content:\n  media_upload_path: " + str(tmp_path / "media") + "\n",
+            encoding='utf-8'
+        )
+        config_manager = ConfigManager(str(config_path))
+        assert config_manager._config is None
+        
+        assert config_manager.get('content.media_upload_path') == str(tmp_path / "media")
+        assert not (tmp_path / "media").exists()
+        
+        config_manager.ensure_dirs()
+        assert (tmp_path / "media").is_dir()
+    
+    def test_parsed_yaml_cached_until_file_changes(self, tmp_path):
+        """Test de caché de la configuración parseada invalidada por cambios del archivo"""
+        import os
+        
+        config_path = tmp_path / "config.yaml"
+        config_path.write_text("general:\n  timezone: UTC\n", encoding='utf-8')
+        
+        assert ConfigManager(str(config_path)).get('general.timezone') == 'UTC'
+        assert len(list((tmp_path / "cache").rglob("config_*.pkl"))) == 1
+        assert ConfigManager(str(config_path)).get('general.timezone') == 'UTC'
+        
+        config_path.write_text("general:\n  timezone: Europe/Madrid\n", encoding='utf-8')
+        stat_result = config_path.stat()
+        os.utime(config_path, ns=(stat_result.st_atime_ns, stat_result.st_mtime_ns + 1_000_000))
+        assert ConfigManager(str(config_path)).get('general.timezone') == 'Europe/Madrid'
+        
+        # La versión nueva sustituye a la anterior en el mismo archivo, legible solo por el usuario
+        cache_files = list((tmp_path / "cache").rglob("config_*.pkl"))
+        assert len(cache_files) == 1
+        assert cache_files[0].stat().st_mode & 0o777 == 0o600
+    
+    def test_env_overrides(self, monkeypatch):
+        """Test de sobrescritura de configuración con variables de entorno"""
+        monkeypatch.setenv('DEBUG', 'False')
+        monkeypatch.setenv('API_PORT', '9001')
+        monkeypatch.setenv('LOG_LEVEL', '')
+        monkeypatch.setenv('TWITTER_API_KEY', 'clave')
+        
+        config = ConfigManager("config/nonexistent.yaml").load_config()
+        
+        assert config['general']['debug'] is False
+        assert config['api']['port'] == 9001
+        assert config['general']['log_level'] == 'INFO'
+        assert config['platforms']['twitter']['api_key'] == 'clave'
+        assert config['platforms']['twitter']['enabled'] is True
+    
+    def test_save_and_reload_yaml(self, tmp_path):
+        """Test de guardado y recarga de configuración YAML"""
+        config_manager = ConfigManager("config/nonexistent.yaml")
+        config_manager.load_config()
+        config_manager.set('general.timezone', 'América/Bogotá')
+        
+        saved_path = tmp_path / "config.yaml"
+        config_manager.save_config(str(saved_path))
+        
+        reloaded = ConfigManager(str(saved_path)).load_config()
+        assert reloaded['general']['timezone'] == 'América/Bogotá'
+        assert reloaded['scheduler'] == config_manager.get('scheduler')
 
 
 class TestContentManager:
@@ -79,7 +149,10 @@ class TestContentManager:
         
         assert content_id is not None
         assert content_id.startswith('content_')
+        assert len(content_id) == len('content_') + 12
         content_manager.db_manager.save_content.assert_called_once()
+        record = content_manager.db_manager.save_content.call_args.args[0]
+        assert record['created_at'] == record['updated_at']
     
     @pytest.mark.asyncio
     async def test_schedule_post(self, content_manager):
@@ -101,8 +174,147 @@ class TestContentManager:
         
         assert post_id is not None
         assert post_id.startswith('post_')
+        assert len(post_id) == len('post_') + 12
         content_manager.db_manager.save_scheduled_post.assert_called_once()
 
+    @pytest.mark.asyncio
+    async def test_schedule_post_skips_lookup_for_known_content(self, content_manager):
+        """Test de verificación de contenido sin consultar la DB para IDs conocidos"""
+        content_id = await content_manager.add_content({'title': 'A', 'content': 'uno'})
+        content_manager.db_manager.get_content = AsyncMock(return_value=None)
+        
+        await content_manager.schedule_post(content_id, 'facebook', datetime.now())
+        content_manager.db_manager.get_content.assert_not_awaited()
+        
+        with pytest.raises(ValueError):
+            await content_manager.schedule_post('desconocido', 'facebook', datetime.now())
+        content_manager.db_manager.get_content.assert_awaited_once_with('desconocido')
+    
+    @pytest.mark.asyncio
+    async def test_save_media_from_bytes_and_stream(self, content_manager, tmp_path):
+        """Test de guardado de media desde bytes y desde un archivo abierto"""
+        import io
+        import os
+        
+        content_manager.media_path = tmp_path
+        media_data = os.urandom(3 * 1024 * 1024 + 7)
+        
+        from_bytes = await content_manager.save_media(media_data, 'foto 1.jpg')
+        from_stream = await content_manager.save_media(io.BytesIO(media_data), 'foto 1.jpg')
+        
+        with open(from_stream, 'rb') as f:
+            assert f.read() == media_data
+        # Mismo contenido -> mismo hash en el nombre
+        assert from_bytes.split('_')[-2] == from_stream.split('_')[-2]
+        assert from_stream.endswith('_foto1.jpg')
+        assert not list(tmp_path.glob('*.part'))
+        # Permisos por defecto según la umask, no los 0600 de un temporal
+        umask = os.umask(0)
+        os.umask(umask)
+        assert os.stat(from_stream).st_mode & 0o777 == 0o666 & ~umask
+        assert content_manager._sanitize_filename('../año 2024/fóto$.jpg') == '..ao2024fto.jpg'
+    
+    @pytest.mark.asyncio
+    async def test_template_cached_until_file_changes(self, content_manager, tmp_path):
+        """Test de caché de plantillas invalidada al recrear la plantilla"""
+        content_manager.templates_path = tmp_path
+        assert await content_manager.load_content_template('promo') is None
+        
+        await content_manager.create_content_template('promo', {'content': 'Hola {nombre}', 'variables': ['nombre']})
+        template = await content_manager.load_content_template('promo')
+        template['content_template'] = 'modificada'
+        template['variables'].append('otra')
+        reloaded = await content_manager.load_content_template('promo')
+        assert reloaded['content_template'] == 'Hola {nombre}'
+        assert reloaded['variables'] == ['nombre']
+        
+        await content_manager.create_content_template('promo', {'content': 'Adiós {nombre}'})
+        generated = await content_manager.generate_content_from_template('promo', {'nombre': 'Ana'})
+        assert generated['content'] == 'Adiós Ana'
+        
+        # Una sola pasada: los valores no se vuelven a sustituir y lo desconocido se conserva
+        await content_manager.create_content_template('promo', {'content': '{saludo} {nombre}, {otro}'})
+        generated = await content_manager.generate_content_from_template(
+            'promo', {'saludo': 'Hola {nombre}', 'nombre': 'Ana'}
+        )
+        assert generated['content'] == 'Hola {nombre} Ana, {otro}'
+    
+    @pytest.mark.asyncio
+    async def test_bulk_contents_and_marks(self, content_manager):
+        """Test de lectura y marcado de publicaciones en bloque"""
+        first_id = await content_manager.add_content({'title': 'A', 'content': 'uno'})
+        second_id = await content_manager.add_content({'title': 'B', 'content': 'dos'})
+        contents = await content_manager.get_contents_bulk({first_id, second_id, 'missing'})
+        assert set(contents) == {first_id, second_id}
+        assert contents[first_id]['content'] == 'uno'
+
+        now = datetime.now()
+        published_id = await content_manager.schedule_post(first_id, 'facebook', now)
+        failed_id = await content_manager.schedule_post(second_id, 'facebook', now)
+        due = {post['id']: post for post in await content_manager.get_due_posts()}
+
+        marked_at = datetime(2030, 1, 1, 12, 0)
+        await content_manager.mark_posts_bulk([
+            (due[published_id], 'published', {'post_id': 'fb_1'}),
+            (due[failed_id], 'failed', 'timeout'),
+            ({'id': 'post_borrado'}, 'published', {}),
+        ], now=marked_at)
+
+        published = await content_manager.db_manager.get_scheduled_post(published_id)
+        failed = await content_manager.db_manager.get_scheduled_post(failed_id)
+        assert published['status'] == 'published'
+        assert failed['attempts'] == 1
+        assert failed['last_error'] == 'timeout'
+        # El reintento se calcula sobre la marca de tiempo compartida del lote
+        assert failed['scheduled_time'] == datetime(2030, 1, 1, 12, 1)
+
+        # Los intentos se cuentan desde la DB aunque la copia encolada esté desfasada
+        await content_manager.mark_posts_bulk([
+            (due[failed_id], 'failed', 'timeout'),
+            (due[failed_id], 'failed', 'timeout'),
+        ], now=marked_at)
+        failed = await content_manager.db_manager.get_scheduled_post(failed_id)
+        assert failed['attempts'] == 3
+        assert failed['status'] == 'failed'
+
+    @pytest.mark.asyncio
+    async def test_iter_scheduled_posts_projection(self, content_manager):
+        """Test de recorrido proyectado de publicaciones hasta una fecha"""
+        from datetime import timedelta
+        
+        content_id = await content_manager.add_content({'title': 'A', 'content': 'uno'})
+        base = datetime(2030, 1, 1, 12, 0)
+        for minutes in (2, 0, 1):
+            await content_manager.schedule_post(content_id, 'facebook', base + timedelta(minutes=minutes))
+        
+        rows = [
+            row async for row in content_manager.iter_scheduled_posts(
+                columns=('attempts',), until=base + timedelta(minutes=1)
+            )
+        ]
+        
+        assert [row.scheduled_time for row in rows] == [base, base + timedelta(minutes=1)]
+        assert rows[0]._fields == ('id', 'scheduled_time', 'attempts')
+        assert rows[0].attempts == 0
+    
+    @pytest.mark.asyncio
+    async def test_iter_due_posts_in_chunks(self, content_manager):
+        """Test de recorrido por bloques de las publicaciones pendientes"""
+        from datetime import timedelta
+
+        content_id = await content_manager.add_content({'title': 'A', 'content': 'uno'})
+        base = datetime.now() - timedelta(minutes=10)
+        expected = [
+            await content_manager.schedule_post(content_id, platform, base + timedelta(minutes=i))
+            for i, platform in enumerate(['facebook', 'instagram', 'twitter', 'facebook', 'instagram'])
+        ]
+        await content_manager.schedule_post(content_id, 'facebook', datetime.now() + timedelta(hours=1))
+
+        chunks = [chunk async for chunk in content_manager.iter_due_posts(chunk_size=2)]
+
+        assert [len(chunk) for chunk in chunks] == [2, 2, 1]
+        assert [post['id'] for chunk in chunks for post in chunk] == expected
+
 
 class TestPlatformFactory:
     """Tests para PlatformFactory"""
@@ -149,6 +361,34 @@ class TestPlatformFactory:
         assert factory.is_platform_available('facebook')
         assert not factory.is_platform_available('instagram')
         assert not factory.is_platform_available('nonexistent')
+    
+    @pytest.mark.asyncio
+    async def test_platform_status_checks_in_parallel(self):
+        """Test de comprobación concurrente del estado de las plataformas"""
+        factory = PlatformFactory({'platforms': {}})
+        in_flight = []
+        
+        class FakeClient:
+            def __init__(self, error=None):
+                self.error = error
+            
+            async def test_connection(self):
+                in_flight.append(self)
+                await asyncio.sleep(0.01)
+                # Ambas comprobaciones han empezado antes de que termine ninguna
+                assert len(in_flight) == 2
+                if self.error:
+                    raise self.error
+                return True
+        
+        factory.clients = {'facebook': FakeClient(), 'twitter': FakeClient(RuntimeError('caída'))}
+        status = await factory.get_platform_status_async()
+        
+        assert status['facebook']['connected'] is True
+        assert status['twitter'] == {
+            'available': False, 'connected': False, 'error': 'caída',
+            'last_check': status['twitter']['last_check']
+        }
 
 
 class TestBasePlatform:
@@ -176,6 +416,36 @@ class TestBasePlatform:
         # Test con archivo no existente
         assert not platform.validate_media_file('/nonexistent/file.jpg')
     
+    def test_validate_media_file_extension_and_size(self, tmp_path):
+        """Test de validación por extensión y tamaño"""
+        from src.platforms.base_platform import BasePlatform
+        
+        class TestPlatform(BasePlatform):
+            async def authenticate(self): return True
+            async def test_connection(self): return True
+            async def create_post(self, content, media_paths=None, **kwargs): return {}
+            async def get_posts(self, limit=10): return []
+            async def delete_post(self, post_id): return True
+            async def get_comments(self, post_id): return []
+            async def reply_to_comment(self, comment_id, reply_text): return {}
+            async def get_messages(self): return []
+            async def send_message(self, recipient_id, message): return {}
+            async def get_analytics(self, post_id=None): return {}
+        
+        platform = TestPlatform({'max_file_size': 10})
+        
+        small = tmp_path / "small.JPG"
+        small.write_bytes(b"12345")
+        large = tmp_path / "large.png"
+        large.write_bytes(b"0" * 11)
+        text = tmp_path / "notes.txt"
+        text.write_bytes(b"1")
+        
+        assert platform.validate_media_file(str(small))
+        assert not platform.validate_media_file(str(large))
+        assert not platform.validate_media_file(str(text))
+        assert not platform.validate_media_file(str(tmp_path))
+    
     def test_prepare_content(self):
         """Test de preparación de contenido"""
         from src.platforms.base_platform import BasePlatform
@@ -204,6 +474,1147 @@ class TestBasePlatform:
         result = platform.prepare_content(long_content, max_length=50)
         assert len(result) <= 50
         assert result.endswith("...")
+    
+    def test_format_data_fallbacks(self):
+        """Test de formateo de publicaciones y comentarios con campos alternativos"""
+        from src.platforms.facebook_client import FacebookClient
+        
+        client = FacebookClient({})
+        
+        post = client.format_post_data({
+            'id': '1', 'message': 'hola', 'created_time': 't',
+            'likes': {'summary': {'total_count': 3}}, 'shares': {'count': 2}
+        })
+        assert (post['content'], post['created_at'], post['likes'], post['comments'], post['shares']) == ('hola', 't', 3, 0, 2)
+        assert post['platform'] == 'facebook'
+        
+        # Una clave presente tiene prioridad aunque su valor sea vacío
+        assert client.format_post_data({'text': '', 'message': 'x'})['content'] == ''
+        
+        # Sin keep_raw no se retiene el payload original
+        assert 'raw_data' in post
+        assert 'raw_data' not in client.format_post_data({'id': '1'}, keep_raw=False)
+        
+        comment = client.format_comment_data({'id': 'c', 'text': 'hey', 'user': 'ana', 'user_id': '9'})
+        assert (comment['content'], comment['author'], comment['author_id'], comment['likes']) == ('hey', 'ana', '9', 0)
+        
+        message = client.format_message_data({'message': 'm', 'from': {'name': 'Bea', 'id': '5'}, 'unread': 1})
+        assert (message['sender'], message['sender_id'], message['is_read']) == ('Bea', '5', False)
+    
+    def test_now_iso_seconds_precision(self):
+        """Test de marca de tiempo ISO con precisión de segundos"""
+        from src.platforms.base_platform import now_iso
+        
+        stamp = now_iso()
+        assert datetime.fromisoformat(stamp).microsecond == 0
+        assert abs((datetime.now() - datetime.fromisoformat(stamp)).total_seconds()) < 2
+    
+    @pytest.mark.asyncio
+    async def test_throttle_limits_concurrency_and_rate(self):
+        """Test del limitador previo a cada petición (concurrencia y ritmo)"""
+        from src.platforms.facebook_client import FacebookClient
+        
+        client = FacebookClient({'rps': 50, 'max_concurrent': 2})
+        in_flight = []
+        peak = 0
+        
+        async def request():
+            nonlocal peak
+            async with client._throttle():
+                in_flight.append(1)
+                peak = max(peak, len(in_flight))
+                await asyncio.sleep(0.01)
+                in_flight.pop()
+        
+        loop = asyncio.get_running_loop()
+        start = loop.time()
+        await asyncio.gather(*(request() for _ in range(4)))
+        
+        # El primer turno es inmediato; los otros tres esperan 1/50 s cada uno
+        assert loop.time() - start >= 0.05
+        assert peak <= 2
+
+
+class TestInteractionAutomation:
+    """Tests para InteractionAutomation"""
+
+    @pytest.fixture
+    def interaction_automation(self):
+        """Fixture para InteractionAutomation"""
+        from src.automations.interaction_automation import InteractionAutomation
+
+        config = {
+            'database': {'url': 'sqlite:///:memory:'},
+            'automation': {
+                'auto_reply': {
+                    'enabled': True,
+                    'patterns': {r'\b(envío|shipping)\b': "Hacemos envíos a todo el país 🚚"}
+                }
+            }
+        }
+        return InteractionAutomation(config)
+
+    def test_response_patterns_compiled(self, interaction_automation):
+        """Test de compilación de patrones de respuesta"""
+        for pattern in interaction_automation.response_patterns:
+            assert hasattr(pattern, 'search')
+
+        # Los patrones personalizados se compilan junto a los de por defecto
+        reply = interaction_automation._generate_auto_reply("¿Hacen ENVÍO?", {
+            'sentiment': 'neutral', 'is_question': True
+        })
+        assert reply == "Hacemos envíos a todo el país 🚚"
+
+    def test_combined_response_pattern(self, interaction_automation):
+        """Test de la alternancia combinada de patrones de respuesta"""
+        assert interaction_automation._combined_pattern is not None
+        assert interaction_automation._match_response_pattern("nada que ver") is None
+
+        # Gana el patrón que coincide antes en el texto
+        reply = interaction_automation._match_response_pattern("¿precio? hola")
+        assert reply == "Te enviaremos información sobre precios por mensaje privado 📩"
+
+    def test_response_pattern_fallback_matches_combined(self, interaction_automation):
+        """Test de misma respuesta con y sin la alternancia combinada"""
+        comments = ["¿precio? hola", "hola, ¿precio?", "gracias! ¿precio?", "nada que ver"]
+        combined = [interaction_automation._match_response_pattern(text) for text in comments]
+
+        interaction_automation._combined_pattern = None
+        fallback = [interaction_automation._match_response_pattern(text) for text in comments]
+
+        assert fallback == combined
+        assert combined[0] != combined[1]
+
+    def test_analyze_comment(self, interaction_automation):
+        """Test de análisis de sentimiento y categorías"""
+        analysis = interaction_automation._analyze_comment("excelente y genial, ¿cuándo abren?")
+        assert analysis['sentiment'] == 'positive'
+        assert analysis['confidence'] == pytest.approx(0.7)
+        assert analysis['is_question']
+        assert not analysis['is_urgent']
+
+        analysis = interaction_automation._analyze_comment("esto es spam, necesito ayuda urgente")
+        assert analysis['sentiment'] == 'negative'
+        assert analysis['is_urgent']
+        assert not analysis['is_question']
+
+    def test_keyword_hits_fallback_matches_automaton(self, interaction_automation):
+        """Test de equivalencia entre Aho-Corasick y las alternancias compiladas"""
+        text = "¿CÓMO? me encanta, Love it! lovely... HELP, great Great"
+        hits = interaction_automation._count_keyword_hits(text)
+
+        interaction_automation._ac = None
+        assert interaction_automation._count_keyword_hits(text) == hits
+        assert hits['positive'] == 2
+        assert hits['questions'] == 2
+
+    @pytest.mark.asyncio
+    async def test_should_auto_reply_returns_matched_response(self, interaction_automation):
+        """Test de reutilización de la respuesta del patrón coincidente"""
+        text = "hola, ¿cuál es el precio?"
+        analysis = interaction_automation._analyze_comment(text)
+
+        should_reply, matched_response = await interaction_automation._should_auto_reply(text, analysis)
+        assert should_reply
+        assert matched_response == interaction_automation._generate_auto_reply(text, analysis)
+
+        should_reply, matched_response = await interaction_automation._should_auto_reply(
+            "esto es spam", interaction_automation._analyze_comment("esto es spam")
+        )
+        assert not should_reply
+        assert matched_response is None
+
+    @pytest.mark.asyncio
+    async def test_records_written_in_batches(self, interaction_automation):
+        """Test de escritura agrupada de registros"""
+        db_manager = interaction_automation.db_manager
+        bulk_save = AsyncMock(wraps=db_manager.bulk_save_records)
+        db_manager.bulk_save_records = bulk_save
+
+        analysis = {'sentiment': 'neutral', 'is_question': False, 'is_urgent': False}
+        for i in range(3):
+            comment = {'id': f'c{i}', 'author': 'fan', 'content': 'hola'}
+            await interaction_automation._save_comment_record('facebook', 'p1', comment, analysis)
+
+        await interaction_automation.flush_pending_writes()
+
+        bulk_save.assert_called_once()
+        assert len(bulk_save.call_args.args[0]) == 3
+        # Los campos ya guardados en columnas no se duplican en raw_data
+        assert bulk_save.call_args.args[0][0][1]['raw_data'] is None
+        assert await db_manager.is_comment_processed('c2')
+
+    @pytest.mark.asyncio
+    async def test_processed_cache_fronts_database(self, interaction_automation):
+        """Test de caché LRU + Bloom delante de la consulta a la DB"""
+        db_manager = interaction_automation.db_manager
+        db_manager.get_processed_comment_ids = AsyncMock(return_value=['old'])
+        db_manager.is_comment_processed = AsyncMock(return_value=True)
+
+        # Negativo definitivo del filtro: no se consulta la DB
+        assert not await interaction_automation._is_comment_processed('new')
+        db_manager.is_comment_processed.assert_not_called()
+
+        # Posible positivo: se confirma en la DB y queda en la LRU
+        assert await interaction_automation._is_comment_processed('old')
+        assert await interaction_automation._is_comment_processed('old')
+        db_manager.is_comment_processed.assert_called_once_with('old')
+
+        await interaction_automation._mark_comment_processed('new')
+        assert await interaction_automation._is_comment_processed('new')
+        db_manager.get_processed_comment_ids.assert_called_once()
+
+    @pytest.mark.asyncio
+    async def test_processed_bloom_loads_once_under_concurrency(self, interaction_automation):
+        """Test de carga única del filtro de Bloom con llamadas concurrentes"""
+        db_manager = interaction_automation.db_manager
+
+        async def slow_ids():
+            await asyncio.sleep(0.01)
+            return ['old']
+
+        db_manager.get_processed_comment_ids = AsyncMock(side_effect=slow_ids)
+        db_manager.is_comment_processed = AsyncMock(return_value=False)
+
+        await asyncio.gather(*(
+            interaction_automation._is_comment_processed(f'c{i}') for i in range(5)
+        ))
+        db_manager.get_processed_comment_ids.assert_awaited_once()
+
+    @pytest.mark.asyncio
+    async def test_db_error_does_not_reply(self, interaction_automation):
+        """Test de que un error de la DB no se trata como comentario nuevo"""
+        db_manager = interaction_automation.db_manager
+        db_manager.get_processed_comment_ids = AsyncMock(return_value=['c1'])
+        db_manager.is_comment_processed = AsyncMock(side_effect=TimeoutError("db caída"))
+
+        client = Mock()
+        client.reply_to_comment = AsyncMock(return_value={'success': True})
+
+        comment = {'id': 'c1', 'author': 'fan', 'content': 'hola, ¿precio?'}
+        await interaction_automation._process_single_comment('facebook', client, 'p1', comment)
+
+        client.reply_to_comment.assert_not_called()
+        assert 'c1' not in interaction_automation._processed_lru
+
+    @pytest.mark.asyncio
+    async def test_embedded_comments_skip_per_post_requests(self, interaction_automation):
+        """Test de uso de los comentarios incluidos en la respuesta de posts"""
+        client = Mock()
+        client.get_posts_with_comments = AsyncMock(return_value=[
+            {'id': 'p1', 'comments_data': [{'id': 'c1', 'author': 'fan', 'content': 'Hola!'}]}
+        ])
+        client.get_comments = AsyncMock(return_value=[])
+        client.reply_to_comment = AsyncMock(return_value={'success': True})
+
+        await interaction_automation._process_new_comments('facebook', client)
+
+        client.get_comments.assert_not_called()
+        client.reply_to_comment.assert_called_once()
+        assert client.reply_to_comment.call_args.args[0] == 'c1'
+
+    @pytest.mark.asyncio
+    async def test_unchanged_analytics_not_saved_again(self, interaction_automation):
+        """Test de que el analytics sin cambios no se vuelve a guardar"""
+        bulk_save = AsyncMock()
+        interaction_automation.db_manager.bulk_save_records = bulk_save
+        client = Mock()
+        client.get_analytics = AsyncMock(return_value={'metrics': {'likes': 10}})
+
+        async def saved_records():
+            await interaction_automation.flush_pending_writes()
+            return sum(len(call.args[0]) for call in bulk_save.call_args_list)
+
+        await interaction_automation._update_interaction_metrics('facebook', client)
+        await interaction_automation._update_interaction_metrics('facebook', client)
+        assert await saved_records() == 1
+
+        client.get_analytics.return_value = {'metrics': {'likes': 11}}
+        await interaction_automation._update_interaction_metrics('facebook', client)
+        assert await saved_records() == 2
+
+
+class TestPostAutomation:
+    """Tests para PostAutomation"""
+
+    @pytest.fixture
+    def post_automation(self):
+        """Fixture para PostAutomation"""
+        from src.automations.post_automation import PostAutomation
+
+        config = {
+            'database': {'url': 'sqlite:///:memory:'},
+            'content': {
+                'media_upload_path': '/tmp/test_media',
+                'templates_path': '/tmp/test_templates'
+            },
+            'platforms': {},
+            'automation': {'posting': {'posts_per_second': 10, 'burst': 1}}
+        }
+        return PostAutomation(config)
+
+    @pytest.mark.asyncio
+    async def test_platforms_published_concurrently(self, post_automation):
+        """Test de publicación en paralelo entre plataformas y limitada dentro de cada una"""
+        published = []
+
+        async def fake_process(task):
+            published.append((task.platform, asyncio.get_running_loop().time()))
+            return task.post, 'published', {}
+
+        post_automation._process_single_post = fake_process
+        post_automation.content_manager.mark_posts_bulk = AsyncMock()
+        async def fake_iter_due_posts(current_time=None, chunk_size=100):
+            yield [
+                {'id': '1', 'platform': 'facebook'},
+                {'id': '2', 'platform': 'facebook'},
+                {'id': '3', 'platform': 'instagram'},
+            ]
+
+        post_automation.content_manager.iter_due_posts = fake_iter_due_posts
+        post_automation.content_manager.get_contents_bulk = AsyncMock(return_value={})
+
+        start = asyncio.get_running_loop().time()
+        await post_automation.process_scheduled_posts()
+
+        times = {platform: [t - start for p, t in published if p == platform]
+                 for platform in ('facebook', 'instagram')}
+        assert times['instagram'][0] < 0.05
+        assert times['facebook'][0] < 0.05
+        assert times['facebook'][1] >= 0.09
+
+    @pytest.mark.asyncio
+    async def test_in_flight_posts_bounded_per_platform(self, post_automation):
+        """Test de límite de publicaciones simultáneas por plataforma"""
+        post_automation.posting_config.update({'posts_per_second': 1000, 'burst': 10,
+                                               'concurrency': {'facebook': 2}})
+        in_flight = {'facebook': 0}
+        peak = {'facebook': 0}
+
+        async def fake_process(task):
+            in_flight['facebook'] += 1
+            peak['facebook'] = max(peak['facebook'], in_flight['facebook'])
+            await asyncio.sleep(0.01)
+            in_flight['facebook'] -= 1
+            return task.post, 'published', {}
+
+        post_automation._process_single_post = fake_process
+        outcomes = []
+        posts = [{'id': str(i), 'platform': 'facebook'} for i in range(5)]
+
+        await post_automation._process_platform_posts('facebook', posts, {}, outcomes)
+
+        assert peak['facebook'] == 2
+        assert sorted(post['id'] for post, status, data in outcomes) == ['0', '1', '2', '3', '4']
+
+    @pytest.mark.asyncio
+    async def test_process_single_post_from_task(self, post_automation):
+        """Test de publicación a partir de un PostTask prearmado"""
+        client = Mock()
+        client.validate_media_file = Mock(return_value=True)
+        client.create_post = AsyncMock(return_value={'post_id': 'fb_1'})
+        contents = {'c1': {'content': 'hola', 'media_paths': ['a.jpg']}}
+
+        post = {'id': 'p1', 'platform': 'facebook', 'content_id': 'c1', 'config': {'link': 'x'}}
+        task = post_automation._build_task(post, contents, client)
+        assert await post_automation._process_single_post(task) == (post, 'published', {'post_id': 'fb_1'})
+        client.create_post.assert_awaited_once_with(content='hola', media_paths=['a.jpg'], link='x')
+
+        missing = {'id': 'p2', 'platform': 'facebook', 'content_id': 'c2'}
+        task = post_automation._build_task(missing, contents, client)
+        assert await post_automation._process_single_post(task) == (missing, 'failed', 'Contenido no encontrado: c2')
+
+    def test_rank_posting_hours(self, post_automation):
+        """Test de ranking de horas por engagement promedio"""
+        posts = [
+            {'created_at': '2024-05-01T10:00:00+0000', 'likes': 10, 'comments': 2, 'shares': 0},
+            {'created_at': '2024-05-02T10:30:00Z', 'likes': 4, 'comments': 0, 'shares': 2},
+            {'created_at': '2024-05-02T18:00:00+00:00', 'likes': 1},
+            {'created_at': 'fecha inválida', 'likes': 100},
+            {'likes': 50},
+        ]
+
+        ranking = post_automation._rank_posting_hours(posts)
+
+        assert ranking == [
+            {'hour': 10, 'avg_engagement': 9.0, 'posts_count': 2},
+            {'hour': 18, 'avg_engagement': 1.0, 'posts_count': 1},
+        ]
+        assert post_automation._rank_posting_hours(posts, top=1) == ranking[:1]
+        assert post_automation._rank_posting_hours([]) == []
+
+    @pytest.mark.asyncio
+    async def test_duplicate_post_across_platforms(self, post_automation):
+        """Test de duplicación en paralelo con errores por plataforma"""
+        async def fake_schedule(content_id, platform, scheduled_time, post_config=None):
+            if platform == 'instagram':
+                raise ValueError("sin sesión")
+            return f"post_{platform}"
+
+        post_automation.content_manager.get_content = AsyncMock(return_value={'id': 'c1'})
+        post_automation.content_manager.schedule_post = fake_schedule
+        post_automation.platform_factory.get_available_platforms = lambda: ['facebook', 'instagram']
+
+        post_ids = await post_automation.duplicate_post_across_platforms(
+            'c1', ['facebook', 'instagram', 'twitter'], datetime.now()
+        )
+
+        assert post_ids == {'facebook': 'post_facebook', 'instagram': 'ERROR: sin sesión'}
+
+
+class TestAutomationManager:
+    """Tests para AutomationManager"""
+
+    @pytest.mark.asyncio
+    async def test_interaction_task_per_platform(self):
+        """Test de una tarea de interacciones independiente por plataforma"""
+        from src.core.automation_manager import AutomationManager
+
+        config = {
+            'database': {'url': 'sqlite:///:memory:'},
+            'content': {
+                'media_upload_path': '/tmp/test_media',
+                'templates_path': '/tmp/test_templates'
+            },
+            'platforms': {}
+        }
+        manager = AutomationManager(config)
+        manager.content_manager.get_scheduled_posts = AsyncMock(return_value=[])
+        manager.scheduler.add_recurring_task = Mock()
+        manager.platform_factory.get_client = Mock(side_effect=lambda name: f"{name}-client")
+
+        calls = []
+
+        async def fake_process(platform, client):
+            calls.append(platform)
+            if platform == 'instagram':
+                raise RuntimeError("fallo")
+
+        manager.automations['interaction'] = Mock(process_platform_interactions=fake_process)
+
+        await manager._setup_scheduled_tasks('all')
+        assert [c.kwargs for c in manager.scheduler.add_recurring_task.call_args_list] == [
+            {'interval': 300, 'task_id': 'interactions_facebook', 'args': ['facebook']},
+            {'interval': 600, 'task_id': 'interactions_instagram', 'args': ['instagram']},
+        ]
+
+        # El fallo de una plataforma se registra sin propagarse
+        await manager._process_platform_interactions('instagram')
+        await manager._process_platform_interactions('facebook')
+        assert calls == ['instagram', 'facebook']
+
+
+class TestSchedulerManager:
+    """Tests para SchedulerManager"""
+
+    @pytest.mark.asyncio
+    async def test_schedule_posts_bulk(self):
+        """Test de programación en bloque omitiendo posts vencidos o incompletos"""
+        from datetime import timedelta
+        from src.core.scheduler import SchedulerManager
+
+        scheduler = SchedulerManager({})
+        future = datetime.now() + timedelta(hours=1)
+        posts = [
+            {'id': 'p1', 'scheduled_time': future},
+            {'id': 'p2', 'scheduled_time': future + timedelta(minutes=5)},
+            {'id': 'p3', 'scheduled_time': datetime.now() - timedelta(hours=1)},
+            {'scheduled_time': future},
+        ]
+
+        assert await scheduler.schedule_posts_bulk(posts) == 2
+        assert set(scheduler._pending_posts) == {'p1', 'p2'}
+
+    def test_cron_triggers_reused_per_expression(self):
+        """Test de reutilización de CronTrigger por expresión y rechazo de inválidas"""
+        from src.core.scheduler import SchedulerManager
+
+        scheduler = SchedulerManager({})
+
+        def daily():
+            pass
+
+        scheduler.schedule_daily_task(daily, hour=9, task_id='a')
+        scheduler.schedule_daily_task(daily, hour=9, task_id='b')
+        scheduler.add_cron_task(daily, '0 9 * *', task_id='invalida')
+
+        assert scheduler.scheduler.get_job('a').trigger is scheduler.scheduler.get_job('b').trigger
+        assert scheduler.scheduler.get_job('invalida') is None
+
+    @pytest.mark.asyncio
+    async def test_dispatch_loop_runs_due_posts(self):
+        """Test del bucle único de despacho: orden, reemplazo y cancelación"""
+        from datetime import timedelta
+        from src.core.scheduler import SchedulerManager
+
+        scheduler = SchedulerManager({})
+        executed = []
+
+        async def fake_execute(post_data):
+            executed.append(post_data['id'])
+
+        scheduler._execute_scheduled_post = fake_execute
+        await scheduler.start()
+        try:
+            now = datetime.now()
+            await scheduler.schedule_posts_bulk([
+                {'id': 'tarde', 'scheduled_time': now + timedelta(milliseconds=150)},
+                {'id': 'cancelado', 'scheduled_time': now + timedelta(milliseconds=50)},
+                {'id': 'movido', 'scheduled_time': now + timedelta(hours=1)},
+            ])
+            # Reprogramar a una fecha anterior despierta al bucle
+            await scheduler.schedule_post({'id': 'movido', 'scheduled_time': now + timedelta(milliseconds=80)})
+            scheduler.remove_task('post_cancelado')
+            assert {job['id'] for job in scheduler.get_scheduled_jobs()} == {'post_tarde', 'post_movido'}
+
+            await asyncio.sleep(0.3)
+        finally:
+            scheduler.stop()
+
+        assert executed == ['movido', 'tarde']
+        assert scheduler.get_scheduled_jobs() == []
+
+    @pytest.mark.asyncio
+    async def test_execute_reuses_shared_managers(self):
+        """Test de reutilización de dependencias inyectadas y registro de resultados en lote"""
+        from src.core.scheduler import SchedulerManager
+
+        content_manager = Mock()
+        content_manager.get_content = AsyncMock(return_value={'content': 'hola', 'media_paths': []})
+        content_manager.mark_posts_bulk = AsyncMock()
+        content_manager.mark_post_failed = AsyncMock()
+        client = Mock(create_post=AsyncMock(return_value={'post_id': 'fb_1'}))
+        platform_factory = Mock(get_client=Mock(return_value=client))
+
+        scheduler = SchedulerManager({}, content_manager=content_manager,
+                                     platform_factory=platform_factory)
+        scheduler._mark_flush_delay = 0
+        posts = [{'id': post_id, 'content_id': 'c1', 'platform': 'facebook',
+                  'attempts': 0, 'max_attempts': 3} for post_id in ('p1', 'p2')]
+        await asyncio.gather(*(scheduler._execute_scheduled_post(post) for post in posts))
+        await scheduler._flush_task
+
+        assert scheduler.content_manager is content_manager
+        # Ambos resultados se registran en un único lote
+        content_manager.mark_posts_bulk.assert_awaited_once_with([
+            (posts[0], 'published', {'post_id': 'fb_1'}),
+            (posts[1], 'published', {'post_id': 'fb_1'}),
+        ])
+        content_manager.mark_post_failed.assert_not_awaited()
+
+
+class TestTokenBucket:
+    """Tests para el limitador TokenBucket"""
+
+    @pytest.mark.asyncio
+    async def test_burst_then_throttle(self):
+        """Test de ráfaga inicial seguida de espera por reposición"""
+        from src.utils.rate_limiter import TokenBucket
+
+        bucket = TokenBucket(rate=20, capacity=2)
+        loop = asyncio.get_running_loop()
+
+        start = loop.time()
+        await bucket.acquire()
+        await bucket.acquire()
+        assert loop.time() - start < 0.04
+
+        await bucket.acquire()
+        assert loop.time() - start >= 0.04
+
+
+class TestAIMDLimiter:
+    """Tests para el limitador adaptativo AIMDLimiter"""
+
+    def test_halves_on_throttle_and_grows_back(self):
+        """Test de reducción multiplicativa y crecimiento aditivo de la velocidad"""
+        from src.utils.rate_limiter import AIMDLimiter, TokenBucket
+
+        bucket = TokenBucket(4, capacity=1)
+        limiter = AIMDLimiter(bucket, window=2)
+
+        limiter.record(throttled=True)
+        assert bucket.rate == 2
+
+        # Un error que no es de saturación corta la racha sin cambiar la velocidad
+        limiter.record()
+        limiter.record(success=False)
+        limiter.record()
+        assert bucket.rate == 2
+
+        # Dos llamadas correctas seguidas completan la ventana: +0.4 (10% de 4)
+        limiter.record()
+        assert bucket.rate == pytest.approx(2.4)
+        assert limiter.stats() == {'rate': pytest.approx(2.4), 'max_rate': 4, 'throttled': 1}
+
+        # Nunca baja del 10% ni sube de la velocidad inicial
+        for _ in range(10):
+            limiter.record(throttled=True)
+        assert bucket.rate == pytest.approx(0.4)
+        for _ in range(200):
+            limiter.record()
+        assert bucket.rate == 4
+
+
+class TestHttpSession:
+    """Tests para la sesión HTTP compartida"""
+
+    @pytest.mark.asyncio
+    async def test_clients_share_one_session(self):
+        """Test de reutilización del pool de conexiones entre clientes"""
+        from src.platforms.facebook_client import FacebookClient
+        from src.platforms.twitter_client import TwitterClient
+        import aiohttp
+        from src.utils.http_session import get_shared_session, close_shared_session
+
+        session = get_shared_session()
+        assert get_shared_session() is session
+
+        facebook = FacebookClient({})
+        twitter = TwitterClient({})
+        assert facebook.session is session
+        assert twitter.session is session
+
+        # Una sesión inyectada tiene prioridad sobre el pool compartido
+        injected = aiohttp.ClientSession()
+        assert FacebookClient({}, session=injected).session is injected
+        await injected.close()
+
+        # Cerrar un cliente no cierra el pool compartido
+        await facebook.close()
+        assert not session.closed
+
+        await close_shared_session()
+        assert session.closed
+        assert get_shared_session() is not session
+        await close_shared_session()
+
+    def test_sessions_closed_across_event_loops(self):
+        """Test de cierre de la sesión de un loop anterior y del pool de get_platform_status"""
+        from src.utils import http_session
+        from src.utils.http_session import get_shared_session, close_shared_session
+
+        async def open_session():
+            return get_shared_session()
+
+        async def replace_session():
+            session = get_shared_session()
+            await asyncio.sleep(0)
+            await close_shared_session()
+            return session
+
+        stale = asyncio.run(open_session())
+        assert not stale.closed
+        # Un loop nuevo crea su propia sesión y cierra la anterior
+        assert asyncio.run(replace_session()) is not stale
+        assert stale.closed
+
+        async def test_connection():
+            return not get_shared_session().closed
+
+        factory = PlatformFactory({'platforms': {}})
+        factory.clients = {'facebook': Mock(test_connection=test_connection)}
+        assert factory.get_platform_status()['facebook']['connected'] is True
+        assert http_session._session is None
+
+    @pytest.mark.asyncio
+    async def test_iter_file_chunks(self, tmp_path):
+        """Test de lectura en bloques de archivos a subir"""
+        from src.utils.http_session import iter_file_chunks
+
+        media = tmp_path / "foto.jpg"
+        media.write_bytes(b"x" * 10)
+
+        chunks = [chunk async for chunk in iter_file_chunks(str(media), chunk_size=4)]
+        assert chunks == [b"xxxx", b"xxxx", b"xx"]
+
+
+class FakeResponse:
+    """Respuesta HTTP mínima para los tests de clientes"""
+
+    def __init__(self, status, body, headers=None):
+        self.status = status
+        self.body = body
+        self.headers = headers or {}
+
+    async def json(self, loads=None):
+        return self.body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb):
+        return False
+
+
+class TestFacebookClient:
+    """Tests para el cliente de Facebook"""
+
+    @pytest.mark.asyncio
+    async def test_request_retries_transient_errors(self):
+        """Test de reintento con backoff ante 5xx y errores de conexión"""
+        import aiohttp
+        from src.platforms.facebook_client import FacebookClient
+
+        outcomes = [
+            FakeResponse(503, {}, {'Retry-After': '0'}),
+            aiohttp.ClientConnectionError('caída'),
+            FakeResponse(200, {'id': '1', 'name': 'Página'}),
+        ]
+        calls = []
+
+        class FakeSession:
+            closed = False
+
+            async def request(self, method, url, **kwargs):
+                calls.append(method)
+                outcome = outcomes.pop(0)
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return outcome
+
+        client = FacebookClient({'retry_base': 0.001, 'rps': 1000}, session=FakeSession())
+        assert await client.authenticate() is True
+        assert calls == ['GET', 'GET', 'GET']
+
+        # Las publicaciones no se reintentan ante 5xx (podrían haberse creado)
+        outcomes.extend([FakeResponse(500, {'error': 'x'}), FakeResponse(200, {'id': 'p'})])
+        with pytest.raises(Exception):
+            await client.create_post('hola')
+        assert len(outcomes) == 1
+
+    @pytest.mark.asyncio
+    async def test_writes_only_retry_errors_before_sending(self):
+        """Test de publicaciones: un timeout no se repite, un fallo al conectar sí"""
+        import aiohttp
+        from types import SimpleNamespace
+        from src.platforms.facebook_client import FacebookClient
+
+        outcomes = []
+        calls = []
+
+        class FakeSession:
+            closed = False
+
+            async def request(self, method, url, **kwargs):
+                calls.append(method)
+                outcome = outcomes.pop(0)
+                if isinstance(outcome, Exception):
+                    raise outcome
+                return outcome
+
+        client = FacebookClient({'retry_base': 0.001, 'rps': 1000}, session=FakeSession())
+
+        # El cuerpo pudo llegar a Facebook: no se reintenta
+        outcomes.extend([asyncio.TimeoutError(), FakeResponse(200, {'id': 'p'})])
+        with pytest.raises(asyncio.TimeoutError):
+            await client.create_post('hola')
+        assert calls == ['POST']
+
+        # Sin conexión la petición no se envió, así que se reintenta
+        connect_key = SimpleNamespace(host='graph.facebook.com', port=443, ssl=True)
+        outcomes[:] = [aiohttp.ClientConnectorError(connect_key, OSError('sin red')), FakeResponse(200, {'id': 'p'})]
+        result = await client.create_post('hola')
+        assert result['post_id'] == 'p'
+        assert calls == ['POST', 'POST', 'POST']
+
+    @pytest.mark.asyncio
+    async def test_authenticate_reuses_result_until_token_rejected(self):
+        """Test de caché de autenticación y su invalidación ante un token caducado"""
+        from src.platforms.facebook_client import FacebookClient
+
+        calls = []
+        responses = [
+            FakeResponse(200, {'id': '1', 'name': 'Página'}),
+            FakeResponse(400, {'error': {'code': 190, 'message': 'token caducado'}}),
+            FakeResponse(200, {'id': '1', 'name': 'Página'}),
+        ]
+
+        class FakeSession:
+            closed = False
+
+            async def request(self, method, url, **kwargs):
+                calls.append(url.rsplit('/', 1)[-1])
+                return responses.pop(0)
+
+        client = FacebookClient({'rps': 1000}, session=FakeSession())
+
+        assert await client.test_connection() is True
+        assert await client.test_connection() is True
+        assert calls == ['me']
+
+        # Un error 190 obliga a verificar el token de nuevo
+        assert await client.delete_post('p1') is False
+        assert await client.test_connection() is True
+        assert calls == ['me', 'p1', 'me']
+
+    @pytest.mark.asyncio
+    async def test_get_posts_follows_paging(self):
+        """Test de paginación por cursor hasta reunir el límite pedido"""
+        from src.platforms.facebook_client import FacebookClient
+
+        pages = {
+            'posts': {'data': [{'id': '1'}, {'id': '2'}], 'paging': {'next': 'segunda'}},
+            'segunda': {'data': [{'id': '3'}, {'id': '4'}], 'paging': {'next': 'tercera'}},
+        }
+        requested = []
+
+        class FakeSession:
+            closed = False
+
+            async def request(self, method, url, params=None, headers=None):
+                requested.append((url, params and params['limit']))
+                return FakeResponse(200, pages[url.rsplit('/', 1)[-1]])
+
+        client = FacebookClient({'page_id': 'x', 'rps': 1000}, session=FakeSession())
+
+        posts = await client.get_posts(limit=3)
+
+        assert [post['id'] for post in posts] == ['1', '2', '3']
+        # La segunda página usa la URL de `next` tal cual; no se pide una tercera
+        assert requested == [(f"{client.base_url}/x/posts", 3), ('segunda', None)]
+
+    @pytest.mark.asyncio
+    async def test_conditional_get_reuses_cached_response(self):
+        """Test de revalidación con ETag: un 304 reutiliza la respuesta anterior"""
+        from src.platforms.facebook_client import FacebookClient
+
+        sent_headers = []
+        responses = [
+            FakeResponse(200, {'data': [{'name': 'page_fans'}]}, {'ETag': '"v1"'}),
+            FakeResponse(304, None),
+        ]
+
+        class FakeSession:
+            closed = False
+
+            async def request(self, method, url, params=None, headers=None):
+                sent_headers.append(headers)
+                return responses.pop(0)
+
+        client = FacebookClient({'rps': 1000, 'access_token': 'tok'}, session=FakeSession())
+
+        first = await client.get_analytics()
+        second = await client.get_analytics()
+
+        # El token va en la cabecera Authorization, no en la URL
+        assert sent_headers == [
+            {'Authorization': 'Bearer tok'},
+            {'Authorization': 'Bearer tok', 'If-None-Match': '"v1"'},
+        ]
+        assert second['metrics'] == first['metrics'] == {'data': [{'name': 'page_fans'}]}
+
+    @pytest.mark.asyncio
+    async def test_only_request_errors_are_swallowed(self):
+        """Test de errores de red convertidos en resultado vacío y bugs propagados"""
+        import aiohttp
+        from src.platforms.facebook_client import FacebookClient
+
+        class FakeSession:
+            closed = False
+            error = aiohttp.ClientConnectionError('caída')
+
+            async def request(self, method, url, **kwargs):
+                raise self.error
+
+        session = FakeSession()
+        client = FacebookClient({'rps': 1000, 'max_attempts': 1}, session=session)
+        assert await client.get_posts() == []
+
+        session.error = TypeError('bug')
+        with pytest.raises(TypeError):
+            await client.get_posts()
+
+    @pytest.mark.asyncio
+    async def test_get_comments_bulk_uses_batch_requests(self):
+        """Test de agrupación de peticiones en bloques de /batch"""
+        import json
+        from src.platforms.facebook_client import FacebookClient, GRAPH_BATCH_LIMIT
+
+        batches = []
+
+        class FakeSession:
+            closed = False
+
+            async def request(self, method, url, data, headers=None):
+                batch = json.loads(data['batch'])
+                batches.append(batch)
+                items = [
+                    {'code': 200, 'body': json.dumps({'data': [{'id': request['relative_url'].split('/')[0] + '_c'}]})}
+                    for request in batch
+                ]
+                # Una respuesta fallida dentro del lote
+                items[0] = {'code': 400, 'body': '{}'}
+                return FakeResponse(200, items)
+
+        client = FacebookClient({}, session=FakeSession())
+        post_ids = [f"p{i}" for i in range(GRAPH_BATCH_LIMIT + 2)]
+
+        comments = await client.get_comments_bulk(post_ids)
+
+        assert [len(batch) for batch in batches] == [GRAPH_BATCH_LIMIT, 2]
+        assert 'p0' not in comments and f"p{GRAPH_BATCH_LIMIT}" not in comments
+        assert comments['p1'][0]['id'] == 'p1_c'
+        assert len(comments) == len(post_ids) - 2
+        # Mismo número de comentarios por post que get_comments
+        assert batches[0][1]['relative_url'].endswith(f"&limit={client.comments_per_post}")
+
+
+class TestInstagramClient:
+    """Tests para el cliente de Instagram"""
+
+    @pytest.mark.asyncio
+    async def test_user_info_is_cached_until_invalidated(self):
+        """Test de caché con TTL de la info del propio usuario"""
+        from types import SimpleNamespace
+        from src.platforms.instagram_client import InstagramClient
+
+        lookups = []
+
+        class FakeInstagrapi:
+            def user_info_by_username(self, username):
+                lookups.append(username)
+                return SimpleNamespace(pk=7, follower_count=10, following_count=2, media_count=len(lookups))
+
+            def user_medias(self, user_id, amount):
+                return []
+
+        client = InstagramClient({'username': 'fan', 'password': 'x', 'rps': 1000})
+        client.client = FakeInstagrapi()
+        client.authenticated = True
+
+        assert await client.test_connection() is True
+        assert await client.get_posts() == []
+        assert (await client.get_analytics())['metrics']['posts'] == 1
+        assert lookups == ['fan']
+
+        # Tras invalidar (p. ej. por LoginRequired) se vuelve a consultar
+        client._invalidate_user_info()
+        assert (await client.get_analytics())['metrics']['posts'] == 2
+
+    @pytest.mark.asyncio
+    async def test_authenticate_reuses_saved_session(self, tmp_path):
+        """Test de sesión guardada: solo se hace login si ha caducado"""
+        from instagrapi.exceptions import LoginRequired, PleaseWaitFewMinutes
+        from src.platforms.instagram_client import InstagramClient
+
+        session_file = tmp_path / 'session.json'
+        session_file.write_text('{}')
+        calls = []
+
+        class FakeInstagrapi:
+            expired = False
+
+            def load_settings(self, path):
+                calls.append('load_settings')
+
+            def get_timeline_feed(self):
+                calls.append('get_timeline_feed')
+                if self.expired:
+                    raise LoginRequired()
+
+            def login(self, username, password):
+                calls.append('login')
+
+            def dump_settings(self, path):
+                calls.append('dump_settings')
+
+        client = InstagramClient({'username': 'fan', 'password': 'x', 'rps': 1000, 'session_file': str(session_file)})
+        client.client = FakeInstagrapi()
+
+        assert await client.authenticate() is True
+        assert calls == ['load_settings', 'get_timeline_feed']
+
+        calls.clear()
+        client.client.expired = True
+        assert await client.authenticate() is True
+        assert calls == ['load_settings', 'get_timeline_feed', 'login', 'dump_settings']
+        assert session_file.exists()
+
+        # Un límite de peticiones no borra la sesión ni reenvía credenciales
+        calls.clear()
+        client.throttle_backoff = 0
+
+        def throttled():
+            calls.append('get_timeline_feed')
+            raise PleaseWaitFewMinutes('espera unos minutos')
+
+        client.client.get_timeline_feed = throttled
+        assert await client.authenticate() is False
+        assert calls == ['load_settings', 'get_timeline_feed']
+        assert session_file.exists()
+
+    @pytest.mark.asyncio
+    async def test_throttle_errors_reduce_rate(self):
+        """Test de reducción de la velocidad ante errores de saturación"""
+        from instagrapi.exceptions import PleaseWaitFewMinutes
+        from src.platforms.instagram_client import InstagramClient
+
+        client = InstagramClient({'username': 'fan', 'password': 'x', 'rps': 1000, 'throttle_backoff': 0})
+
+        def throttled():
+            raise PleaseWaitFewMinutes('espera unos minutos')
+
+        with pytest.raises(PleaseWaitFewMinutes):
+            await client._api(throttled)
+        assert await client._api(lambda: 'ok') == 'ok'
+
+        stats = client.get_rl_stats()
+        assert (stats['rate'], stats['max_rate'], stats['throttled']) == (500, 1000, 1)
+        assert client._request_limiter.rate == 500
+
+    @pytest.mark.asyncio
+    async def test_challenge_is_a_failure_without_backoff(self):
+        """Test de que una verificación no reduce la velocidad ni espera"""
+        from instagrapi.exceptions import ChallengeRequired
+        from src.platforms.instagram_client import InstagramClient
+
+        client = InstagramClient({'username': 'fan', 'password': 'x', 'rps': 1000, 'throttle_backoff': 60})
+
+        def challenge():
+            raise ChallengeRequired('verificación')
+
+        # Con throttle_backoff de 60 s, esperar haría saltar el timeout
+        with pytest.raises(ChallengeRequired):
+            await asyncio.wait_for(client._api(challenge), timeout=1)
+
+        assert client.get_rl_stats() == {'rate': 1000, 'max_rate': 1000, 'throttled': 0}
+
+    @pytest.mark.asyncio
+    async def test_get_messages_fetches_threads_concurrently(self, monkeypatch):
+        """Test de consulta concurrente de threads, cada una con su propio Client"""
+        import threading
+        import time
+        from datetime import datetime
+        from types import SimpleNamespace
+        from src.platforms import instagram_client
+        from src.platforms.instagram_client import InstagramClient
+
+        lock = threading.Lock()
+        active = [0, 0]  # en curso, máximo observado
+
+        class FakeInstagrapi:
+            # Como instagrapi: la respuesta se guarda en last_json y se lee de ahí
+            def __init__(self, settings=None):
+                self.settings = settings or {}
+                self.last_json = {}
+
+            def get_settings(self):
+                return {'session': 'fan'}
+
+            def direct_threads(self):
+                return [SimpleNamespace(id=f't{i}') for i in range(12)]
+
+            def direct_messages(self, thread_id, amount):
+                assert self.settings == {'session': 'fan'}
+                with lock:
+                    active[0] += 1
+                    active[1] = max(active)
+                self.last_json = {'thread_id': thread_id}
+                time.sleep(0.02)
+                with lock:
+                    active[0] -= 1
+                thread_id = self.last_json['thread_id']
+                return [SimpleNamespace(id=f'{thread_id}-m', text='hola', user_id='u',
+                                        timestamp=datetime(2024, 1, 1))]
+
+        monkeypatch.setattr(instagram_client, 'InstagrapiClient', FakeInstagrapi)
+        client = InstagramClient({'username': 'fan', 'password': 'x', 'rps': 1000, 'direct_fetch_concurrency': 2})
+        client.authenticated = True
+
+        messages = await client.get_messages()
+
+        # Solo los 10 últimos threads, en orden, sin respuestas cruzadas y
+        # con 2 consultas a la vez como máximo
+        assert [m['raw_data']['thread_id'] for m in messages] == [f't{i}' for i in range(10)]
+        assert [m['id'] for m in messages] == [f't{i}-m' for i in range(10)]
+        assert active[1] == 2
+
+    @pytest.mark.asyncio
+    async def test_api_serializes_calls_on_the_same_client(self):
+        """Test de que las llamadas sobre un mismo Client no se solapan"""
+        import asyncio
+        import time
+        from src.platforms.instagram_client import InstagramClient
+
+        class FakeInstagrapi:
+            last_json = {}
+
+            def user_info(self, user_id):
+                self.last_json = {'pk': user_id}
+                time.sleep(0.01)
+                return self.last_json['pk']
+
+        client = InstagramClient({'username': 'fan', 'password': 'x', 'rps': 1000})
+        client.client = FakeInstagrapi()
+
+        results = await asyncio.gather(*(client._api(client.client.user_info, i) for i in range(5)))
+
+        assert results == list(range(5))
+
+    @pytest.mark.asyncio
+    async def test_album_photos_upload_in_parallel(self, monkeypatch):
+        """Test de subida paralela de álbumes y recurso a album_upload si falla"""
+        from types import SimpleNamespace
+        from instagrapi.exceptions import AlbumConfigureError
+        from src.platforms import instagram_client
+        from src.platforms.instagram_client import InstagramClient
+
+        monkeypatch.setattr(instagram_client, 'extract_media_v1', lambda data: SimpleNamespace(**data))
+        calls = []
+
+        class FakeInstagrapi:
+            fail = False
+            transcoding = True
+            media = {'pk': 'a1', 'id': 'a1_1'}
+
+            def __init__(self, settings=None):
+                self.forked = settings is not None
+                self.last_json = {}
+
+            def get_settings(self):
+                return {'session': 'fan'}
+
+            def photo_rupload(self, path, upload_id, to_album=False):
+                # Las subidas simultáneas no usan el Client principal
+                assert self.forked
+                if self.fail:
+                    raise RuntimeError('subida fallida')
+                return upload_id, 10, 20
+
+            def album_configure(self, children, caption):
+                calls.append(('configure', [child['upload_id'] for child in children]))
+                # Primero Instagram aún procesa la media
+                if FakeInstagrapi.transcoding:
+                    FakeInstagrapi.transcoding = False
+                    raise RuntimeError('Transcode not finished yet.')
+                self.last_json = {'media': {'pk': 'otro', 'id': 'otro_1'}}
+                return {'status': 'ok', 'media': self.media} if self.media else {'status': 'ok'}
+
+            def album_upload(self, paths, caption):
+                calls.append(('album_upload', len(paths)))
+                return SimpleNamespace(pk='a2', id='a2_1')
+
+        monkeypatch.setattr(instagram_client, 'InstagrapiClient', FakeInstagrapi)
+        client = InstagramClient({'username': 'fan', 'password': 'x', 'rps': 1000,
+                                  'album_configure_timeout': 0})
+
+        result = await client._create_album_post(['a.jpg', 'b.png'], 'hola')
+        upload_ids = calls[0][1]
+        assert result['post_id'] == 'a1' and result['album_size'] == 2
+        assert [call[0] for call in calls] == ['configure', 'configure']
+        # Cada foto lleva su propio upload_id
+        assert len(set(upload_ids)) == 2
+
+        # Sin media en la respuesta no se toma la de last_json
+        FakeInstagrapi.media = None
+        with pytest.raises(AlbumConfigureError):
+            await client._create_album_post(['a.jpg', 'b.png'], 'hola')
+
+        FakeInstagrapi.fail = True
+        result = await client._create_album_post(['a.jpg', 'b.png'], 'hola')
+        assert result['post_id'] == 'a2'
+        assert calls[-1] == ('album_upload', 2)
 
 
 if __name__ == "__main__":
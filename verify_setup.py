@@ -83,6 +83,7 @@ def test_database_connection():
         
         config_manager = ConfigManager("config/config.yaml")
         config = config_manager.load_config()
+        config_manager.ensure_dirs()
         
         db_manager = DatabaseManager(config)
         print("✅ Base de datos inicializada correctamente")